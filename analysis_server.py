@@ -0,0 +1,656 @@
+#!/usr/bin/env python3
+"""
+HTTP API for the modality analyzer.
+Serves the web assets together with POST /analyze, POST /analyze/batch,
+POST /analyze/stream and POST /analyze/live on a threaded HTTP/1.1 server. The
+analysis itself runs on a warm process pool, except for live sessions, which
+re-analyze only what an edit changed in this process. GET /metrics reports stage
+timers and rule counters in Prometheus text format (JSON with ?format=json).
+GET /rules lists the rule packs in use with their counters, and POST /rules/reload
+swaps in the current contents of the pack files without dropping requests.
+POST /logic checks a propositional formula and POST /logic/table streams its
+truth table.
+
+    python analysis_server.py --port 8080 --workers 4
+    curl -d '{"text": "All triangles have three sides."}' localhost:8080/analyze
+    curl -N --data-binary @essay.txt -H 'Content-Type: text/plain' localhost:8080/analyze/stream
+    curl -d '{"session": "tab-1", "edit": {"start": 0, "end": 0, "text": "Maybe. "}}' localhost:8080/analyze/live
+    python analysis_server.py --instrument && curl localhost:8080/metrics
+    python analysis_server.py --rule-packs rules/core.json && curl -X POST localhost:8080/rules/reload
+    curl -d '{"expression": "(p → q) ∧ p → q"}' localhost:8080/logic
+    curl -d '{"expression": "a ⊕ b ⊕ c", "format": "csv"}' localhost:8080/logic/table
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+from functools import partial
+from urllib.parse import parse_qs
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from modality_engine import ModalityAnalyzer, ParagraphAccumulator
+from incremental_analysis import IncrementalDocument
+from asset_cache import AssetCache, asset_response
+from instrumentation import Instrumentation, to_prometheus
+from rule_packs import RulePackError, load_rule_set, stats_by_pack
+from logic_engine import Expression, LogicError, equivalence_counterexample, summarize, table_chunks
+
+# Largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 4 << 20
+
+# Most documents accepted by one /analyze/batch request
+MAX_BATCH_DOCUMENTS = 1000
+
+# Seconds a request may wait for the worker pool
+REQUEST_TIMEOUT = 60
+
+# Server-Sent Events endpoint: one 'sentence' event per sentence, then a 'result' event
+STREAM_PATH = '/analyze/stream'
+
+# Incremental analysis of a document held by the server between requests
+LIVE_PATH = '/analyze/live'
+
+# Live documents kept at once; the least recently used is dropped beyond this
+MAX_LIVE_SESSIONS = 64
+
+# Longest text a live session may grow to, in characters
+MAX_LIVE_TEXT_CHARS = 1 << 20
+
+# Analyzer metrics: Prometheus text, or JSON with ?format=json
+METRICS_PATH = '/metrics'
+
+# Rule packs in use with their per-pack counters, and the endpoint that reloads them
+RULES_PATH = '/rules'
+RULES_RELOAD_PATH = '/rules/reload'
+
+# Propositional logic: a formula's classification and models, and its streamed truth table
+LOGIC_PATH = '/logic'
+LOGIC_TABLE_PATH = '/logic/table'
+
+# Most variables of a formula accepted by the logic endpoints (2^30 rows)
+MAX_LOGIC_VARIABLES = 30
+
+# Most variables of a formula /logic checks on the request thread (about 20 ms); larger
+# ones take up to seconds of CPU, so they run on the worker pool
+MAX_INLINE_LOGIC_VARIABLES = 20
+
+# Most variables for which /logic includes the result column in its reply
+MAX_INLINE_TABLE_VARIABLES = 16
+
+# Most variables of a CSV /logic/table (2^20 lines); the packed "bits" format goes up to MAX_LOGIC_VARIABLES
+MAX_CSV_TABLE_VARIABLES = 20
+
+# Content types of the /logic/table formats
+TABLE_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'bits': 'application/octet-stream'}
+
+
+def logic_summary(expression, other=None, table=False):
+    """The /logic reply for an Expression, compared with the Expression other if given"""
+    response = summarize(expression, MAX_INLINE_TABLE_VARIABLES if table else 0)
+    if other is not None:
+        counterexample = equivalence_counterexample(expression, other)
+        response['equivalent'] = counterexample is None
+        response['counterexample'] = counterexample
+    return response
+
+
+def _logic_in_worker(expression, other, table):
+    return logic_summary(Expression(expression), other and Expression(other), table)
+
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        """An error reported to the client as a JSON body with the given HTTP status"""
+        super().__init__(message)
+        self.status = status
+
+
+class AnalysisService:
+    def __init__(self, workers=None, timeout=REQUEST_TIMEOUT, instrument=False, **options):
+        """Run API requests on a ModalityAnalyzer whose worker pool does the CPU-bound work.
+        With instrument=True both analyzers collect stage timers for metrics(); with
+        rule_packs (a list of pack files) both use those rules."""
+        self.analyzer = ModalityAnalyzer(**options)
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # Live sessions run in this process on their own analyzer, one request at a time
+        self.live_analyzer = ModalityAnalyzer(**options)
+        self._sessions = OrderedDict()
+        self._live_lock = threading.Lock()
+        if instrument:
+            self.analyzer.enable_instrumentation()
+            self.live_analyzer.enable_instrumentation()
+
+    def start(self):
+        """Start the worker pool so the first request does not pay for it"""
+        with self._lock:
+            self.analyzer.get_pool(self.workers)
+
+    def close(self):
+        """Shut down the worker pool"""
+        with self._lock:
+            self.analyzer.close()
+
+    def submit(self, texts, callback=None, error_callback=None):
+        """Queue documents on the worker pool and return the AsyncResult"""
+        with self._lock:
+            return self.analyzer.submit(texts, self.workers, callback=callback, error_callback=error_callback)
+
+    def analyze_batch(self, texts):
+        """Analyze documents on the worker pool and return their results in order"""
+        pending = self.submit(texts)
+        try:
+            return pending.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            raise APIError(HTTPStatus.GATEWAY_TIMEOUT, 'analysis timed out')
+
+    def stream(self, body, content_type=''):
+        """Decode a /analyze/stream request body and return its (event, payload) iterator.
+
+        Sentences are scored on the worker pool and each 'sentence' event is
+        produced as soon as its chunk finishes; the closing 'result' event has the
+        paragraph scores, classification and explanation analyze() would report.
+        """
+        texts, _ = self.parse_request(STREAM_PATH, body, content_type)
+        return self._stream_events(texts)
+
+    def _stream_events(self, texts):
+        # Nothing is queued on the pool until the first event is requested; imap_sentences
+        # takes the pool and queues the work under the lock, so a rules reload cannot close it in between
+        with self._lock:
+            results = self.analyzer.imap_sentences(self.analyzer.split_stream(texts), self.workers,
+                                                   timeout=self.timeout)
+        accumulator = ParagraphAccumulator(self.analyzer)
+        try:
+            for result in results:
+                result['index'] = accumulator.count
+                accumulator.add(result['sentence'], result['scores'])
+                yield 'sentence', result
+        except multiprocessing.TimeoutError:
+            raise APIError(HTTPStatus.GATEWAY_TIMEOUT, 'analysis timed out')
+        except Exception as e:
+            raise APIError(HTTPStatus.INTERNAL_SERVER_ERROR, f'analysis failed: {e}')
+        yield 'result', accumulator.result()
+
+    def live(self, body):
+        """Apply a live-session request and return what changed.
+
+        The body is {"session": id, "text": string} to replace the session's text,
+        or {"session": id, "edit": {"start": int, "end": int, "text": string}} to
+        splice it. Only the sentences the change touched are rescored. The reply
+        has the paragraph result, the changed sentence range and the results of
+        the sentences now in it.
+        """
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise APIError(HTTPStatus.BAD_REQUEST, f'invalid request body: {e}')
+        session = payload.get('session') if isinstance(payload, dict) else None
+        if not isinstance(session, str):
+            raise APIError(HTTPStatus.BAD_REQUEST, 'expected {"session": string, "text" or "edit": ...}')
+        text, edit = payload.get('text'), payload.get('edit')
+        if edit is not None:
+            if not (isinstance(edit, dict) and isinstance(edit.get('start'), int)
+                    and isinstance(edit.get('end'), int) and isinstance(edit.get('text'), str)):
+                raise APIError(HTTPStatus.BAD_REQUEST, 'expected "edit": {"start": int, "end": int, "text": string}')
+        elif not isinstance(text, str):
+            raise APIError(HTTPStatus.BAD_REQUEST, 'expected "text": string or "edit"')
+
+        with self._live_lock:
+            # Nothing is created, counted or reordered for a request that is refused
+            document = self._sessions.get(session)
+            length = len(document.text) if document is not None else 0
+            if edit is not None:
+                if not 0 <= edit['start'] <= edit['end'] <= length:
+                    raise APIError(HTTPStatus.BAD_REQUEST, f'edit range outside the {length}-character text')
+                new_length = length - (edit['end'] - edit['start']) + len(edit['text'])
+            else:
+                new_length = len(text)
+            if new_length > MAX_LIVE_TEXT_CHARS:
+                raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f'live text would exceed {MAX_LIVE_TEXT_CHARS} characters')
+
+            if document is None:
+                document = IncrementalDocument(self.live_analyzer)
+            self._sessions.pop(session, None)
+            self._sessions[session] = document
+            while len(self._sessions) > MAX_LIVE_SESSIONS:
+                self._sessions.popitem(last=False)
+
+            if edit is not None:
+                start, old_end, new_end = document.edit(edit['start'], edit['end'], edit['text'])
+            else:
+                start, old_end, new_end = document.update(text)
+
+            response = document.summary()
+            response.update({
+                'session': session,
+                'changed': {'start': start, 'oldEnd': old_end, 'newEnd': new_end},
+                'sentenceResults': document.sentence_results[start:new_end],
+                'rescored': document.rescored
+            })
+            return response
+
+    def metrics(self):
+        """Counters of the pool workers and the live analyzer together, as ModalityAnalyzer.metrics() reports them"""
+        with self._lock:
+            pool = self.analyzer.metrics()
+        with self._live_lock:
+            live = self.live_analyzer.metrics()
+        metrics = Instrumentation().merge(pool).merge(live).to_dict()
+        metrics['cache'] = None  # each process has its own cache
+        return metrics
+
+    def metrics_response(self, query=''):
+        """(content type, body) of a GET /metrics request"""
+        metrics = self.metrics()
+        if parse_qs(query).get('format') == ['json']:
+            return 'application/json; charset=utf-8', json.dumps(metrics).encode('utf-8')
+        return 'text/plain; version=0.0.4; charset=utf-8', to_prometheus(metrics).encode('utf-8')
+
+    def rules(self):
+        """The rule packs in use and their rule counters (of every process, once instrumented), by pack"""
+        with self._lock:
+            rule_set = self.analyzer.rule_set
+        packs = stats_by_pack(self.analyzer, self.metrics()['rules'])
+        for totals in packs.values():
+            del totals['ruleStats']
+        summary = rule_set.describe() if rule_set is not None else {'hash': None, 'cached': False, 'packs': []}
+        summary['counters'] = packs
+        return summary
+    
+    def reload_rules(self):
+        """Load the rule pack files again and, if they changed, switch every analyzer to them.
+
+        The new worker pool is started before the old one is retired, and the old
+        one finishes whatever was already queued on it, so no request is dropped;
+        requests submitted after the swap use the new rules. Live sessions are
+        rescored with the new rules.
+        """
+        with self._lock:
+            current = self.analyzer.rule_set
+        if current is None:
+            raise APIError(HTTPStatus.CONFLICT, 'no rule packs loaded; start the server with --rule-packs')
+        try:
+            rule_set = load_rule_set(current.paths, current.cache_dir)
+        except RulePackError as e:
+            raise APIError(HTTPStatus.BAD_REQUEST, str(e))
+        changed = rule_set.hash != current.hash
+        if changed:
+            with self._lock:
+                self.analyzer.use_rule_set(rule_set)
+                self.analyzer.get_pool(self.workers)
+            with self._live_lock:
+                self.live_analyzer.use_rule_set(rule_set)
+                for session, document in self._sessions.items():
+                    self._sessions[session] = IncrementalDocument(self.live_analyzer, document.text)
+        response = rule_set.describe()
+        response['changed'] = changed
+        return response
+    
+    def parse_logic_request(self, body):
+        """Decode a /logic or /logic/table request body into (request dict, Expression)"""
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise APIError(HTTPStatus.BAD_REQUEST, f'invalid request body: {e}')
+        if not isinstance(payload, dict) or not isinstance(payload.get('expression'), str):
+            raise APIError(HTTPStatus.BAD_REQUEST, 'expected {"expression": string}')
+        try:
+            expression = Expression(payload['expression'])
+        except LogicError as e:
+            raise APIError(HTTPStatus.BAD_REQUEST, f'invalid expression: {e}')
+        if len(expression.variables) > MAX_LOGIC_VARIABLES:
+            raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'at most {MAX_LOGIC_VARIABLES} variables')
+        return payload, expression
+    
+    def logic(self, body):
+        """Classify a formula and find its first model and countermodel.
+
+        The body is {"expression": string}, plus "equivalent": string to check
+        equivalence with another formula, and "table": true for the result column
+        as a '0'/'1' string (row 0 first) when there are few enough variables.
+        """
+        payload, expression = self.parse_logic_request(body)
+        other = payload.get('equivalent')
+        table = bool(payload.get('table'))
+        variables = set(expression.variables)
+        if other is not None:
+            if not isinstance(other, str):
+                raise APIError(HTTPStatus.BAD_REQUEST, 'expected "equivalent": string')
+            try:
+                other = Expression(other)
+            except LogicError as e:
+                raise APIError(HTTPStatus.BAD_REQUEST, f'invalid expression: {e}')
+            variables.update(other.variables)
+            if len(variables) > MAX_LOGIC_VARIABLES:
+                raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'at most {MAX_LOGIC_VARIABLES} variables')
+        if len(variables) <= MAX_INLINE_LOGIC_VARIABLES:
+            return logic_summary(expression, other, table)
+
+        with self._lock:
+            pending = self.analyzer.get_pool(self.workers).apply_async(
+                _logic_in_worker, (str(expression), other and str(other), table))
+        try:
+            return pending.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            raise APIError(HTTPStatus.GATEWAY_TIMEOUT, 'logic check timed out')
+    
+    def logic_table(self, body):
+        """(content type, chunk iterator) of a /logic/table request.
+
+        The body is {"expression": string, "format": "csv" or "bits"}; see
+        logic_engine.table_chunks. Rows are produced a block at a time, so the
+        table is never held whole.
+        """
+        payload, expression = self.parse_logic_request(body)
+        table_format = payload.get('format', 'csv')
+        if table_format not in TABLE_CONTENT_TYPES:
+            raise APIError(HTTPStatus.BAD_REQUEST, f'"format" must be one of {", ".join(TABLE_CONTENT_TYPES)}')
+        if table_format == 'csv' and len(expression.variables) > MAX_CSV_TABLE_VARIABLES:
+            raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           f'at most {MAX_CSV_TABLE_VARIABLES} variables in a CSV table; use "format": "bits"')
+        return TABLE_CONTENT_TYPES[table_format], table_chunks(expression, table_format)
+    
+    def parse_request(self, path, body, content_type=''):
+        """Decode a request body into (texts, is_batch)"""
+        if path not in ('/analyze', '/analyze/batch', STREAM_PATH):
+            raise APIError(HTTPStatus.NOT_FOUND, f'no endpoint {path}')
+        batch = path == '/analyze/batch'
+
+        try:
+            if not batch and content_type.startswith('text/plain'):
+                return [body.decode('utf-8')], False
+            payload = json.loads(body)
+        except ValueError as e:
+            raise APIError(HTTPStatus.BAD_REQUEST, f'invalid request body: {e}')
+
+        if batch:
+            texts = payload.get('texts') if isinstance(payload, dict) else payload
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise APIError(HTTPStatus.BAD_REQUEST, 'expected {"texts": [string, ...]}')
+            if len(texts) > MAX_BATCH_DOCUMENTS:
+                raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f'at most {MAX_BATCH_DOCUMENTS} documents per batch')
+            return texts, True
+
+        text = payload.get('text') if isinstance(payload, dict) else payload
+        if not isinstance(text, str):
+            raise APIError(HTTPStatus.BAD_REQUEST, 'expected {"text": string}')
+        return [text], False
+
+    def handle(self, path, body, content_type=''):
+        """Run an API request and return (response object, stage timings in milliseconds)"""
+        started = time.perf_counter()
+        if path == LIVE_PATH:
+            response = self.live(body)
+            return response, {'analyze': (time.perf_counter() - started) * 1000}
+        if path == RULES_RELOAD_PATH:
+            response = self.reload_rules()
+            return response, {'reload': (time.perf_counter() - started) * 1000}
+        if path == LOGIC_PATH:
+            response = self.logic(body)
+            return response, {'logic': (time.perf_counter() - started) * 1000}
+        texts, batch = self.parse_request(path, body, content_type)
+        parsed = time.perf_counter()
+        results = self.analyze_batch(texts)
+        finished = time.perf_counter()
+
+        timings = {'parse': (parsed - started) * 1000, 'analyze': (finished - parsed) * 1000}
+        return ({'results': results} if batch else results[0]), timings
+
+
+def server_timing(timings):
+    """Format stage timings as a Server-Timing header value"""
+    return ', '.join(f'{name};dur={duration:.2f}' for name, duration in timings.items())
+
+
+def sse_event(event, payload):
+    """Encode one Server-Sent Event with a JSON data line"""
+    return f'event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'.encode('utf-8')
+
+
+# Response headers of an event stream; the stream ends when the connection closes
+SSE_HEADERS = [
+    ('Content-Type', 'text/event-stream; charset=utf-8'),
+    ('Cache-Control', 'no-store'),
+    # Reverse proxies would otherwise buffer the events
+    ('X-Accel-Buffering', 'no')
+]
+
+
+class AnalysisRequestHandler(SimpleHTTPRequestHandler):
+    # Keep-alive: clients reuse one connection for many requests
+    protocol_version = 'HTTP/1.1'
+
+    # Idle keep-alive connections are dropped after this many seconds
+    timeout = 30
+
+    # Headers and body are separate writes; Nagle would hold the body back for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Suppress server logs
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path == METRICS_PATH:
+            return self.send_metrics(query)
+        if path == RULES_PATH:
+            return self.send_json(HTTPStatus.OK, self.server.service.rules(), {})
+        asset = self.server.assets.get(path)
+        if asset is None:
+            super().do_GET()
+        else:
+            self.send_asset(asset, head_only=False)
+
+    def do_HEAD(self):
+        asset = self.server.assets.get(self.path.split('?', 1)[0])
+        if asset is None:
+            super().do_HEAD()
+        else:
+            self.send_asset(asset, head_only=True)
+
+    def send_metrics(self, query):
+        content_type, body = self.server.service.metrics_response(query)
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_asset(self, asset, head_only):
+        status, headers, body = asset_response(asset, self.headers)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def do_POST(self):
+        started = time.perf_counter()
+        path = self.path.split('?', 1)[0]
+        try:
+            body = self.read_body()
+            if path == STREAM_PATH:
+                events = self.server.service.stream(body, self.headers.get('Content-Type', ''))
+                return self.send_events(events)
+            if path == LOGIC_TABLE_PATH:
+                return self.send_stream(*self.server.service.logic_table(body))
+            response, timings = self.server.service.handle(path, body, self.headers.get('Content-Type', ''))
+        except APIError as e:
+            response, timings = {'error': str(e)}, {}
+            status = e.status
+        else:
+            status = HTTPStatus.OK
+        timings['total'] = (time.perf_counter() - started) * 1000
+        self.send_json(status, response, timings)
+
+    def read_body(self):
+        """Read the request body, refusing bodies without a length or over the size limit"""
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            # The rest of the stream cannot be framed, so the connection is closed afterwards
+            self.close_connection = True
+            raise APIError(HTTPStatus.LENGTH_REQUIRED, 'Content-Length is required')
+        length = int(length)
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'request body exceeds {MAX_REQUEST_BYTES} bytes')
+        return self.rfile.read(length)
+
+    def send_events(self, events):
+        """Write each (event, payload) as a Server-Sent Event as soon as it is produced"""
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        for name, value in SSE_HEADERS:
+            self.send_header(name, value)
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for event, payload in events:
+                self.wfile.write(sse_event(event, payload))
+        except APIError as e:
+            self.wfile.write(sse_event('error', {'error': str(e)}))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped listening; sentences already queued still finish on the pool
+
+    def send_stream(self, content_type, chunks):
+        """Write a body of unknown length as its chunks are produced, ending it by closing the connection"""
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped reading; the rest of the table is not produced
+
+    def send_json(self, status, payload, timings):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Server-Timing', server_timing(timings))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class AnalysisHTTPServer(ThreadingHTTPServer):
+    # Room for bursts of new connections while every handler thread is busy
+    request_queue_size = 128
+
+    # server_close() joins the handler threads, so requests in flight finish
+    daemon_threads = False
+
+    def __init__(self, address, service, directory=None):
+        """Serve the web assets in directory (default: the working directory) and the analysis API"""
+        self.service = service
+        self.assets = AssetCache(directory or os.getcwd())
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        super().__init__(address, partial(AnalysisRequestHandler, directory=directory))
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self):
+        """Close the listening socket and wait for the handler threads. Open connections
+        read no further requests: an idle keep-alive connection ends at once, and a request
+        already being handled finishes and gets its response."""
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        super().server_close()
+
+
+def make_server(address, service, directory=None, mode='threaded', **options):
+    """Create the threaded server, or with mode='async' the asyncio server; both offer
+    serve_forever, shutdown and server_close"""
+    if mode == 'async':
+        from async_server import AsyncAnalysisServer
+        return AsyncAnalysisServer(address, service, directory, **options)
+    return AnalysisHTTPServer(address, service, directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the modality analyzer web app and HTTP API')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help='analysis processes (default: one per CPU)')
+    parser.add_argument('--directory', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory of web assets to serve')
+    parser.add_argument('--max-sentence-length', type=int, default=None, help='split longer sentences into chunks')
+    parser.add_argument('--cache-size', type=int, default=None, help='in-memory sentence score cache entries')
+    parser.add_argument('--store', default=None, help='persistent score store (SQLite file)')
+    parser.add_argument('--instrument', action='store_true',
+                        help='collect stage timers and counters for GET /metrics')
+    parser.add_argument('--rule-packs', nargs='+', default=None, metavar='PACK',
+                        help='rule pack files to use instead of the built-in rules, in priority order')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='serve from an asyncio event loop with admission control')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='async mode: requests analyzed at once before answering 503 (default: 4 per worker)')
+    args = parser.parse_args()
+
+    try:
+        service = AnalysisService(args.workers, instrument=args.instrument, max_sentence_length=args.max_sentence_length,
+                                  cache_size=args.cache_size, store_path=args.store, rule_packs=args.rule_packs)
+    except RulePackError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    service.start()
+    try:
+        server = make_server((args.host, args.port), service, args.directory,
+                             'async' if args.use_async else 'threaded', max_in_flight=args.max_in_flight)
+    except OSError as e:
+        print(f"Failed to start server: {e}")
+        service.close()
+        return False
+
+    mode = 'async' if args.use_async else 'threaded'
+    print(f"Serving ({mode}) on http://{args.host}:{server.server_address[1]} with {service.workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return True
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    # Run the importable copy of this module so async_server shares its classes (e.g. APIError)
+    from analysis_server import main
+    success = main()
+    if not success:
+        sys.exit(1)
@@ -9,15 +9,24 @@ import sys
 import webbrowser
 import threading
 import time
-from http.server import HTTPServer, SimpleHTTPRequestHandler
 import tkinter as tk
 from tkinter import messagebox
+from instrumentation import format_summary
+
+# Milliseconds between refreshes of the stage timings shown with --metrics
+METRICS_REFRESH = 1000
 
 class ModalityAnalyzerApp:
-    def __init__(self):
+    def __init__(self, server_mode='threaded', instrument=False):
+        # 'threaded' or 'async' (asyncio event loop with admission control)
+        self.server_mode = server_mode
+        # Collect stage timers (served at /metrics) and show them in the window
+        self.instrument = instrument
         self.port = 8080
         self.server = None
         self.server_thread = None
+        self.service = None
+        self.root = None
         
     def find_available_port(self):
         """Find an available port starting from 8080"""
@@ -33,15 +42,15 @@ class ModalityAnalyzerApp:
         return 8080
     
     def start_server(self):
-        """Start the HTTP server in a separate thread"""
+        """Start the HTTP server and its analysis worker pool in separate threads/processes"""
+        from analysis_server import AnalysisService, make_server
         self.find_available_port()
         
-        class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
-            def log_message(self, format, *args):
-                pass  # Suppress server logs
-        
         try:
-            self.server = HTTPServer(('localhost', self.port), QuietHTTPRequestHandler)
+            # Warm the pool before serving so the first /analyze request is fast
+            self.service = AnalysisService(instrument=self.instrument)
+            self.service.start()
+            self.server = make_server(('localhost', self.port), self.service, mode=self.server_mode)
             self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
             self.server_thread.start()
             return True
@@ -50,10 +59,12 @@ class ModalityAnalyzerApp:
             return False
     
     def stop_server(self):
-        """Stop the HTTP server"""
+        """Stop the HTTP server, letting in-flight requests finish, then the worker pool"""
         if self.server:
             self.server.shutdown()
             self.server.server_close()
+        if self.service:
+            self.service.close()
     
     def open_browser(self):
         """Open the application in the default browser"""
@@ -63,6 +74,7 @@ class ModalityAnalyzerApp:
     def create_gui(self):
         """Create a simple GUI window"""
         root = tk.Tk()
+        self.root = root
         root.title("Modality Analyzer")
         root.geometry("400x300")
         root.resizable(False, False)
@@ -90,6 +102,11 @@ class ModalityAnalyzerApp:
                                     font=("Arial", 9), fg="blue")
         self.status_label.pack(pady=(0, 20))
         
+        # Stage timings, with --metrics
+        self.metrics_label = tk.Label(main_frame, text="", font=("Arial", 8), fg="#666", wraplength=350)
+        if self.instrument:
+            self.metrics_label.pack(pady=(0, 10))
+        
         # Buttons frame
         buttons_frame = tk.Frame(main_frame)
         buttons_frame.pack(pady=10)
@@ -133,19 +150,33 @@ class ModalityAnalyzerApp:
         if self.start_server():
             self.status_label.config(text=f"Server running on port {self.port}", fg="green")
             self.launch_button.config(state=tk.NORMAL)
+            if self.instrument:
+                self.update_metrics()
         else:
             self.status_label.config(text="Failed to start server", fg="red")
             messagebox.showerror("Error", "Failed to start the web server")
     
+    def update_metrics(self):
+        """Show the server's cumulative stage timings, refreshed while the window is open"""
+        if self.root is None or self.service is None:
+            return
+        self.metrics_label.config(text=format_summary(self.service.metrics()))
+        self.root.after(METRICS_REFRESH, self.update_metrics)
+    
     def launch_app(self):
         """Launch the application in browser"""
         self.open_browser()
         self.status_label.config(text="Application launched in browser", fg="green")
     
     def exit_app(self):
-        """Exit the application"""
+        """Exit the application once the server has drained"""
+        if self.root is not None:
+            self.status_label.config(text="Shutting down...", fg="blue")
+            self.root.update_idletasks()
         self.stop_server()
-        sys.exit(0)
+        if self.root is not None:
+            self.root.destroy()
+            self.root = None
     
     def run(self):
         """Run the desktop application"""
@@ -158,5 +189,7 @@ class ModalityAnalyzerApp:
         root.mainloop()
 
 if __name__ == "__main__":
-    app = ModalityAnalyzerApp()
+    import multiprocessing
+    multiprocessing.freeze_support()
+    app = ModalityAnalyzerApp('async' if '--async' in sys.argv[1:] else 'threaded', instrument='--metrics' in sys.argv[1:])
     app.run()
@@ -0,0 +1,173 @@
+"""
+In-memory cache of the web app's static assets.
+Files are preloaded and pre-compressed once, served with strong validators and
+reloaded when they change on disk.
+"""
+
+import os
+import gzip
+import time
+import hashlib
+from http import HTTPStatus
+from email.utils import formatdate, parsedate_to_datetime
+
+ASSET_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.md': 'text/markdown; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.ico': 'image/x-icon'
+}
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'image/svg+xml')
+
+# Bodies smaller than this are not worth compressing
+MIN_GZIP_BYTES = 256
+
+
+class Asset:
+    def __init__(self, path, content_type):
+        """Read path into memory along with its gzip variant and validators"""
+        stat = os.stat(path)
+        with open(path, 'rb') as handle:
+            self.body = handle.read()
+
+        self.path = path
+        self.content_type = content_type
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        self.checked = time.monotonic()
+
+        digest = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+
+        # Each encoding is a distinct representation, so it gets its own strong ETag
+        self.gzip_body = None
+        self.gzip_etag = None
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(self.body) >= MIN_GZIP_BYTES:
+            compressed = gzip.compress(self.body, 9, mtime=0)
+            if len(compressed) < len(self.body):
+                self.gzip_body = compressed
+                self.gzip_etag = f'"{digest}-gz"'
+
+
+class AssetCache:
+    def __init__(self, directory, check_interval=1.0):
+        """Preload every servable file directly inside directory; files are re-checked
+        for changes at most once per check_interval seconds"""
+        self.directory = os.path.abspath(directory)
+        self.check_interval = check_interval
+        self._assets = {}
+        self.hits = 0
+        self.reloads = 0
+
+        for name in sorted(os.listdir(self.directory)):
+            self._load(name)
+
+    def _load(self, name):
+        content_type = ASSET_TYPES.get(os.path.splitext(name)[1].lower())
+        path = os.path.join(self.directory, name)
+        if content_type is None or not os.path.isfile(path):
+            self._assets.pop(name, None)
+            return None
+        asset = self._assets[name] = Asset(path, content_type)
+        return asset
+
+    def get(self, url_path):
+        """Return the Asset for a request path, or None if it is not a cached file"""
+        name = url_path.lstrip('/') or 'index.html'
+        # Only flat file names; anything else is left to the regular file handler
+        if '/' in name or '\\' in name or name.startswith('.'):
+            return None
+
+        asset = self._assets.get(name)
+        now = time.monotonic()
+        if asset is not None and now - asset.checked < self.check_interval:
+            self.hits += 1
+            return asset
+
+        # Pick up edits, new files and deletions during development
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            self._assets.pop(name, None)
+            return None
+        if asset is not None and asset.signature == (stat.st_mtime_ns, stat.st_size):
+            asset.checked = now
+            self.hits += 1
+            return asset
+        if asset is not None:
+            self.reloads += 1
+        return self._load(name)
+
+    def stats(self):
+        """Asset counts and sizes, raw and compressed"""
+        assets = list(self._assets.values())
+        return {
+            'assets': len(assets),
+            'bytes': sum(len(asset.body) for asset in assets),
+            'gzipBytes': sum(len(asset.gzip_body or asset.body) for asset in assets),
+            'hits': self.hits,
+            'reloads': self.reloads
+        }
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header value allows gzip"""
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() not in ('gzip', '*'):
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def not_modified(asset, headers):
+    """Whether the request headers show the client already holds this version of asset"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or asset.etag in tags or asset.gzip_etag in tags
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return asset.mtime <= since
+    return False
+
+
+def asset_response(asset, headers):
+    """Return (status, response headers, body) answering a GET for asset, with 304 for
+    fresh conditional requests and gzip when the client accepts it"""
+    compressed = asset.gzip_body is not None and accepts_gzip(headers.get('Accept-Encoding', ''))
+    body, etag = (asset.gzip_body, asset.gzip_etag) if compressed else (asset.body, asset.etag)
+
+    if not_modified(asset, headers):
+        status = HTTPStatus.NOT_MODIFIED
+        body = b''
+        response_headers = []
+    else:
+        status = HTTPStatus.OK
+        response_headers = [('Content-Type', asset.content_type), ('Content-Length', str(len(body)))]
+        if compressed:
+            response_headers.append(('Content-Encoding', 'gzip'))
+    response_headers.append(('ETag', etag))
+    response_headers.append(('Last-Modified', asset.last_modified))
+    # Browsers revalidate on every load, which is a cheap 304 until a file changes
+    response_headers.append(('Cache-Control', 'no-cache'))
+    if asset.gzip_body is not None:
+        response_headers.append(('Vary', 'Accept-Encoding'))
+    return status, response_headers, body
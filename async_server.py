@@ -0,0 +1,420 @@
+"""
+asyncio serving mode for the modality analyzer HTTP API.
+One event loop holds every connection, so thousands of idle keep-alive clients
+cost a few kilobytes each. Analysis is admitted up to a bounded number of
+in-flight requests; beyond that, clients get 503 with Retry-After instead of
+joining an ever longer queue.
+"""
+
+import io
+import os
+import json
+import math
+import time
+import signal
+import socket
+import asyncio
+import threading
+import http.client
+from functools import partial
+from http import HTTPStatus
+from email.utils import formatdate
+
+from asset_cache import AssetCache, asset_response
+from analysis_server import (APIError, MAX_REQUEST_BYTES, REQUEST_TIMEOUT, STREAM_PATH, LIVE_PATH, METRICS_PATH,
+                             RULES_PATH, RULES_RELOAD_PATH, LOGIC_PATH, LOGIC_TABLE_PATH, SSE_HEADERS,
+                             server_timing, sse_event)
+
+# Largest request line plus headers accepted, in bytes
+MAX_HEADER_BYTES = 64 << 10
+
+# Idle keep-alive connections are dropped after this many seconds
+IDLE_TIMEOUT = 30
+
+
+class AsyncAnalysisServer:
+    def __init__(self, address, service, directory=None, max_in_flight=None,
+                 deadline=REQUEST_TIMEOUT, drain_timeout=10):
+        """Bind address and serve the web assets and analysis API on an asyncio event loop.
+
+        At most max_in_flight requests (default: four per worker) are analyzing at
+        once; each gets deadline seconds before it is answered with 504. Mirrors the
+        socketserver interface (serve_forever, shutdown, server_close) used by the
+        threaded server.
+        """
+        self.service = service
+        self.assets = AssetCache(directory or os.getcwd())
+        self.max_in_flight = max_in_flight or service.workers * 4
+        self.deadline = deadline
+        self.drain_timeout = drain_timeout
+
+        # Bind now, as socketserver does, so a busy port is reported to the caller
+        self.socket = socket.create_server(address, backlog=1024)
+        self.server_address = self.socket.getsockname()[:2]
+
+        self.in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of pool time per request, used for Retry-After
+        self.service_time = 0.05
+
+        self._loop = None
+        self._stop = None
+        self._stopped = threading.Event()
+        self._draining = False
+        self._connections = set()
+        self._idle = set()
+
+    def serve_forever(self):
+        """Run the event loop until shutdown() is called, then drain"""
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Stop accepting connections and wait for in-flight requests to finish"""
+        if self._loop is not None and not self._stopped.is_set():
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._stopped.wait()
+
+    def server_close(self):
+        self.socket.close()
+
+    def stats(self):
+        """Admission counters"""
+        return {
+            'connections': len(self._connections),
+            'idle': len(self._idle),
+            'inFlight': self.in_flight,
+            'maxInFlight': self.max_in_flight,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'timedOut': self.timed_out,
+            'serviceTime': self.service_time
+        }
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    self._loop.add_signal_handler(signum, self._stop.set)
+                except (NotImplementedError, RuntimeError):
+                    pass  # Windows: Ctrl+C still interrupts, just without draining
+
+        server = await asyncio.start_server(self.handle_connection, sock=self.socket, limit=MAX_HEADER_BYTES)
+        try:
+            await self._stop.wait()
+        finally:
+            await self._drain(server)
+            self._stopped.set()
+
+    async def _drain(self, server):
+        # Stop accepting, hang up on idle clients, and give busy ones time to get their answer
+        self._draining = True
+        server.close()
+        for writer in list(self._idle):
+            writer.close()
+        deadline = self._loop.time() + self.drain_timeout
+        while self._connections and self._loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for writer in list(self._connections):
+            writer.close()
+
+    async def handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            keep_alive = True
+            while keep_alive and not self._draining:
+                self._idle.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                finally:
+                    self._idle.discard(writer)
+                keep_alive = await self.handle_request(head, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # Client went away mid-request
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def handle_request(self, head, reader, writer):
+        """Answer one request; returns whether the connection stays open"""
+        started = time.perf_counter()
+        request_line, _, header_block = head.partition(b'\r\n')
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self.respond(writer, HTTPStatus.BAD_REQUEST, [], b'', keep_alive=False)
+            return False
+        try:
+            headers = http.client.parse_headers(io.BytesIO(header_block))
+        except http.client.HTTPException as e:
+            # Too many header lines, or one too long
+            error = APIError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, f'invalid headers: {e}')
+            return await self.respond_error(writer, error, False, started)
+
+        connection = headers.get('Connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        keep_alive = keep_alive and not self._draining
+        path, _, query = target.partition('?')
+
+        if method == 'GET' and path == METRICS_PATH:
+            # Collecting waits for any live edit in progress, so it runs off the event loop
+            content_type, body = await self._loop.run_in_executor(None, self.service.metrics_response, query)
+            await self.respond(writer, HTTPStatus.OK, [('Content-Type', content_type), ('Content-Length', str(len(body))),
+                                                       ('Cache-Control', 'no-store')], body, keep_alive)
+            return keep_alive
+
+        if method == 'GET' and path == RULES_PATH:
+            response = await self._loop.run_in_executor(None, self.service.rules)
+            await self.respond_json(writer, HTTPStatus.OK, response, keep_alive, {})
+            return keep_alive
+
+        if method in ('GET', 'HEAD'):
+            asset = self.assets.get(path)
+            if asset is None:
+                return await self.respond_error(writer, APIError(HTTPStatus.NOT_FOUND, f'no file {path}'),
+                                                keep_alive, started)
+            status, response_headers, body = asset_response(asset, headers)
+            await self.respond(writer, status, response_headers, b'' if method == 'HEAD' else body, keep_alive)
+            return keep_alive
+
+        if method != 'POST':
+            return await self.respond_error(writer, APIError(HTTPStatus.METHOD_NOT_ALLOWED, f'{method} not supported'),
+                                            keep_alive, started)
+
+        length = headers.get('Content-Length', '')
+        if not length.isdigit():
+            return await self.respond_error(writer, APIError(HTTPStatus.LENGTH_REQUIRED, 'Content-Length is required'),
+                                            False, started)
+        if int(length) > MAX_REQUEST_BYTES:
+            return await self.respond_error(writer, APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                                             f'request body exceeds {MAX_REQUEST_BYTES} bytes'),
+                                            False, started)
+        body = await reader.readexactly(int(length))
+
+        if path == STREAM_PATH:
+            try:
+                events = self.service.stream(body, headers.get('Content-Type', ''))
+                self.admit()
+            except APIError as e:
+                return await self.respond_error(writer, e, keep_alive, started)
+            await self.stream(writer, events)
+            return False
+
+        if path == LIVE_PATH:
+            try:
+                response = await self.run_live(body)
+            except APIError as e:
+                return await self.respond_error(writer, e, keep_alive, started)
+            finished = time.perf_counter()
+            await self.respond_json(writer, HTTPStatus.OK, response, keep_alive, {'total': (finished - started) * 1000})
+            return keep_alive
+
+        if path == LOGIC_PATH:
+            try:
+                response = await self.run_blocking(self.service.logic, body)
+            except APIError as e:
+                return await self.respond_error(writer, e, keep_alive, started)
+            finished = time.perf_counter()
+            await self.respond_json(writer, HTTPStatus.OK, response, keep_alive, {'total': (finished - started) * 1000})
+            return keep_alive
+
+        if path == LOGIC_TABLE_PATH:
+            try:
+                content_type, chunks = self.service.logic_table(body)
+                self.admit()
+            except APIError as e:
+                return await self.respond_error(writer, e, keep_alive, started)
+            await self.stream_body(writer, content_type, chunks)
+            return False
+
+        if path == RULES_RELOAD_PATH:
+            # Reading and compiling packs and starting the new pool block, so they run off the event loop
+            try:
+                response = await self._loop.run_in_executor(None, self.service.reload_rules)
+            except APIError as e:
+                return await self.respond_error(writer, e, keep_alive, started)
+            finished = time.perf_counter()
+            await self.respond_json(writer, HTTPStatus.OK, response, keep_alive, {'total': (finished - started) * 1000})
+            return keep_alive
+
+        try:
+            texts, batch = self.service.parse_request(path, body, headers.get('Content-Type', ''))
+            parsed = time.perf_counter()
+            results = await self.analyze(texts)
+        except APIError as e:
+            return await self.respond_error(writer, e, keep_alive, started)
+        finished = time.perf_counter()
+
+        timings = {'parse': (parsed - started) * 1000, 'analyze': (finished - parsed) * 1000,
+                   'total': (finished - started) * 1000}
+        await self.respond_json(writer, HTTPStatus.OK, {'results': results} if batch else results[0],
+                                keep_alive, timings)
+        return keep_alive
+
+    def admit(self):
+        """Take an in-flight slot, or raise 503 when the server is saturated or draining"""
+        if self._draining:
+            raise APIError(HTTPStatus.SERVICE_UNAVAILABLE, 'server is shutting down')
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise APIError(HTTPStatus.SERVICE_UNAVAILABLE, 'server is at capacity')
+        self.in_flight += 1
+        self.accepted += 1
+
+    def release(self, submitted):
+        """Give back an in-flight slot taken at time submitted"""
+        self.in_flight -= 1
+        elapsed = time.perf_counter() - submitted
+        self.service_time += (elapsed - self.service_time) * 0.1
+
+    async def analyze(self, texts):
+        """Run texts on the worker pool, subject to admission control and the deadline"""
+        # A slot is held until the pool finishes, even if the client's deadline passes first,
+        # so timed-out work still counts against the capacity it is using
+        self.admit()
+        future = self._loop.create_future()
+        submitted = time.perf_counter()
+
+        def finish(outcome, error):
+            self.release(submitted)
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(APIError(HTTPStatus.INTERNAL_SERVER_ERROR, f'analysis failed: {error}'))
+            else:
+                future.set_result(outcome)
+
+        # submit takes the service lock and may have to start the pool, so it runs off the event loop
+        try:
+            await self._loop.run_in_executor(None, partial(
+                self.service.submit, texts,
+                callback=lambda results: self._loop.call_soon_threadsafe(finish, results, None),
+                error_callback=lambda error: self._loop.call_soon_threadsafe(finish, None, error)))
+        except Exception as e:
+            self.release(submitted)
+            raise APIError(HTTPStatus.INTERNAL_SERVER_ERROR, f'analysis failed: {e}')
+        try:
+            return await asyncio.wait_for(future, self.deadline)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise APIError(HTTPStatus.GATEWAY_TIMEOUT, 'analysis timed out')
+
+    async def run_live(self, body):
+        """Apply a live-session edit on an executor thread, under admission control"""
+        return await self.run_blocking(self.service.live, body)
+
+    async def run_blocking(self, function, *args):
+        """Run a CPU-bound service call on an executor thread, subject to admission control and the deadline"""
+        # As in analyze(), the slot is held until the call returns, even if the deadline passes first
+        self.admit()
+        submitted = time.perf_counter()
+        future = self._loop.run_in_executor(None, function, *args)
+
+        def finish(done):
+            self.release(submitted)
+            if not done.cancelled():
+                done.exception()  # retrieved, so a call that outlived its request is not reported as unhandled
+
+        future.add_done_callback(finish)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.deadline)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise APIError(HTTPStatus.GATEWAY_TIMEOUT, 'request timed out')
+
+    async def stream(self, writer, events):
+        """Send (event, payload) pairs as Server-Sent Events; the caller has taken a slot.
+
+        The pool's results are awaited on an executor thread, which holds the slot
+        until the document is finished even if the client hangs up early.
+        """
+        queue = asyncio.Queue()
+        submitted = time.perf_counter()
+
+        def produce():
+            try:
+                for event in events:
+                    self._loop.call_soon_threadsafe(queue.put_nowait, event)
+            except APIError as e:
+                self._loop.call_soon_threadsafe(queue.put_nowait, ('error', {'error': str(e)}))
+            finally:
+                self._loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        producer = self._loop.run_in_executor(None, produce)
+        producer.add_done_callback(lambda _: self.release(submitted))
+        await self.respond(writer, HTTPStatus.OK, SSE_HEADERS, b'', keep_alive=False)
+        while (event := await queue.get()) is not None:
+            writer.write(sse_event(*event))
+            await writer.drain()
+
+    async def stream_body(self, writer, content_type, chunks):
+        """Send chunks of a body of unknown length, ending it by closing the connection;
+        the caller has taken a slot.
+
+        Chunks are produced on an executor thread that waits while the client is
+        behind by more than a few chunks, and stops if the client hangs up.
+        """
+        queue = asyncio.Queue(maxsize=4)
+        submitted = time.perf_counter()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for chunk in chunks:
+                    if cancelled.is_set():
+                        return
+                    asyncio.run_coroutine_threadsafe(queue.put(chunk), self._loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), self._loop).result()
+
+        producer = self._loop.run_in_executor(None, produce)
+        producer.add_done_callback(lambda _: self.release(submitted))
+        await self.respond(writer, HTTPStatus.OK, [('Content-Type', content_type), ('Cache-Control', 'no-store')],
+                           b'', keep_alive=False)
+        try:
+            while (chunk := await queue.get()) is not None:
+                writer.write(chunk)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            cancelled.set()
+            # Let the producer finish its pending put and stop; None is always its last item
+            while await queue.get() is not None:
+                pass
+            raise
+
+    def retry_after(self):
+        """Seconds until the in-flight requests are expected to have finished"""
+        return max(1, math.ceil(self.in_flight * self.service_time / self.service.workers))
+
+    async def respond_error(self, writer, error, keep_alive, started):
+        extra = [('Retry-After', str(self.retry_after()))] if error.status == HTTPStatus.SERVICE_UNAVAILABLE else []
+        timings = {'total': (time.perf_counter() - started) * 1000}
+        await self.respond_json(writer, error.status, {'error': str(error)}, keep_alive, timings, extra)
+        return keep_alive
+
+    async def respond_json(self, writer, status, payload, keep_alive, timings, extra_headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = [
+            ('Content-Type', 'application/json; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+            ('Cache-Control', 'no-store'),
+            ('Server-Timing', server_timing(timings))
+        ]
+        headers.extend(extra_headers)
+        await self.respond(writer, status, headers, body, keep_alive)
+
+    async def respond(self, writer, status, headers, body, keep_alive):
+        lines = [f'HTTP/1.1 {status.value} {status.phrase}', f'Date: {formatdate(usegmt=True)}']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        if not keep_alive or self._draining:
+            lines.append('Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the modality analyzer.
+Generates a seeded synthetic corpus, times each analysis stage and analyze()
+end to end on it, and compares the numbers with a stored JSON baseline.
+
+    python benchmark.py
+    python benchmark.py --save-baseline benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json --threshold 0.15
+    python benchmark.py --baseline ci-runner-baseline.json --normalize
+    python benchmark.py --only analyze/ --scale 0.5 --repeat 5
+"""
+
+import gc
+import sys
+import json
+import time
+import re
+import random
+import platform
+import argparse
+import tracemalloc
+
+from modality_engine import ModalityAnalyzer, ParagraphAccumulator
+
+# Bump when the corpus generator or the benchmarks change; results of different versions are not comparable
+BENCHMARK_VERSION = 1
+
+# The vocabulary is fixed here rather than read from the analyzer, so a change
+# to the rules is measured on the same corpus as before it
+NEUTRAL_WORDS = ('the', 'report', 'committee', 'river', 'city', 'data', 'results', 'morning', 'garden', 'system',
+                 'paper', 'students', 'market', 'evening', 'office', 'project', 'history', 'window', 'train', 'music',
+                 'was', 'were', 'has', 'opened', 'closed', 'moved', 'found', 'wrote', 'read', 'near', 'under',
+                 'after', 'before', 'with', 'from', 'into', 'quietly', 'early', 'late', 'again', 'three', 'seven')
+MODAL_WORDS = ('certain', 'sure', 'believe', 'think', 'know', 'must', 'should', 'ought', 'required', 'allowed',
+               'can', 'could', 'may', 'might', 'possible', 'perhaps', 'maybe', 'likely', 'probable', 'probably',
+               'weather', 'tomorrow')
+RULE_PHRASES = ('all triangles have three sides', 'all bachelors are unmarried', 'by definition', 'necessarily true',
+                'logically necessary', 'a tautology', 'an axiom', 'the theorem', 'either it rains or not',
+                'a married bachelor', 'a square circle', 'true and false', 'exists and does not exist',
+                'self-contradictory', 'contradictions are impossible', 'the logical system', '2 + 2 = 4', '17 * 3 = 51')
+ENDINGS = ('.', '.', '.', '.', '?', '!', '...')
+
+# Documents per corpus kind at --scale 1
+CORPUS_SIZES = {'sentences': 2000, 'paragraphs': 300, 'essays': 30, 'runon': 6, 'rule_heavy': 1000}
+
+STAGES = ('split', 'necessity', 'impossibility', 'contingent', 'aggregation', 'explanation', 'analyze')
+
+PERCENTILES = (50, 95, 99)
+
+# Benchmarks of a few fast calls are repeated until they have been timed this long
+MIN_SECONDS = 0.2
+MAX_REPEATS = 1000
+
+
+def make_sentence(rng, modal_rate=0.3, rule_rate=0.1):
+    words = [rng.choice(NEUTRAL_WORDS) for _ in range(rng.randint(5, 22))]
+    if rng.random() < modal_rate:
+        words.insert(rng.randrange(len(words)), rng.choice(MODAL_WORDS))
+    if rng.random() < rule_rate:
+        words.insert(rng.randrange(len(words)), rng.choice(RULE_PHRASES))
+    return ' '.join(words).capitalize() + rng.choice(ENDINGS)
+
+
+def make_runon(rng):
+    # No sentence punctuation at all, a long digit run and repeated 'either': worst cases
+    # for the splitter, the arithmetic pattern and the 'either.*or not' rules
+    words = [rng.choice(NEUTRAL_WORDS + MODAL_WORDS) for _ in range(3000)]
+    words.insert(1000, ' '.join(str(rng.randrange(10)) for _ in range(2000)))
+    words.extend(['either'] * 200)
+    return ' '.join(words)
+
+
+def generate_corpus(kind, count, seed=0):
+    """count synthetic documents of one kind; the same seed always gives the same corpus"""
+    # Seeded per kind, so scaling one corpus does not change the others
+    rng = random.Random(f'{seed}:{kind}')
+    if kind == 'sentences':
+        return [make_sentence(rng) for _ in range(count)]
+    if kind == 'paragraphs':
+        return [' '.join(make_sentence(rng) for _ in range(rng.randint(3, 8))) for _ in range(count)]
+    if kind == 'essays':
+        return ['\n\n'.join(' '.join(make_sentence(rng) for _ in range(rng.randint(3, 8)))
+                            for _ in range(rng.randint(8, 15))) for _ in range(count)]
+    if kind == 'runon':
+        return [make_runon(rng) for _ in range(count)]
+    if kind == 'rule_heavy':
+        return [make_sentence(rng, modal_rate=0.9, rule_rate=0.9) for _ in range(count)]
+    raise ValueError(f'unknown corpus kind {kind!r}')
+
+
+def prepare(analyzer, documents):
+    """Everything the stage benchmarks need, computed outside the timed code"""
+    sentences = [analyzer.split_into_sentences(document) for document in documents]
+    scores = [[analyzer.calculate_modality_scores(sentence) for sentence in document] for document in sentences]
+    accumulators = []
+    for document, document_scores in zip(sentences, scores):
+        accumulator = ParagraphAccumulator(analyzer)
+        for sentence, sentence_scores in zip(document, document_scores):
+            accumulator.add(sentence, sentence_scores)
+        accumulators.append(accumulator)
+    return {
+        'documents': documents,
+        'sentences': sentences,
+        'flat': [sentence for document in sentences for sentence in document],
+        'lowered': [sentence.lower() for document in sentences for sentence in document],
+        'scores': scores,
+        'accumulators': accumulators
+    }
+
+
+def stage_calls(analyzer, stage, data):
+    """(calls, sentences): the timed calls of one stage as zero-argument functions, and
+    the number of sentences they cover in total"""
+    if stage == 'split':
+        return [lambda d=d: analyzer.split_into_sentences(d) for d in data['documents']], len(data['flat'])
+    if stage == 'necessity':
+        return [lambda s=s: analyzer.detect_logical_necessity(s) for s in data['flat']], len(data['flat'])
+    if stage == 'impossibility':
+        return [lambda s=s: analyzer.detect_logical_impossibility(s) for s in data['flat']], len(data['flat'])
+    if stage == 'contingent':
+        return [lambda s=s: analyzer.analyze_contingent_statement({'necessity': 0, 'possibility': 0, 'impossibility': 0}, s)
+                for s in data['lowered']], len(data['flat'])
+    if stage == 'aggregation':
+        def aggregate(document, document_scores):
+            accumulator = ParagraphAccumulator(analyzer)
+            for sentence, scores in zip(document, document_scores):
+                accumulator.add(sentence, scores)
+            return analyzer.classify_modality(accumulator.paragraph_scores())
+        return [lambda d=d, s=s: aggregate(d, s) for d, s in zip(data['sentences'], data['scores'])], len(data['flat'])
+    if stage == 'explanation':
+        def explain(accumulator):
+            scores = accumulator.paragraph_scores()
+            return analyzer.explain_distribution(accumulator.distribution, accumulator.count, scores,
+                                                 analyzer.classify_modality(scores))
+        return [lambda a=a: explain(a) for a in data['accumulators'] if a.count], len(data['flat'])
+    if stage == 'analyze':
+        return [lambda d=d: analyzer.analyze(d) for d in data['documents']], len(data['flat'])
+    raise ValueError(f'unknown stage {stage!r}')
+
+
+def calibrate(repeat=5):
+    """Fastest time, in ms, of a fixed workload of the kind the analyzer does (regex
+    scans, lowercasing, dict updates). It is timed next to every benchmark, so
+    compare() can tell a slower machine, or a busy moment, from slower code."""
+    text = ' '.join(NEUTRAL_WORDS + MODAL_WORDS) * 200
+    pattern = re.compile(r'\b(?:might|must|theorem)\b')
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        counts = {}
+        for word in pattern.findall(text.lower()):
+            counts[word] = counts.get(word, 0) + 1
+        for piece in text.split(' '):
+            counts[piece.upper()] = len(piece)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 4)
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def run_benchmark(calls, sentences, repeat=3, measure_memory=True):
+    """Time calls at least repeat times, and until MIN_SECONDS have been timed.
+    Throughput is from the fastest repeat, latency percentiles are over every call
+    of every repeat, and peak memory is taken in one extra traced run so tracing
+    does not slow the timed ones."""
+    latencies = []
+    best = None
+    total = 0.0
+    repeats = 0
+    clock = time.perf_counter
+    # As timeit does, keep the collector from landing its pauses on whichever call allocates next
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # One untimed pass first, so lazily built rules and caches are not charged to the first call
+        for call in calls:
+            call()
+        while repeats < repeat or (total < MIN_SECONDS and repeats < MAX_REPEATS):
+            started = clock()
+            for call in calls:
+                call_started = clock()
+                call()
+                latencies.append(clock() - call_started)
+            elapsed = clock() - started
+            best = elapsed if best is None else min(best, elapsed)
+            total += elapsed
+            repeats += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    latencies.sort()
+
+    result = {
+        'calibrationMs': calibrate(),
+        'calls': len(calls),
+        'repeats': repeats,
+        'sentences': sentences,
+        'seconds': round(best, 6),
+        'sentencesPerSecond': round(sentences / best, 1) if best else 0.0,
+        'latencyMs': {f'p{p}': round(percentile(latencies, p) * 1000, 4) for p in PERCENTILES}
+    }
+    if measure_memory:
+        tracemalloc.start()
+        for call in calls:
+            call()
+        result['peakKB'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+def run_suite(scale=1.0, seed=0, repeat=3, only=None, measure_memory=True, progress=None):
+    """Run every stage on every corpus kind; returns the report dict that baselines store"""
+    analyzer = ModalityAnalyzer()
+    results = {}
+    for kind, size in CORPUS_SIZES.items():
+        names = [f'{stage}/{kind}' for stage in STAGES]
+        if only:
+            names = [name for name in names if any(pattern in name for pattern in only)]
+        if not names:
+            continue
+        data = prepare(analyzer, generate_corpus(kind, max(1, round(size * scale)), seed))
+        for name in names:
+            calls, sentences = stage_calls(analyzer, name.split('/')[0], data)
+            results[name] = run_benchmark(calls, sentences, repeat, measure_memory)
+            if progress is not None:
+                progress(name, results[name])
+    return {
+        'version': BENCHMARK_VERSION,
+        'seed': seed,
+        'scale': scale,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def compare(report, baseline, threshold, normalize=False):
+    """Regressions of report against baseline, as (name, metric, baseline value, value, change).
+
+    A benchmark regresses when its throughput drops, or its median latency
+    grows, by more than threshold (0.1 = 10%). With normalize, each change is
+    first scaled by how much slower the calibration workload ran next to it.
+    """
+    for key in ('version', 'seed', 'scale'):
+        if report.get(key) != baseline.get(key):
+            raise ValueError(f'baseline {key} {baseline.get(key)!r} does not match this run ({report.get(key)!r})')
+    regressions = []
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        slowdown = 1.0
+        if normalize and old.get('calibrationMs') and result.get('calibrationMs'):
+            slowdown = result['calibrationMs'] / old['calibrationMs']
+        if old['sentencesPerSecond']:
+            throughput = result['sentencesPerSecond'] * slowdown / old['sentencesPerSecond'] - 1
+            if throughput < -threshold:
+                regressions.append((name, 'sentencesPerSecond', old['sentencesPerSecond'], result['sentencesPerSecond'], throughput))
+        old_p50, p50 = old['latencyMs']['p50'], result['latencyMs']['p50']
+        if old_p50:
+            latency = p50 / slowdown / old_p50 - 1
+            if latency > threshold:
+                regressions.append((name, 'latencyMs.p50', old_p50, p50, latency))
+    return regressions
+
+
+def format_result(name, result):
+    latency = result['latencyMs']
+    line = (f"{name:<28} {result['sentencesPerSecond']:>12,.0f} sent/s   "
+            f"p50 {latency['p50']:>9.3f}  p95 {latency['p95']:>9.3f}  p99 {latency['p99']:>9.3f} ms")
+    if 'peakKB' in result:
+        line += f"   peak {result['peakKB']:>9,.1f} KB"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the modality analyzer on a seeded synthetic corpus')
+    parser.add_argument('--scale', type=float, default=1.0, help='corpus size multiplier (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='corpus seed (default: 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark (default: 3)')
+    parser.add_argument('--only', action='append', default=None,
+                        help="run benchmarks whose 'stage/corpus' name contains this text (repeatable)")
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures peak memory')
+    parser.add_argument('--baseline', default=None, help='JSON baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed throughput drop or latency growth before a regression is reported (default: 0.2)')
+    parser.add_argument('--normalize', action='store_true',
+                        help='scale changes by the calibration workload, for a baseline recorded on another machine')
+    parser.add_argument('--save-baseline', default=None, help='write this run as a JSON baseline')
+    parser.add_argument('-o', '--output', default=None, help='write the full JSON report to this file')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as handle:
+                baseline = json.load(handle)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot read baseline: {e}", file=sys.stderr)
+            return False
+
+    report = run_suite(args.scale, args.seed, max(1, args.repeat), args.only, not args.no_memory,
+                       progress=lambda name, result: print(format_result(name, result), flush=True))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+                handle.write('\n')
+
+    if baseline is None:
+        return True
+    try:
+        regressions = compare(report, baseline, args.threshold, normalize=args.normalize)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+        return True
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}:", file=sys.stderr)
+    for name, metric, old, new, change in regressions:
+        print(f"  {name} {metric}: {old} -> {new} ({change:+.0%})", file=sys.stderr)
+    return False
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
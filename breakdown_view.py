@@ -0,0 +1,249 @@
+"""
+Virtualized sentence breakdown for the desktop modality analyzer.
+Sentence results are kept as plain data and drawn on a Canvas in fixed-height
+rows. Only the rows in view have canvas items, and those items are reused as the
+view scrolls, so drawing and scrolling cost the same for ten sentences or a
+hundred thousand. Sorting and filtering reorder a list of indices, not widgets.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+from compact_result import SCORE_TYPES, CLASSIFICATIONS
+
+ROW_HEIGHT = 46
+BAR_WIDTH = 100
+
+SCORE_LABELS = {'necessity': 'N:', 'possibility': 'P:', 'impossibility': 'I:'}
+
+# Sort choices: label -> (key on a sentence result, descending)
+SORT_ORDERS = {
+    'Document order': (None, False),
+    'Necessity': (lambda result: result['scores']['necessity'], True),
+    'Possibility': (lambda result: result['scores']['possibility'], True),
+    'Impossibility': (lambda result: result['scores']['impossibility'], True),
+    'Classification': (lambda result: CLASSIFICATIONS.index(result['classification']), False)
+}
+ALL_CLASSIFICATIONS = 'All classifications'
+
+
+class SentenceBreakdownView(ttk.Frame):
+    """Scrollable list of sentence results that draws only its visible rows"""
+
+    def __init__(self, parent, height=240, on_select=None):
+        super().__init__(parent)
+        # Called with a sentence's index when its row is clicked
+        self.on_select = on_select
+        self.results = []
+        # Indices into results in display order, rebuilt when sort, filter or data change
+        self.order = []
+        self.order_stale = False
+        self.offset = 0
+        self.slots = []
+        self.redraw_job = None
+
+        self.font = tkfont.Font(family='Segoe UI', size=9)
+        self.bold_font = tkfont.Font(family='Segoe UI', size=10, weight='bold')
+        self.small_font = tkfont.Font(family='Segoe UI', size=8)
+        self.italic_font = tkfont.Font(family='Segoe UI', size=9, slant='italic')
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        controls = ttk.Frame(self)
+        controls.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+
+        ttk.Label(controls, text="Sort by:").grid(row=0, column=0)
+        self.sort_var = tk.StringVar(value='Document order')
+        sort_box = ttk.Combobox(controls, textvariable=self.sort_var, values=list(SORT_ORDERS), state='readonly', width=16)
+        sort_box.grid(row=0, column=1, padx=(5, 15))
+        sort_box.bind('<<ComboboxSelected>>', self.on_order_changed)
+
+        ttk.Label(controls, text="Show:").grid(row=0, column=2)
+        self.filter_var = tk.StringVar(value=ALL_CLASSIFICATIONS)
+        filter_box = ttk.Combobox(controls, textvariable=self.filter_var, values=[ALL_CLASSIFICATIONS] + list(CLASSIFICATIONS),
+                                  state='readonly', width=22)
+        filter_box.grid(row=0, column=3, padx=(5, 15))
+        filter_box.bind('<<ComboboxSelected>>', self.on_order_changed)
+
+        self.count_var = tk.StringVar(value="")
+        ttk.Label(controls, textvariable=self.count_var, font=('Segoe UI', 9)).grid(row=0, column=4)
+
+        self.canvas = tk.Canvas(self, height=height, background='white', highlightthickness=0)
+        self.canvas.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+
+        self.canvas.bind('<Configure>', self.on_resize)
+        self.canvas.bind('<Button-1>', self.on_click)
+        self.canvas.bind('<MouseWheel>', self.on_mousewheel)
+        self.canvas.bind('<Button-4>', lambda event: self.yview('scroll', -1, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.yview('scroll', 1, 'units'))
+
+    def __len__(self):
+        return len(self.results)
+
+    def append(self, result):
+        """Add the next sentence's result"""
+        self.results.append(result)
+        if self.is_document_order():
+            self.order.append(len(self.results) - 1)
+        else:
+            self.order_stale = True
+        self.schedule_redraw()
+
+    def extend(self, results):
+        for result in results:
+            self.append(result)
+
+    def truncate(self, count):
+        """Drop the results of sentence count onward"""
+        if count >= len(self.results):
+            return
+        del self.results[count:]
+        if self.is_document_order():
+            del self.order[count:]
+        else:
+            self.order_stale = True
+        self.schedule_redraw()
+
+    def is_document_order(self):
+        return not self.order_stale and self.sort_var.get() == 'Document order' and self.filter_var.get() == ALL_CLASSIFICATIONS
+
+    def rebuild_order(self):
+        key, descending = SORT_ORDERS[self.sort_var.get()]
+        wanted = self.filter_var.get()
+        if wanted == ALL_CLASSIFICATIONS:
+            order = list(range(len(self.results)))
+        else:
+            order = [i for i, result in enumerate(self.results) if result['classification'] == wanted]
+        if key is not None:
+            # sort is stable, so ties keep document order
+            order.sort(key=lambda i: key(self.results[i]), reverse=descending)
+        self.order = order
+        self.order_stale = False
+
+    def on_order_changed(self, event=None):
+        self.order_stale = True
+        self.offset = 0
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        # Many appends between two idle moments cost one redraw
+        if self.redraw_job is None:
+            self.redraw_job = self.after_idle(self.redraw)
+
+    def on_resize(self, event):
+        self.build_slots()
+        self.redraw()
+
+    def on_click(self, event):
+        position = (self.offset + event.y) // ROW_HEIGHT
+        if self.on_select is not None and not self.order_stale and position < len(self.order):
+            self.on_select(self.order[position])
+
+    def on_mousewheel(self, event):
+        self.yview('scroll', -1 if event.delta > 0 else 1, 'units')
+
+    def yview(self, *args):
+        """Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')"""
+        total = len(self.order) * ROW_HEIGHT
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            step = ROW_HEIGHT if args[2] == 'units' else self.canvas.winfo_height()
+            self.offset += int(args[1]) * step
+        self.redraw()
+
+    def build_slots(self):
+        # One set of canvas items per row that can be on screen at once
+        self.canvas.delete('all')
+        self.slots = []
+        for _ in range(self.canvas.winfo_height() // ROW_HEIGHT + 2):
+            slot = {
+                'label': self.canvas.create_text(0, 0, anchor='nw', font=self.bold_font),
+                'sentence': self.canvas.create_text(0, 0, anchor='nw', font=self.font),
+                'classification': self.canvas.create_text(0, 0, anchor='nw', font=self.italic_font),
+                'separator': self.canvas.create_line(0, 0, 0, 0, fill='#e9ecef')
+            }
+            for score_type in SCORE_TYPES:
+                slot[score_type] = (
+                    self.canvas.create_text(0, 0, anchor='nw', font=self.small_font, text=SCORE_LABELS[score_type]),
+                    self.canvas.create_rectangle(0, 0, 0, 0, outline='#ced4da', fill='#e9ecef'),
+                    self.canvas.create_rectangle(0, 0, 0, 0, outline='', fill='#667eea'),
+                    self.canvas.create_text(0, 0, anchor='nw', font=self.small_font)
+                )
+            self.slots.append(slot)
+
+    def redraw(self):
+        self.redraw_job = None
+        if self.order_stale:
+            self.rebuild_order()
+
+        height = max(self.canvas.winfo_height(), 1)
+        width = self.canvas.winfo_width()
+        total = len(self.order) * ROW_HEIGHT
+        self.offset = max(0, min(self.offset, total - height))
+
+        first = self.offset // ROW_HEIGHT
+        for n, slot in enumerate(self.slots):
+            position = first + n
+            if position < len(self.order):
+                self.draw_row(slot, self.order[position], position * ROW_HEIGHT - self.offset, width)
+            else:
+                for item in self.slot_items(slot):
+                    self.canvas.itemconfigure(item, state='hidden')
+
+        if total <= height:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + height) / total)
+        if len(self.order) == len(self.results):
+            self.count_var.set(f"{len(self.results)} sentences")
+        else:
+            self.count_var.set(f"{len(self.order)} of {len(self.results)} sentences")
+
+    def slot_items(self, slot):
+        for key, item in slot.items():
+            if key in SCORE_TYPES:
+                yield from item
+            else:
+                yield item
+
+    def draw_row(self, slot, index, y, width):
+        result = self.results[index]
+        canvas = self.canvas
+        for item in self.slot_items(slot):
+            canvas.itemconfigure(item, state='normal')
+
+        label = f"Sentence {index + 1}:"
+        canvas.itemconfigure(slot['label'], text=label)
+        canvas.coords(slot['label'], 5, y + 4)
+        text_x = 15 + self.bold_font.measure(label)
+        canvas.itemconfigure(slot['sentence'], text=self.fit_text(result['sentence'], width - text_x - 5))
+        canvas.coords(slot['sentence'], text_x, y + 5)
+
+        x = 5
+        bar_y = y + 25
+        for score_type in SCORE_TYPES:
+            name, trough, fill, percent = slot[score_type]
+            value = result['scores'][score_type]
+            canvas.coords(name, x, bar_y)
+            canvas.coords(trough, x + 18, bar_y + 2, x + 18 + BAR_WIDTH, bar_y + 12)
+            canvas.coords(fill, x + 19, bar_y + 3, x + 19 + (BAR_WIDTH - 2) * max(0, min(value, 100)) / 100, bar_y + 12)
+            canvas.itemconfigure(percent, text=f"{round(value)}%")
+            canvas.coords(percent, x + 24 + BAR_WIDTH, bar_y)
+            x += BAR_WIDTH + 70
+        canvas.itemconfigure(slot['classification'], text=f"→ {result['classification']}")
+        canvas.coords(slot['classification'], x + 5, bar_y - 1)
+        canvas.coords(slot['separator'], 0, y + ROW_HEIGHT - 1, width, y + ROW_HEIGHT - 1)
+
+    def fit_text(self, text, width):
+        # Rows have a fixed height, so long sentences are cut to one line
+        if width <= 0 or self.font.measure(text) <= width:
+            return text
+        chars = max(1, width // max(1, self.font.measure('n')))
+        while chars > 1 and self.font.measure(text[:chars] + '…') > width:
+            chars = chars * 9 // 10
+        return text[:chars].rstrip() + '…'
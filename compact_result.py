@@ -0,0 +1,175 @@
+"""
+Compact result model for the modality analyzer.
+A document's sentences are kept as offsets into its text and their scores and
+classifications as typed columns, so a million-sentence result costs a few
+dozen bytes per sentence instead of several dicts and strings. Sentence records,
+sentence strings and explanations are only built when they are accessed.
+"""
+
+from array import array
+
+SCORE_TYPES = ('necessity', 'possibility', 'impossibility')
+
+# Every label classify_modality can return; sentences store an index into this tuple
+CLASSIFICATIONS = (
+    'Logically Necessary', 'Strongly Necessary', 'Necessary', 'Weakly Necessary',
+    'Logically Impossible', 'Strongly Impossible', 'Impossible', 'Weakly Impossible',
+    'Highly Possible', 'Very Possible', 'Possible', 'Weakly Possible',
+    'Neutral/Contingent'
+)
+CLASSIFICATION_IDS = {label: i for i, label in enumerate(CLASSIFICATIONS)}
+
+
+def plain_number(value, is_float=False):
+    # Scores are stored as doubles; whole numbers are reported as int unless analyze() had a float
+    return int(value) if value.is_integer() and not is_float else value
+
+
+def float_flags(scores):
+    """Bit i set when the score of SCORE_TYPES[i] is a float, so a whole 19.0 is not reported as 19"""
+    return ((type(scores['necessity']) is float) | (type(scores['possibility']) is float) << 1
+            | (type(scores['impossibility']) is float) << 2)
+
+
+class SentenceRecord:
+    """View of one sentence of a CompactResult; holds no copies of its data"""
+    __slots__ = ('document', 'index')
+
+    def __init__(self, document, index):
+        self.document = document
+        self.index = index
+
+    @property
+    def start(self):
+        return self.document.starts[self.index]
+
+    @property
+    def end(self):
+        return self.document.ends[self.index]
+
+    @property
+    def sentence(self):
+        return self.document.text[self.start:self.end]
+
+    @property
+    def scores(self):
+        flags = self.document.float_scores[self.index]
+        return {score_type: plain_number(column[self.index], flags >> bit & 1)
+                for bit, (score_type, column) in enumerate(zip(SCORE_TYPES, self.document.score_columns))}
+
+    @property
+    def classification(self):
+        return CLASSIFICATIONS[self.document.classification_ids[self.index]]
+
+    @property
+    def explanation(self):
+        if not self.document.is_paragraph:
+            return f"Single sentence analysis. Classification: {self.classification}"
+        return f"Sentence classification: {self.classification}"
+
+    def to_dict(self):
+        """The sentence result dict analyze() reports"""
+        return {
+            'sentence': self.sentence,
+            'scores': self.scores,
+            'classification': self.classification,
+            'explanation': self.explanation
+        }
+
+    def __repr__(self):
+        return f'SentenceRecord({self.index}, {self.start}:{self.end}, {self.classification!r})'
+
+
+class CompactResult:
+    """Result of ModalityAnalyzer.analyze_compact; a sequence of SentenceRecord views"""
+    __slots__ = ('text', 'starts', 'ends', 'score_columns', 'float_scores', 'classification_ids',
+                 'scores', 'classification', 'distribution', '_analyzer', '_explanation')
+
+    def __init__(self, text, analyzer):
+        self.text = text
+        self.starts = array('L')
+        self.ends = array('L')
+        self.score_columns = tuple(array('d') for _ in SCORE_TYPES)
+        self.float_scores = array('B')
+        self.classification_ids = array('B')
+        self.scores = None
+        self.classification = None
+        self.distribution = None
+        self._analyzer = analyzer
+        self._explanation = None
+
+    def append(self, start, end, scores, classification=None):
+        """Record the sentence text[start:end] with its scores, and its classification
+        unless all of them are set at once by set_classification_ids"""
+        self.starts.append(start)
+        self.ends.append(end)
+        for score_type, column in zip(SCORE_TYPES, self.score_columns):
+            column.append(scores[score_type])
+        self.float_scores.append(float_flags(scores))
+        if classification is not None:
+            self.classification_ids.append(CLASSIFICATION_IDS[classification])
+
+    def extend(self, starts, ends, score_columns, classification_ids, float_scores=None):
+        """Append a run of sentences given as arrays shaped like this result's columns;
+        without float_scores, whole scores are reported as int"""
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        for column, scores in zip(self.score_columns, score_columns):
+            column.extend(scores)
+        self.float_scores.extend(float_scores if float_scores is not None else bytes(len(starts)))
+        self.classification_ids.extend(classification_ids)
+
+    def set_classification_ids(self, ids):
+        """Set every sentence's index into CLASSIFICATIONS from a buffer of bytes"""
+        self.classification_ids = array('B', bytes(ids))
+
+    def finish(self, scores, classification, distribution):
+        """Set the document-level scores, classification and dominant-modality distribution"""
+        self.scores = scores
+        self.classification = classification
+        self.distribution = distribution
+
+    @property
+    def is_paragraph(self):
+        return len(self.starts) != 1
+
+    @property
+    def explanation(self):
+        if self._explanation is None:
+            if not self.is_paragraph:
+                self._explanation = f"Single sentence analysis. Classification: {self.classification}"
+            else:
+                self._explanation = self._analyzer.explain_distribution(
+                    self.distribution, len(self), self.scores, self.classification)
+        return self._explanation
+
+    @property
+    def sentences(self):
+        return [self.text[start:end] for start, end in zip(self.starts, self.ends)]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('sentence index out of range')
+        return SentenceRecord(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield SentenceRecord(self, index)
+
+    def to_dict(self):
+        """The result dict analyze() returns for the same text"""
+        return {
+            'text': self.text,
+            'sentences': self.sentences,
+            'spans': [[start, end] for start, end in zip(self.starts, self.ends)],
+            'sentenceResults': [record.to_dict() for record in self],
+            'scores': self.scores,
+            'classification': self.classification,
+            'explanation': self.explanation,
+            'isParagraph': self.is_paragraph
+        }
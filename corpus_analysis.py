@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped corpus analysis for the modality analyzer.
+Every input file is one document. Files are memory-mapped, never read into a
+Python string whole, and cut into byte ranges at sentence boundaries. Worker
+processes get nothing but (path, start, end) tasks: each maps the file itself,
+finds the sentence spans of its range once, and decodes one sentence at a time.
+A range comes back as packed arrays (byte offsets, float64 score columns and
+classification ids) with its ParagraphAccumulator partial state, about 41 bytes
+per sentence instead of a pickled string and dicts.
+
+    python corpus_analysis.py corpus/*.txt --workers 32 -o results.jsonl
+    python corpus_analysis.py book.txt --sentences
+"""
+
+import os
+import sys
+import json
+import mmap
+import argparse
+from array import array
+
+from modality_engine import ModalityAnalyzer, ParagraphAccumulator
+from compact_result import CompactResult, SCORE_TYPES, CLASSIFICATION_IDS
+from sentence_segmenter import iter_spans
+from sharded_analysis import plan_shards
+
+# Files are cut into ranges of about this many bytes; smaller files are one range
+RANGE_BYTES = 4 << 20
+
+
+class MappedText:
+    """Decoded slices of a UTF-8 file, read through a memory map on demand"""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._data = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('MappedText only supports slices')
+        if self.size == 0:
+            return ''
+        if self._data is None:
+            with open(self.path, 'rb') as handle:
+                self._data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data[key].decode('utf-8', errors='replace')
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+
+class MappedResult(CompactResult):
+    """CompactResult of a file, whose sentence offsets are byte offsets into the file.
+    Sentence strings are decoded from the file when they are accessed."""
+    __slots__ = ('path',)
+
+    def __init__(self, path, analyzer):
+        super().__init__(MappedText(path), analyzer)
+        self.path = path
+        # Offsets past 4 GiB must fit
+        self.starts = array('Q')
+        self.ends = array('Q')
+
+    def to_dict(self, sentences=False):
+        """Document-level result; with sentences=True also the byte 'spans' and per-sentence
+        'sentenceScores' columns and 'classificationIds' (indices into CLASSIFICATIONS)"""
+        result = {
+            'source': self.path,
+            'bytes': len(self.text),
+            'sentenceCount': len(self),
+            'scores': self.scores,
+            'classification': self.classification,
+            'explanation': self.explanation,
+            'isParagraph': self.is_paragraph
+        }
+        if sentences:
+            result['spans'] = [[start, end] for start, end in zip(self.starts, self.ends)]
+            result['sentenceScores'] = {score_type: column.tolist()
+                                        for score_type, column in zip(SCORE_TYPES, self.score_columns)}
+            result['classificationIds'] = self.classification_ids.tolist()
+        return result
+
+
+class RangeResult:
+    """The sentences of one byte range of a file, as packed arrays, and their partial state"""
+    __slots__ = ('path', 'start', 'end', 'starts', 'ends', 'score_columns', 'classification_ids', 'state')
+
+    def __init__(self, path, start, end):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.score_columns = tuple(array('d') for _ in SCORE_TYPES)
+        self.classification_ids = array('B')
+        self.state = None
+
+
+def plan_ranges(path, range_bytes=RANGE_BYTES):
+    """Byte ranges of the file at path, each ending where a sentence does"""
+    size = os.path.getsize(path)
+    return plan_shards(path, max(1, -(-size // range_bytes)))
+
+
+def analyze_range(analyzer, path, start, end):
+    """Split and score bytes [start, end) of the file at path into a RangeResult.
+
+    Spans are found on the raw bytes, which only knows ASCII whitespace; a span
+    holding other whitespace, or longer than max_sentence_length, is split again
+    as text so the sentences are the ones split_into_sentences would give.
+    """
+    piece = RangeResult(path, start, end)
+    accumulator = ParagraphAccumulator(analyzer)
+    if start == end:
+        piece.state = accumulator.to_state()
+        return piece
+
+    limit = analyzer.max_sentence_length
+    classify = analyzer.classify_modality
+    with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        spans = iter_spans(data, start, end)
+        if analyzer.instrumentation is not None:
+            spans = analyzer.instrumentation.timed('split', spans)
+        for span_start, span_end in spans:
+            # surrogateescape keeps invalid bytes one character each, so offsets map back exactly
+            sentence = data[span_start:span_end].decode('utf-8', errors='surrogateescape')
+            if sentence.isascii() and not (limit and len(sentence) > limit):
+                parts = ((span_start, span_end, sentence),)
+            else:
+                parts = [(span_start + len(sentence[:s].encode('utf-8', errors='surrogateescape')),
+                          span_start + len(sentence[:e].encode('utf-8', errors='surrogateescape')),
+                          sentence[s:e])
+                         for s, e in analyzer.iter_spans(sentence)]
+            for part_start, part_end, part in parts:
+                scores = analyzer.score_lowercase(part.lower())
+                accumulator.add_length(len(part), scores)
+                piece.starts.append(part_start)
+                piece.ends.append(part_end)
+                for score_type, column in zip(SCORE_TYPES, piece.score_columns):
+                    column.append(scores[score_type])
+                piece.classification_ids.append(CLASSIFICATION_IDS[classify(scores)])
+    piece.state = accumulator.to_state()
+    return piece
+
+
+def analyze_corpus(analyzer, paths, workers=None, range_bytes=RANGE_BYTES):
+    """Analyze every file in paths on the analyzer's worker pool and yield a MappedResult per file, in order"""
+    workers = workers or os.cpu_count() or 1
+    paths = list(paths)
+    plans = [plan_ranges(path, range_bytes) for path in paths]
+    tasks = [(path, start, end) for path, ranges in zip(paths, plans) for start, end in ranges]
+
+    if workers == 1 or len(tasks) == 1:
+        pieces = (analyze_range(analyzer, *task) for task in tasks)
+    else:
+        pieces = analyzer.get_pool(workers).imap(_analyze_range_in_worker, tasks, 1)
+
+    # Ranges arrive in task order, so each file's ranges are consecutive
+    for path, ranges in zip(paths, plans):
+        result = MappedResult(path, analyzer)
+        accumulator = ParagraphAccumulator(analyzer)
+        for _ in ranges:
+            piece = next(pieces)
+            result.extend(piece.starts, piece.ends, piece.score_columns, piece.classification_ids)
+            # A file of more than one range gets merged exact sums; see ParagraphAccumulator
+            accumulator.merge(ParagraphAccumulator.from_state(analyzer, piece.state))
+        scores = accumulator.paragraph_scores()
+        result.finish(scores, analyzer.classify_modality(scores), dict(accumulator.distribution))
+        yield result
+
+
+def _analyze_range_in_worker(task):
+    import modality_engine
+    piece = analyze_range(modality_engine._worker_analyzer, *task)
+    modality_engine._report_metrics()
+    return piece
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze a corpus of text files through memory maps, one document per file')
+    parser.add_argument('inputs', nargs='+', help='UTF-8 text files')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--range-bytes', type=int, default=RANGE_BYTES, help='bytes of a file per worker task')
+    parser.add_argument('--sentences', action='store_true',
+                        help='include byte spans, scores and classification ids of every sentence')
+    parser.add_argument('--max-sentence-length', type=int, default=None, help='split longer sentences into chunks')
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+    args = parser.parse_args()
+
+    analyzer = ModalityAnalyzer(max_sentence_length=args.max_sentence_length)
+    if args.output == '-':
+        output = open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=1 << 16, closefd=False)
+    else:
+        output = open(args.output, 'w', encoding='utf-8', buffering=1 << 16)
+    try:
+        for result in analyze_corpus(analyzer, args.inputs, args.workers, args.range_bytes):
+            output.write(json.dumps(result.to_dict(args.sentences), ensure_ascii=False))
+            output.write('\n')
+            result.text.close()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    finally:
+        analyzer.close()
+        output.close()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
@@ -0,0 +1,317 @@
+"""
+Incremental re-analysis of an edited document.
+IncrementalDocument keeps each sentence's result keyed by its content and the
+paragraph aggregate in a balanced tree (an implicit treap) whose nodes hold the
+ParagraphAccumulator partial state of their subtree and the number of characters
+it spans. An edit re-segments only the sentences around the edited range, scores
+only new sentences, and replacing, inserting or deleting k sentences re-merges
+O(k + log n) partial states, so the paragraph summary of a long document follows
+an edit in logarithmic time (plus copying the text itself).
+summary() reads the merged partial states: like merged shards, its weighted means
+are rounded once from exact sums and can differ from analyze()'s in the last ulp.
+result() adds the sums in sentence order, as analyze() does, and is identical to it.
+"""
+
+import random
+
+from modality_engine import ParagraphAccumulator
+from sentence_segmenter import BOUNDARY_CONTEXT, iter_spans
+
+
+class _Node:
+    __slots__ = ('left', 'right', 'priority', 'size', 'leaf', 'total', 'width', 'opens', 'chars')
+
+    def __init__(self, leaf, priority, width, opens):
+        self.left = None
+        self.right = None
+        self.priority = priority
+        self.size = 1
+        self.leaf = leaf
+        self.total = leaf
+        # Characters from this sentence's start to the next one's (or the end of the text),
+        # and whether it starts a sentence rather than continuing a chunked one
+        self.width = width
+        self.opens = opens
+        self.chars = width
+
+
+def _common_prefix(first, second):
+    # Slice comparisons run in C, so a binary search beats a character loop
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class IncrementalDocument:
+    def __init__(self, analyzer, text=''):
+        """A document analyzed with analyzer whose text can be replaced or edited cheaply"""
+        self.analyzer = analyzer
+        self.text = ''
+        self.sentences = []
+        self.sentence_results = []
+        # Sentences scored by the last update, and by all updates
+        self.rescored = 0
+        self.total_rescored = 0
+        self._root = None
+        # Offset of the first sentence; the tree's widths cover the text from there on
+        self._lead = 0
+        self._random = random.Random(0)
+        if text:
+            self.update(text)
+
+    def update(self, text, progress=None):
+        """Replace the text and return the changed sentence range as (start, old_end, new_end):
+        sentences[start:new_end] replaced what was at [start:old_end] before the update.
+
+        progress, if given, is called as progress(index, count, result) for each sentence of
+        the changed range once it has its result; count is the new number of sentences.
+        An exception raised by progress abandons the update and leaves the document unchanged.
+        """
+        if text == self.text:
+            self.rescored = 0
+            count = len(self.sentences)
+            return count, count, count
+        # Only the text between the common head and tail changed
+        head = _common_prefix(self.text, text)
+        tail = _common_prefix(self.text[head:][::-1], text[head:][::-1])
+        return self._splice(text, head, len(self.text) - tail, len(text) - tail, progress)
+
+    def edit(self, start, end, replacement, progress=None):
+        """Replace text[start:end] with replacement; returns the changed sentence range as update() does"""
+        text = self.text[:start] + replacement + self.text[end:]
+        return self._splice(text, start, end, start + len(replacement), progress)
+
+    def _splice(self, text, start, end, new_end, progress):
+        # text is the new text, in which old text[start:end] became text[start:new_end]
+        delta = new_end - end
+
+        # Re-segment from the start of the sentence before the edited one: the boundaries before
+        # it depend only on unchanged text. A chunk of a long sentence is not a place to start.
+        first = max(self._index_at(start) - 1, 0)
+        while first > 0 and not self._node_at(first).opens:
+            first -= 1
+        window_start = self._start_of(first) if first else 0
+
+        # ...up to the first sentence that starts where an old one did, far enough past the
+        # edit that its abbreviation lookbehinds see unchanged text; everything after is as before
+        stop = len(self.sentences)
+        next_start = len(text)
+        spans = []
+        for sentence_start, sentence_end in iter_spans(text, window_start):
+            if sentence_start >= new_end + BOUNDARY_CONTEXT:
+                index = self._index_at(sentence_start - delta)
+                if self._start_of(index) == sentence_start - delta and self._node_at(index).opens:
+                    stop, next_start = index, sentence_start
+                    break
+            opens = True
+            for span in self.analyzer.chunk_span(text, sentence_start, sentence_end):
+                spans.append(span + (opens,))
+                opens = False
+        sentences = [text[span_start:span_end] for span_start, span_end, _ in spans]
+
+        # The changed range leaves out the sentences at either end of the window that did not change
+        old = self.sentences
+        count = len(old) - (stop - first) + len(sentences)
+        changed_start, changed_old_end, changed_new_end = first, stop, first + len(sentences)
+        while (changed_start < changed_old_end and changed_start < changed_new_end
+               and old[changed_start] == sentences[changed_start - first]):
+            changed_start += 1
+        while (changed_old_end > changed_start and changed_new_end > changed_start
+               and old[changed_old_end - 1] == sentences[changed_new_end - 1 - first]):
+            changed_old_end -= 1
+            changed_new_end -= 1
+
+        # Sentences moved within the window (pasted back, reordered) are not rescored
+        known = dict(zip(old[first:stop], self.sentence_results[first:stop]))
+        rescored = 0
+        results = []
+        for index, sentence in enumerate(sentences, first):
+            result = known.get(sentence)
+            if result is None:
+                result = self.analyzer.analyze_sentence(sentence)
+                rescored += 1
+            results.append(result)
+            if progress is not None and changed_start <= index < changed_new_end:
+                progress(index, count, result)
+        self.rescored = rescored
+        self.total_rescored += rescored
+
+        starts = [span[0] for span in spans] + [next_start]
+        widths = [following - current for current, following in zip(starts, starts[1:])]
+        head, rest = self._split(self._root, first)
+        _, tail = self._split(rest, stop - first)
+        middle = self._build(sentences, results, widths, [span[2] for span in spans])
+        self._root = self._join(self._join(head, middle), tail)
+        if first == 0:
+            self._lead = starts[0]
+
+        self.text = text
+        self.sentences[first:stop] = sentences
+        self.sentence_results[first:stop] = results
+        return changed_start, changed_old_end, changed_new_end
+
+    def accumulator(self):
+        """The ParagraphAccumulator of the whole document, merged from the tree"""
+        if self._root is None:
+            return ParagraphAccumulator(self.analyzer)
+        return self._root.total
+
+    def summary(self):
+        """Paragraph scores, classification, explanation, isParagraph and sentenceCount of the current text"""
+        if len(self.sentences) == 1:
+            # analyze() scores a lone sentence as the whole, unstripped text
+            result = self.analyzer.analyze(self.text)
+            return {
+                'scores': result['scores'],
+                'classification': result['classification'],
+                'explanation': result['explanation'],
+                'isParagraph': False,
+                'sentenceCount': 1
+            }
+        return self.accumulator().result()
+
+    def result(self):
+        """The result analyze() would return for the current text"""
+        if len(self.sentences) == 1:
+            return self.analyzer.analyze(self.text)
+        # Every sentence is in the reply anyway, so adding the sums in sentence order costs nothing extra
+        total_weight, weighted = 0, {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+        for sentence, sentence_result in zip(self.sentences, self.sentence_results):
+            weight = min(len(sentence) / 50, 2)
+            total_weight += weight
+            for score_type, score in sentence_result['scores'].items():
+                weighted[score_type] += score * weight
+        summary = self.accumulator().copy().set_sequential_sums(total_weight, weighted).result()
+        return {
+            'text': self.text,
+            'sentences': list(self.sentences),
+            'spans': [[start, end] for start, end in self.analyzer.split_spans(self.text)],
+            'sentenceResults': list(self.sentence_results),
+            'scores': summary['scores'],
+            'classification': summary['classification'],
+            'explanation': summary['explanation'],
+            'isParagraph': summary['isParagraph']
+        }
+
+    def _index_at(self, offset):
+        """Index of the sentence whose text or following separator holds offset (the last one past the end)"""
+        offset -= self._lead
+        index = 0
+        node = self._root
+        while node is not None:
+            left_chars = node.left.chars if node.left is not None else 0
+            left_size = node.left.size if node.left is not None else 0
+            if offset < left_chars:
+                node = node.left
+            elif offset < left_chars + node.width or node.right is None:
+                return index + left_size
+            else:
+                offset -= left_chars + node.width
+                index += left_size + 1
+                node = node.right
+        return index
+
+    def _start_of(self, index):
+        """Offset in the text where sentence index starts"""
+        offset = self._lead
+        node = self._root
+        while node is not None:
+            left_chars = node.left.chars if node.left is not None else 0
+            left_size = node.left.size if node.left is not None else 0
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return offset + left_chars
+            else:
+                offset += left_chars + node.width
+                index -= left_size + 1
+                node = node.right
+        return offset
+
+    def _node_at(self, index):
+        node = self._root
+        while True:
+            left_size = node.left.size if node.left is not None else 0
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node
+            else:
+                index -= left_size + 1
+                node = node.right
+
+    def _refresh(self, node):
+        # A node's total covers its left subtree, its own sentence and its right subtree, in order
+        node.size = 1
+        node.chars = node.width
+        if node.left is None and node.right is None:
+            node.total = node.leaf
+            return node
+        total = ParagraphAccumulator(self.analyzer)
+        if node.left is not None:
+            node.size += node.left.size
+            node.chars += node.left.chars
+            total.merge(node.left.total)
+        total.merge(node.leaf)
+        if node.right is not None:
+            node.size += node.right.size
+            node.chars += node.right.chars
+            total.merge(node.right.total)
+        node.total = total
+        return node
+
+    def _split(self, node, count):
+        """Split a tree into its first count sentences and the rest"""
+        if node is None:
+            return None, None
+        left_size = node.left.size if node.left is not None else 0
+        if count <= left_size:
+            first, node.left = self._split(node.left, count)
+            return first, self._refresh(node)
+        node.right, rest = self._split(node.right, count - left_size - 1)
+        return self._refresh(node), rest
+
+    def _join(self, first, second):
+        """Concatenate two trees, first's sentences before second's"""
+        if first is None:
+            return second
+        if second is None:
+            return first
+        if first.priority > second.priority:
+            first.right = self._join(first.right, second)
+            return self._refresh(first)
+        second.left = self._join(first, second.left)
+        return self._refresh(second)
+
+    def _build(self, sentences, results, widths, opens):
+        """A balanced tree of new sentences in O(k) merges"""
+        if not sentences:
+            return None
+        # Handing out priorities largest first in breadth-first order keeps the heap order
+        priorities = sorted((self._random.random() for _ in sentences), reverse=True)
+        nodes = []
+        queue = [(0, len(sentences), None, False)]
+        for lo, hi, parent, is_right in queue:
+            mid = (lo + hi) // 2
+            leaf = ParagraphAccumulator(self.analyzer)
+            leaf.add(sentences[mid], results[mid]['scores'])
+            node = _Node(leaf, priorities[len(nodes)], widths[mid], opens[mid])
+            nodes.append(node)
+            if parent is not None:
+                if is_right:
+                    parent.right = node
+                else:
+                    parent.left = node
+            if lo < mid:
+                queue.append((lo, mid, node, False))
+            if mid + 1 < hi:
+                queue.append((mid + 1, hi, node, True))
+        # Children come after their parent in breadth-first order, so refresh from the end
+        for node in reversed(nodes):
+            self._refresh(node)
+        return nodes[0]
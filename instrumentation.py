@@ -0,0 +1,182 @@
+"""
+Opt-in instrumentation for the modality analyzer.
+An Instrumentation attached to a ModalityAnalyzer collects cumulative time per
+analysis stage, a histogram of scored sentence lengths and modal keyword hits;
+the rule engine keeps its own per-pattern evaluation and match counters. While
+no Instrumentation is attached, each stage costs the analyzer one None check.
+Metrics export as a dict or as Prometheus text exposition format.
+"""
+
+import cProfile
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+# Timed stages, in the order a sentence goes through them
+STAGES = ('split', 'rules', 'contingent', 'aggregation', 'explanation')
+
+# Upper bounds (inclusive, in characters) of the sentence length histogram buckets
+LENGTH_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+
+
+class Instrumentation:
+    def __init__(self):
+        """Empty stage timers, length histogram and keyword counters"""
+        self.reset()
+
+    def reset(self):
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.stage_calls = dict.fromkeys(STAGES, 0)
+        # One count per LENGTH_BUCKETS bound plus the overflow bucket
+        self.length_counts = [0] * (len(LENGTH_BUCKETS) + 1)
+        self.length_sum = 0
+        self.keyword_hits = {}
+        # Rule counters merged in from other analyzers, keyed by (group, index, pattern)
+        self.rule_counts = {}
+
+    def add_time(self, stage, started):
+        """Charge the time since the perf_counter() reading started to stage"""
+        self.stage_seconds[stage] += perf_counter() - started
+        self.stage_calls[stage] += 1
+
+    def timed(self, stage, iterable):
+        """Iterate iterable, charging the time spent producing each item to stage"""
+        iterator = iter(iterable)
+        while True:
+            started = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(stage, started)
+                return
+            self.add_time(stage, started)
+            yield item
+
+    def add_sentence(self, length):
+        self.length_counts[bisect_left(LENGTH_BUCKETS, length)] += 1
+        self.length_sum += length
+
+    def add_keywords(self, found):
+        """Count the categories of a KeywordMatcher.find() result"""
+        for category in found:
+            self.keyword_hits[category] = self.keyword_hits.get(category, 0) + 1
+
+    def add_rules(self, stats):
+        """Add RuleEngine.stats() counters"""
+        for rule in stats:
+            key = (rule['group'], rule['index'], rule['pattern'])
+            counts = self.rule_counts.setdefault(key, [0, 0, 0])
+            counts[0] += rule['evaluated']
+            counts[1] += rule['matched']
+            counts[2] += rule['skipped']
+
+    def merge(self, metrics):
+        """Add the counters of a to_dict() result, e.g. one reported by a worker process"""
+        for stage, totals in metrics['stages'].items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + totals['seconds']
+            self.stage_calls[stage] = self.stage_calls.get(stage, 0) + totals['calls']
+        lengths = metrics['sentenceLengths']
+        for i, count in enumerate(lengths['counts']):
+            self.length_counts[i] += count
+        self.length_sum += lengths['sum']
+        for category, count in metrics['keywords'].items():
+            self.keyword_hits[category] = self.keyword_hits.get(category, 0) + count
+        self.add_rules(metrics['rules'])
+        return self
+
+    def to_dict(self):
+        """JSON-serializable counters; 'rules' holds only the rule counters merged in"""
+        return {
+            'stages': {stage: {'seconds': self.stage_seconds[stage], 'calls': self.stage_calls[stage]}
+                       for stage in self.stage_seconds},
+            'sentenceLengths': {
+                'bounds': list(LENGTH_BUCKETS),
+                'counts': list(self.length_counts),
+                'count': sum(self.length_counts),
+                'sum': self.length_sum
+            },
+            'keywords': dict(self.keyword_hits),
+            'rules': [{'group': group, 'index': index, 'pattern': pattern,
+                       'evaluated': evaluated, 'matched': matched, 'skipped': skipped}
+                      for (group, index, pattern), (evaluated, matched, skipped) in self.rule_counts.items()]
+        }
+
+    def drain(self):
+        """to_dict(), then reset"""
+        metrics = self.to_dict()
+        self.reset()
+        return metrics
+
+
+@contextmanager
+def profiled(path):
+    """Run the body of a with block under cProfile and dump its stats to path
+    (read them with pstats or snakeviz)"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def format_summary(metrics):
+    """One line of stage times and sentence count for a status bar"""
+    parts = [f"{stage} {totals['seconds'] * 1000:.1f} ms" for stage, totals in metrics['stages'].items()]
+    parts.append(f"{metrics['sentenceLengths']['count']:,} sentences scored")
+    return ' · '.join(parts)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def to_prometheus(metrics, prefix='modality'):
+    """Render metrics (as ModalityAnalyzer.metrics() returns them) in Prometheus text format"""
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} {kind}')
+        for suffix, labels, value in samples:
+            lines.append(f'{prefix}_{name}{suffix}{labels} {value}')
+
+    stages = metrics['stages']
+    family('stage_seconds_total', 'counter', 'Time spent in each analysis stage.',
+           [('', _labels(stage=stage), totals['seconds']) for stage, totals in stages.items()])
+    family('stage_calls_total', 'counter', 'Timed calls of each analysis stage.',
+           [('', _labels(stage=stage), totals['calls']) for stage, totals in stages.items()])
+
+    lengths = metrics['sentenceLengths']
+    samples = []
+    cumulative = 0
+    for bound, count in zip(lengths['bounds'] + ['+Inf'], lengths['counts']):
+        cumulative += count
+        samples.append(('_bucket', _labels(le=bound), cumulative))
+    samples.append(('_sum', '', lengths['sum']))
+    samples.append(('_count', '', lengths['count']))
+    family('sentence_length_characters', 'histogram', 'Length of each scored sentence.', samples)
+
+    family('keyword_sentences_total', 'counter', 'Sentences with at least one keyword of each category.',
+           [('', _labels(category=category), count) for category, count in metrics['keywords'].items()])
+
+    for name, field, help_text in (('rule_evaluations_total', 'evaluated', 'Full evaluations of each rule.'),
+                                   ('rule_matches_total', 'matched', 'Matches of each rule.'),
+                                   ('rule_skips_total', 'skipped', 'Scans that skipped each rule in the prefilter.')):
+        family(name, 'counter', help_text,
+               [('', _labels(group=rule['group'], index=rule['index'], pattern=rule['pattern']), rule[field])
+                for rule in metrics['rules']])
+
+    cache = metrics.get('cache')
+    if cache is not None:
+        for name, field in (('hits', 'hits'), ('misses', 'misses'), ('evictions', 'evictions')):
+            family(f'cache_{name}_total', 'counter', f'Sentence score cache {name}.', [('', '', cache[field])])
+        family('cache_entries', 'gauge', 'Sentences in the score cache.', [('', '', cache['entries'])])
+        family('cache_bytes', 'gauge', 'Approximate size of the score cache.', [('', '', cache['bytes'])])
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Propositional logic engine.
+Expressions with ¬ ∧ ∨ → ↔ ⊕ (or their ASCII and word spellings) are parsed
+once into a tree and compiled into a short list of bitwise instructions. Every
+variable is a bit-vector over all 2^n rows of the truth table, held in a Python
+int, so one pass of the instructions evaluates a whole block of rows at once.
+Rows are processed in blocks of 2^BLOCK_BITS, which bounds memory and lets
+tautology, satisfiability and equivalence checks stop at the first deciding
+block. In row r, variable i (in order of first appearance) is bit i of r.
+
+    python logic_engine.py "(p → q) ∧ p → q"
+    python logic_engine.py "¬(p ∧ q)" --equivalent "¬p ∨ ¬q"
+    python logic_engine.py "a1 ⊕ a2 ⊕ ... " --table table.bits --format bits
+"""
+
+import re
+import sys
+import json
+import argparse
+from time import perf_counter
+
+# Rows evaluated per block: 2^20 rows are 128 KiB per bit-vector
+BLOCK_BITS = 20
+
+# Rows whose variable columns are written as one precomputed piece of CSV
+CSV_LOW_BITS = 10
+
+# Binary connectives: token -> (operator, precedence, right associative)
+BINARY = {
+    '↔': ('iff', 1, False), '<->': ('iff', 1, False), '<=>': ('iff', 1, False), '⇔': ('iff', 1, False),
+    '≡': ('iff', 1, False), 'iff': ('iff', 1, False),
+    '⊕': ('xor', 1, False), '^': ('xor', 1, False), 'xor': ('xor', 1, False),
+    '→': ('implies', 2, True), '->': ('implies', 2, True), '=>': ('implies', 2, True), '⇒': ('implies', 2, True),
+    'implies': ('implies', 2, True),
+    '∨': ('or', 3, False), '|': ('or', 3, False), '||': ('or', 3, False), 'or': ('or', 3, False),
+    '∧': ('and', 4, False), '&': ('and', 4, False), '&&': ('and', 4, False), 'and': ('and', 4, False)
+}
+NEGATION = {'¬', '~', '!', 'not'}
+CONSTANTS = {'⊤': True, '1': True, 'true': True, '⊥': False, '0': False, 'false': False}
+
+SYMBOLS = {'iff': '↔', 'xor': '⊕', 'implies': '→', 'or': '∨', 'and': '∧'}
+
+# Deepest operator nesting parse() accepts. Trees are nested tuples, which hash and compare
+# recursively, so far deeper ones cost quadratic time and overflow the recursion limit.
+MAX_DEPTH = 500
+
+TOKEN = re.compile(r'\s*(?:(<->|<=>|->|=>|&&|\|\||[¬~!∧&∨|→↔⊕^()⊤⊥⇒⇔≡01])|([A-Za-zα-ωΑ-Ω_][A-Za-z0-9α-ωΑ-Ω_]*))')
+
+
+class LogicError(ValueError):
+    """An expression that cannot be parsed"""
+
+
+def tokenize(text):
+    """(token, position) pairs of text; operator words are lowercased, variable names kept"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            offset = len(text) - len(text[position:].lstrip())
+            raise LogicError(f"unexpected character {text[offset]!r} at position {offset}")
+        symbol, name = match.groups()
+        start = match.start(1) if symbol else match.start(2)
+        if name is not None and name.lower() in BINARY.keys() | NEGATION | CONSTANTS.keys():
+            symbol, name = name.lower(), None
+        tokens.append((symbol if name is None else ('var', name), start))
+        position = match.end()
+    return tokens
+
+
+def parse(text):
+    """Parse an expression into a tree of tuples: ('var', name), ('const', bool),
+    ('not', operand) or (operator, left, right)"""
+    output = []
+    depths = []  # operator nesting depth of each tree in output
+    operators = []  # (token, position), where token is '(' , 'not' or a BINARY key
+    expect_operand = True
+
+    def reduce():
+        token, position = operators.pop()
+        if token == 'not':
+            output.append(('not', output.pop()))
+            depth = depths.pop() + 1
+        else:
+            right = output.pop()
+            output.append((BINARY[token][0], output.pop(), right))
+            depth = max(depths.pop(), depths.pop()) + 1
+        if depth > MAX_DEPTH:
+            raise LogicError(f"operators nest more than {MAX_DEPTH} deep at position {position}")
+        depths.append(depth)
+
+    for token, position in tokenize(text):
+        if expect_operand:
+            if isinstance(token, tuple):
+                output.append(token)
+                depths.append(0)
+                expect_operand = False
+            elif token in CONSTANTS:
+                output.append(('const', CONSTANTS[token]))
+                depths.append(0)
+                expect_operand = False
+            elif token in NEGATION:
+                operators.append(('not', position))
+            elif token == '(':
+                operators.append(('(', position))
+            else:
+                raise LogicError(f"expected a variable, constant, '¬' or '(' at position {position}, got {token!r}")
+        elif token in BINARY:
+            _, precedence, right = BINARY[token]
+            while operators and operators[-1][0] != '(':
+                top = operators[-1][0]
+                top_precedence = 5 if top == 'not' else BINARY[top][1]
+                if top_precedence > precedence or (top_precedence == precedence and not right):
+                    reduce()
+                else:
+                    break
+            operators.append((token, position))
+            expect_operand = True
+        elif token == ')':
+            while operators and operators[-1][0] != '(':
+                reduce()
+            if not operators:
+                raise LogicError(f"unmatched ')' at position {position}")
+            operators.pop()
+        else:
+            raise LogicError(f"expected an operator or ')' at position {position}, got "
+                             f"{token[1] if isinstance(token, tuple) else token!r}")
+
+    if expect_operand:
+        raise LogicError('expression is empty' if not output and not operators else 'expression ends with an operator')
+    while operators:
+        if operators[-1][0] == '(':
+            raise LogicError(f"unmatched '(' at position {operators[-1][1]}")
+        reduce()
+    return output[0]
+
+
+def variables_of(tree):
+    """Variable names of a tree in order of first appearance, left to right"""
+    names = {}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node[0] == 'var':
+            names.setdefault(node[1])
+        elif node[0] != 'const':
+            stack.extend(reversed(node[1:]))
+    return list(names)
+
+
+def format_tree(tree):
+    """The tree as a fully parenthesized expression in logic symbols"""
+    # Post-order walk, like _compile, so deep trees cannot overflow the recursion limit
+    formatted = []
+    stack = [(tree, False)]
+    while stack:
+        node, ready = stack.pop()
+        if node[0] == 'var':
+            formatted.append(node[1])
+        elif node[0] == 'const':
+            formatted.append('⊤' if node[1] else '⊥')
+        elif not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node[1:]))
+        elif node[0] == 'not':
+            formatted.append('¬' + formatted.pop())
+        else:
+            right = formatted.pop()
+            formatted.append(f'({formatted.pop()} {SYMBOLS[node[0]]} {right})')
+    return formatted[0]
+
+
+def variable_mask(index, width):
+    """Bit-vector of 2^width rows in which variable index is true: bit r is bit index of r"""
+    run = 1 << index
+    vector = ((1 << run) - 1) << run
+    length = run * 2
+    while length < 1 << width:
+        vector |= vector << length
+        length *= 2
+    return vector
+
+
+class Expression:
+    def __init__(self, text=None, tree=None, variables=None):
+        """Parse text (or take a parsed tree) and compile it into bitwise instructions.
+        variables fixes the column order; it must include every variable of the tree."""
+        self.text = text
+        self.tree = parse(text) if tree is None else tree
+        self.variables = list(variables) if variables is not None else variables_of(self.tree)
+        missing = set(variables_of(self.tree)) - set(self.variables)
+        if missing:
+            raise LogicError(f"variables {', '.join(sorted(missing))} are not in the column order")
+        self._compile()
+
+    def _compile(self):
+        # Post-order walk into three-address instructions; identical subtrees share one register
+        index = {name: i for i, name in enumerate(self.variables)}
+        registers = {}
+        self._program = []
+        self._inputs = []  # (register, variable index) for every variable the tree uses
+        stack = [(self.tree, False)]
+        while stack:
+            node, ready = stack.pop()
+            if node in registers:
+                continue
+            if node[0] == 'var':
+                registers[node] = len(registers)
+                self._inputs.append((registers[node], index[node[1]]))
+            elif node[0] == 'const':
+                registers[node] = len(registers)
+                self._program.append(('const', registers[node], node[1]))
+            elif not ready:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node[1:]))
+            else:
+                registers[node] = len(registers)
+                self._program.append((node[0], registers[node]) + tuple(registers[child] for child in node[1:]))
+        self._registers = len(registers)
+        self._output = registers[self.tree]
+
+    @property
+    def rows(self):
+        return 1 << len(self.variables)
+
+    def __str__(self):
+        return self.text if self.text is not None else format_tree(self.tree)
+
+    def evaluate(self, assignment):
+        """Truth value for a {variable: bool} assignment"""
+        row = sum(1 << i for i, name in enumerate(self.variables) if assignment[name])
+        # A block of the single row: every variable is constant in it
+        return bool(self._run(row, 0, []))
+
+    def block_width(self, block_bits=BLOCK_BITS):
+        return min(len(self.variables), block_bits)
+
+    def blocks(self, block_bits=BLOCK_BITS, start=0, stop=None):
+        """Yield (first row, row count, bit-vector) for consecutive blocks of 2^block_bits rows,
+        or fewer when there are fewer rows; bit j of the vector is row first + j"""
+        width = self.block_width(block_bits)
+        masks = [variable_mask(i, width) for i in range(width)]
+        count = 1 << width
+        stop = self.rows if stop is None else stop
+        for first in range(start - start % count, stop, count):
+            yield first, count, self._run(first, width, masks)
+
+    def _run(self, first, width, masks):
+        # Evaluate the 2^width rows from first; variables below width vary within the block
+        # as masks gives them, the others are the same in every row of it
+        full = (1 << (1 << width)) - 1
+        values = [0] * self._registers
+        for register, i in self._inputs:
+            if i < width:
+                values[register] = masks[i]
+            else:
+                values[register] = full if first >> i & 1 else 0
+        for instruction in self._program:
+            op, target = instruction[0], instruction[1]
+            if op == 'const':
+                values[target] = full if instruction[2] else 0
+            elif op == 'not':
+                values[target] = values[instruction[2]] ^ full
+            else:
+                left, right = values[instruction[2]], values[instruction[3]]
+                if op == 'and':
+                    values[target] = left & right
+                elif op == 'or':
+                    values[target] = left | right
+                elif op == 'implies':
+                    values[target] = (left ^ full) | right
+                elif op == 'iff':
+                    values[target] = left ^ right ^ full
+                else:
+                    values[target] = left ^ right
+        return values[self._output]
+
+    def truth_vector(self):
+        """The whole result column as one int, bit r for row r"""
+        vector = 0
+        for first, count, bits in self.blocks():
+            vector |= bits << first
+        return vector
+
+    def find_row(self, value):
+        """First row where the expression has the given truth value, or None; stops at the first block that has one"""
+        for first, count, bits in self.blocks():
+            if not value:
+                bits ^= (1 << count) - 1
+            if bits:
+                return first + ((bits & -bits).bit_length() - 1)
+        return None
+
+    def assignment(self, row):
+        """The {variable: bool} assignment of a row"""
+        return {name: bool(row >> i & 1) for i, name in enumerate(self.variables)}
+
+    def find_model(self):
+        """A satisfying assignment (the first in row order), or None"""
+        row = self.find_row(True)
+        return None if row is None else self.assignment(row)
+
+    def find_countermodel(self):
+        """A falsifying assignment (the first in row order), or None"""
+        row = self.find_row(False)
+        return None if row is None else self.assignment(row)
+
+    def is_satisfiable(self):
+        return self.find_row(True) is not None
+
+    def is_tautology(self):
+        return self.find_row(False) is None
+
+    def is_contradiction(self):
+        return not self.is_satisfiable()
+
+    def count_models(self):
+        """Rows in which the expression is true"""
+        return sum(bits.bit_count() for _, _, bits in self.blocks())
+
+    def classify(self):
+        """'tautology', 'contradiction' or 'contingent', deciding from as few blocks as possible"""
+        seen_true = seen_false = False
+        for _, count, bits in self.blocks():
+            seen_true = seen_true or bits != 0
+            seen_false = seen_false or bits != (1 << count) - 1
+            if seen_true and seen_false:
+                return 'contingent'
+        return 'tautology' if not seen_false else 'contradiction'
+
+
+def as_expression(expression):
+    return expression if isinstance(expression, Expression) else Expression(expression)
+
+
+def equivalence_counterexample(first, second):
+    """First assignment on which two expressions differ, or None when they are equivalent.
+    Columns are the first expression's variables followed by the second's new ones."""
+    first, second = as_expression(first), as_expression(second)
+    variables = first.variables + [name for name in second.variables if name not in first.variables]
+    return Expression(tree=('xor', first.tree, second.tree), variables=variables).find_model()
+
+
+def equivalent(first, second):
+    """Whether two expressions have the same truth value on every assignment"""
+    return equivalence_counterexample(first, second) is None
+
+
+def entails(premise, conclusion):
+    """Whether every assignment satisfying premise satisfies conclusion"""
+    premise, conclusion = as_expression(premise), as_expression(conclusion)
+    variables = premise.variables + [name for name in conclusion.variables if name not in premise.variables]
+    return Expression(tree=('implies', premise.tree, conclusion.tree), variables=variables).is_tautology()
+
+
+def table_chunks(expression, format='csv', block_bits=BLOCK_BITS):
+    """Yield the truth table as bytes, one block of rows at a time.
+
+    'csv' writes a header of the variable names and 'result', then one line of
+    0/1 values per row. 'bits' writes only the result column, packed eight rows
+    to a byte with row r at bit r % 8 of byte r // 8; the variable values of a
+    row are the bits of its number.
+    """
+    expression = as_expression(expression)
+    if format == 'bits':
+        # Blocks of at least 8 rows keep every block on whole bytes
+        for first, count, bits in expression.blocks(max(block_bits, 3)):
+            yield bits.to_bytes(max(1, count // 8), 'little')
+        return
+    if format != 'csv':
+        raise ValueError(f"unknown truth table format {format!r}")
+
+    n = len(expression.variables)
+    yield (','.join(expression.variables + ['result']) + '\n').encode('utf-8')
+    # The low variables repeat the same 2^low lines of values in every run of 2^low rows
+    low = min(expression.block_width(block_bits), CSV_LOW_BITS)
+    low_columns = [','.join('1' if row >> i & 1 else '0' for i in range(low)) for row in range(1 << low)]
+    for first, count, bits in expression.blocks(block_bits):
+        digits = format_bits(bits, count)
+        lines = []
+        for run in range(first, first + count, 1 << low):
+            high = ''.join(',1' if run >> i & 1 else ',0' for i in range(low, n))
+            if low:
+                endings = (high + ',0\n', high + ',1\n')
+                offset = run - first
+                lines.append(''.join([columns + endings[digit == '1']
+                                      for columns, digit in zip(low_columns, digits[offset:offset + (1 << low)])]))
+            else:
+                # Blocks of one row: its values and result (just the result with no variables)
+                lines.append((high + ',' + digits[run - first]).lstrip(',') + '\n')
+        yield ''.join(lines).encode('ascii')
+
+
+def format_bits(bits, count):
+    """The count lowest bits of bits as '0'/'1' characters, lowest first"""
+    return format(bits, f'0{count}b')[::-1]
+
+
+def write_table(expression, path, format='csv', block_bits=BLOCK_BITS):
+    """Stream the truth table of expression to a file; returns the bytes written"""
+    written = 0
+    with open(path, 'wb') as handle:
+        for chunk in table_chunks(expression, format, block_bits):
+            handle.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def summarize(expression, max_table_variables=0):
+    """JSON-serializable analysis: classification, first model and countermodel, model count,
+    and the result column as a '0'/'1' string (row 0 first) for up to max_table_variables variables"""
+    expression = as_expression(expression)
+    model, countermodel = expression.find_model(), expression.find_countermodel()
+    summary = {
+        'expression': str(expression),
+        'parsed': format_tree(expression.tree),
+        'variables': expression.variables,
+        'rows': expression.rows,
+        'classification': ('contingent' if model is not None and countermodel is not None
+                           else 'tautology' if model is not None else 'contradiction'),
+        'satisfiable': model is not None,
+        'tautology': countermodel is None,
+        'model': model,
+        'countermodel': countermodel,
+        'models': expression.count_models()
+    }
+    if len(expression.variables) <= max_table_variables:
+        summary['table'] = format_bits(expression.truth_vector(), expression.rows)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a propositional formula with bit-parallel truth tables')
+    parser.add_argument('expression', help="formula using ¬ ∧ ∨ → ↔ ⊕ (or ~ & | -> <-> ^, or not/and/or/implies/iff/xor)")
+    parser.add_argument('--equivalent', default=None, metavar='EXPRESSION', help='check equivalence with another formula')
+    parser.add_argument('--table', default=None, metavar='FILE', help="stream the truth table to FILE ('-' for stdout)")
+    parser.add_argument('--format', choices=('csv', 'bits'), default='csv',
+                        help='truth table format: CSV rows, or the packed result column (default: csv)')
+    parser.add_argument('--json', action='store_true', help='print the analysis as JSON')
+    args = parser.parse_args()
+
+    try:
+        expression = Expression(args.expression)
+        if args.table:
+            started = perf_counter()
+            if args.table == '-':
+                for chunk in table_chunks(expression, args.format):
+                    sys.stdout.buffer.write(chunk)
+                return True
+            written = write_table(expression, args.table, args.format)
+            print(f"{expression.rows:,} rows ({written:,} bytes) written to {args.table} "
+                  f"in {perf_counter() - started:.2f} s", file=sys.stderr)
+            return True
+
+        started = perf_counter()
+        if args.equivalent is not None:
+            counterexample = equivalence_counterexample(expression, args.equivalent)
+            result = {'equivalent': counterexample is None, 'counterexample': counterexample}
+        else:
+            result = summarize(expression)
+        elapsed = perf_counter() - started
+    except LogicError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.equivalent is not None:
+        print('Equivalent' if result['equivalent'] else f"Not equivalent; they differ on {result['counterexample']}")
+    else:
+        print(f"{result['parsed']}: {result['classification']} over {len(result['variables'])} variable(s), "
+              f"{result['models']:,} of {result['rows']:,} rows true ({elapsed:.3f} s)")
+        if result['countermodel'] is not None and result['model'] is not None:
+            print(f"  true on {result['model']}\n  false on {result['countermodel']}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
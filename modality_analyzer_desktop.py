@@ -1,7 +1,59 @@
+import time
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import re
-import math
+from modality_engine import ModalityAnalyzer
+from incremental_analysis import IncrementalDocument
+from breakdown_view import SentenceBreakdownView
+from instrumentation import format_summary
+
+# Pause in typing, in milliseconds, before live analysis runs
+LIVE_ANALYSIS_DELAY = 300
+
+# How often the window collects results from the analysis thread, and how long each
+# visit may spend on them, in milliseconds
+POLL_INTERVAL = 25
+RENDER_BUDGET = 20
+
+class AnalysisCancelled(Exception):
+    """Raised inside an analysis thread to stop it"""
+
+class AnalysisJob(threading.Thread):
+    """Analyzes one text into the shared IncrementalDocument on a background thread.
+    Tk may only be used from the main thread, so progress and results are posted
+    to a queue that the window polls."""
+    
+    def __init__(self, document, text, previous=None):
+        super().__init__(daemon=True)
+        self.document = document
+        self.text = text
+        self.previous = previous
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        
+    def cancel(self):
+        self.cancelled.set()
+        
+    def run(self):
+        # Jobs take turns with the document; a cancelled predecessor stops at its next sentence
+        if self.previous is not None:
+            self.previous.join()
+            self.previous = None
+        try:
+            if self.cancelled.is_set():
+                raise AnalysisCancelled()
+            changed = self.document.update(self.text, self.report)
+            self.messages.put(('done', changed, self.document.result(), self.document.rescored))
+        except AnalysisCancelled:
+            self.messages.put(('cancelled',))
+        except Exception as e:
+            self.messages.put(('error', e))
+            
+    def report(self, index, count, result):
+        if self.cancelled.is_set():
+            raise AnalysisCancelled()
+        self.messages.put(('sentence', index, count, result))
 
 class ModalityAnalyzerDesktop:
     def __init__(self, root):
@@ -13,8 +65,24 @@ class ModalityAnalyzerDesktop:
         # Configure style
         self.setup_styles()
         
-        # Initialize analyzer
+        # Initialize analyzer; the document re-analyzes only the sentences an edit touched
         self.analyzer = ModalityAnalyzer()
+        self.document = IncrementalDocument(self.analyzer)
+        self.live_job = None
+        
+        # The running AnalysisJob, and the text it was given
+        self.job = None
+        self.job_text = None
+        self.job_reports_errors = False
+        self.job_first = None
+        self.job_streaming = False
+        self.poll_job = None
+        
+        # How many breakdown rows are known to match the document's sentences
+        self.rows_valid = 0
+        
+        # The last finished result, whose sentence spans a breakdown row click highlights
+        self.result = None
         
         # Create GUI
         self.create_widgets()
@@ -60,12 +128,41 @@ class ModalityAnalyzerDesktop:
         
         self.text_input = scrolledtext.ScrolledText(input_frame, height=6, wrap=tk.WORD, font=('Segoe UI', 11))
         self.text_input.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        self.text_input.bind('<<Modified>>', self.on_text_modified)
+        self.text_input.tag_configure('highlight', background='#fff3b0')
         
         info_label = ttk.Label(input_frame, text="💡 Enter multiple sentences for detailed paragraph/essay analysis with proportional scoring", style='Info.TLabel')
         info_label.grid(row=2, column=0, sticky=tk.W, pady=(0, 10))
         
-        self.analyze_button = ttk.Button(input_frame, text="Analyze Modality", command=self.analyze_text)
-        self.analyze_button.grid(row=3, column=0, pady=(0, 10))
+        buttons_frame = ttk.Frame(input_frame)
+        buttons_frame.grid(row=3, column=0, pady=(0, 10))
+        
+        self.analyze_button = ttk.Button(buttons_frame, text="Analyze Modality", command=self.analyze_text)
+        self.analyze_button.grid(row=0, column=0)
+        
+        self.live_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(buttons_frame, text="Analyze as I type", variable=self.live_var).grid(row=0, column=1, padx=(15, 0))
+        
+        self.cancel_button = ttk.Button(buttons_frame, text="Cancel", command=self.cancel_analysis)
+        self.cancel_button.grid(row=0, column=2, padx=(15, 0))
+        self.cancel_button.state(['disabled'])
+        
+        self.analysis_progress = ttk.Progressbar(buttons_frame, length=200, mode='determinate')
+        self.analysis_progress.grid(row=0, column=3, padx=(15, 0))
+        self.analysis_progress.grid_remove()
+        
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(buttons_frame, textvariable=self.status_var, style='Info.TLabel').grid(row=0, column=4, padx=(10, 0))
+        
+        self.timings_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(buttons_frame, text="Show timings", variable=self.timings_var,
+                        command=self.toggle_timings).grid(row=0, column=5, padx=(15, 0))
+        
+        # Cumulative stage times of the analyzer, while "Show timings" is on
+        self.metrics_var = tk.StringVar(value="")
+        self.metrics_label = ttk.Label(buttons_frame, textvariable=self.metrics_var, style='Info.TLabel')
+        self.metrics_label.grid(row=1, column=0, columnspan=6, pady=(5, 0))
+        self.metrics_label.grid_remove()
         
         # Examples section
         examples_frame = ttk.LabelFrame(input_frame, text="Examples", padding="10")
@@ -157,8 +254,14 @@ class ModalityAnalyzerDesktop:
         
         # Sentence breakdown (for paragraphs)
         self.breakdown_frame = ttk.LabelFrame(self.results_frame, text="Sentence-by-Sentence Analysis", padding="10")
-        self.breakdown_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 15))
+        self.breakdown_frame.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 15))
         self.breakdown_frame.columnconfigure(0, weight=1)
+        self.breakdown_frame.rowconfigure(0, weight=1)
+        self.results_frame.rowconfigure(2, weight=2)
+        
+        # Draws only the rows in view, so document size does not matter
+        self.breakdown_view = SentenceBreakdownView(self.breakdown_frame, on_select=self.highlight_sentence)
+        self.breakdown_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # Analysis details
         details_frame = ttk.LabelFrame(self.results_frame, text="Analysis Details", padding="10")
@@ -181,18 +284,141 @@ class ModalityAnalyzerDesktop:
             messagebox.showwarning("Input Required", "Please enter text to analyze.")
             return
             
-        try:
-            # Analyze the text
-            result = self.analyzer.analyze(text)
+        self.start_analysis(text, report_errors=True)
+    
+    def on_text_modified(self, event=None):
+        # Tk sets the modified flag once; clear it so the next edit fires again
+        self.text_input.edit_modified(False)
+        if not self.live_var.get():
+            return
+        if self.live_job is not None:
+            self.root.after_cancel(self.live_job)
+        self.live_job = self.root.after(LIVE_ANALYSIS_DELAY, self.analyze_live)
+    
+    def analyze_live(self):
+        self.live_job = None
+        text = self.text_input.get(1.0, tk.END).strip()
+        if not text:
+            self.cancel_analysis()
+            self.results_frame.grid_remove()
+            return
+        if text != self.job_text:
+            # The Analyze button reports errors; typing should not pop up dialogs
+            self.start_analysis(text, report_errors=False)
+    
+    def start_analysis(self, text, report_errors):
+        # A newer text supersedes the running analysis
+        if self.job is not None:
+            self.job.cancel()
+        self.job = AnalysisJob(self.document, text, previous=self.job)
+        self.job_text = text
+        self.job_reports_errors = report_errors
+        self.job_first = None
+        self.job_streaming = False
+        
+        self.analysis_progress['value'] = 0
+        self.analysis_progress.grid()
+        self.cancel_button.state(['!disabled'])
+        self.status_var.set("Analyzing...")
+        
+        self.job.start()
+        if self.poll_job is None:
+            self.poll_job = self.root.after(POLL_INTERVAL, self.poll_analysis)
+    
+    def cancel_analysis(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.status_var.set("Cancelling...")
+    
+    def poll_analysis(self):
+        self.poll_job = None
+        deadline = time.perf_counter() + RENDER_BUDGET / 1000
+        
+        while self.job is not None and time.perf_counter() < deadline:
+            try:
+                message = self.job.messages.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_analysis_message(message)
+        
+        self.update_timings()
+        if self.job is not None:
+            self.poll_job = self.root.after(POLL_INTERVAL, self.poll_analysis)
+    
+    def handle_analysis_message(self, message):
+        kind = message[0]
+        if kind == 'sentence':
+            _, index, count, result = message
+            if self.job_first is None:
+                # Rows before the edited range still hold the document's sentences
+                self.job_first = index
+                keep = min(index, self.rows_valid)
+                self.breakdown_view.truncate(keep)
+                self.job_streaming = keep == index and count > 1
+                if self.job_streaming:
+                    self.results_frame.grid()
+                    self.breakdown_frame.grid()
+            if self.job_streaming:
+                self.breakdown_view.append(result)
+            self.analysis_progress['value'] = 100 * (index + 1) / count
+            return
+        
+        self.finish_analysis()
+        if kind == 'done':
+            _, (start, old_end, new_end), result, rescored = message
+            sentence_results = result['sentenceResults'] if result['isParagraph'] else []
+            keep = new_end if self.job_streaming else min(start, self.rows_valid)
+            keep = min(keep, len(sentence_results))
+            self.breakdown_view.truncate(keep)
+            self.breakdown_view.extend(sentence_results[keep:])
+            self.rows_valid = len(sentence_results)
             
-            # Update UI with results
+            self.result = result
             self.update_results(result)
-            
-            # Show results frame
             self.results_frame.grid()
-            
-        except Exception as e:
-            messagebox.showerror("Analysis Error", f"An error occurred during analysis: {str(e)}")
+            self.status_var.set(f"{len(result['sentences'])} sentences, {rescored} analyzed")
+            return
+        
+        # The document is unchanged; rows shown for the abandoned text are partial results
+        self.job_text = None
+        if self.job_first is not None:
+            self.rows_valid = min(self.rows_valid, self.job_first)
+        if kind == 'cancelled':
+            self.status_var.set("Cancelled; showing partial results")
+        else:
+            self.status_var.set("Analysis failed")
+            if self.job_reports_errors:
+                messagebox.showerror("Analysis Error", f"An error occurred during analysis: {str(message[1])}")
+    
+    def toggle_timings(self):
+        if self.timings_var.get():
+            self.analyzer.enable_instrumentation()
+            self.metrics_label.grid()
+            self.update_timings()
+        else:
+            self.analyzer.disable_instrumentation()
+            self.metrics_label.grid_remove()
+    
+    def update_timings(self):
+        # The analysis thread keeps adding to the counters; this reads them as they stand
+        if self.analyzer.instrumentation is not None:
+            self.metrics_var.set(format_summary(self.analyzer.metrics()))
+    
+    def highlight_sentence(self, index):
+        # Spans are offsets into the stripped input; skip them if it has changed since
+        raw = self.text_input.get(1.0, 'end-1c')
+        if self.result is None or raw.strip() != self.result['text'] or index >= len(self.result['spans']):
+            return
+        lead = len(raw) - len(raw.lstrip())
+        start, end = self.result['spans'][index]
+        self.text_input.tag_remove('highlight', 1.0, tk.END)
+        self.text_input.tag_add('highlight', f"1.0 + {lead + start} chars", f"1.0 + {lead + end} chars")
+        self.text_input.see(f"1.0 + {lead + start} chars")
+    
+    def finish_analysis(self):
+        self.job = None
+        self.analysis_progress.grid_remove()
+        self.cancel_button.state(['disabled'])
     
     def update_results(self, result):
         # Update progress bars and labels
@@ -210,9 +436,9 @@ class ModalityAnalyzerDesktop:
         # Update classification
         self.classification_var.set(result['classification'])
         
-        # Update sentence breakdown for paragraphs
+        # Breakdown rows arrive through poll_analysis; only paragraphs show them
         if result.get('isParagraph', False):
-            self.update_sentence_breakdown(result['sentenceResults'])
+            self.breakdown_frame.grid()
         else:
             # Hide breakdown for single sentences
             self.breakdown_frame.grid_remove()
@@ -220,347 +446,6 @@ class ModalityAnalyzerDesktop:
         # Update explanation
         self.explanation_text.delete(1.0, tk.END)
         self.explanation_text.insert(1.0, result['explanation'])
-        
-    def update_sentence_breakdown(self, sentence_results):
-        # Clear existing breakdown
-        for widget in self.breakdown_frame.winfo_children():
-            widget.destroy()
-            
-        # Show breakdown frame
-        self.breakdown_frame.grid()
-        
-        for i, result in enumerate(sentence_results):
-            sentence_frame = ttk.Frame(self.breakdown_frame)
-            sentence_frame.grid(row=i, column=0, sticky=(tk.W, tk.E), pady=5)
-            sentence_frame.columnconfigure(1, weight=1)
-            
-            # Sentence text
-            sentence_label = ttk.Label(sentence_frame, text=f"Sentence {i+1}:", font=('Segoe UI', 10, 'bold'))
-            sentence_label.grid(row=0, column=0, sticky=tk.W)
-            
-            sentence_text = ttk.Label(sentence_frame, text=result['sentence'], wraplength=600, font=('Segoe UI', 9))
-            sentence_text.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
-            
-            # Mini progress bars
-            scores_frame = ttk.Frame(sentence_frame)
-            scores_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
-            
-            scores = result['scores']
-            
-            # Necessity mini bar
-            ttk.Label(scores_frame, text="N:", font=('Segoe UI', 8)).grid(row=0, column=0)
-            n_progress = ttk.Progressbar(scores_frame, length=100, mode='determinate')
-            n_progress.grid(row=0, column=1, padx=(5, 5))
-            n_progress['value'] = scores['necessity']
-            ttk.Label(scores_frame, text=f"{round(scores['necessity'])}%", font=('Segoe UI', 8)).grid(row=0, column=2)
-            
-            # Possibility mini bar
-            ttk.Label(scores_frame, text="P:", font=('Segoe UI', 8)).grid(row=0, column=3, padx=(10, 0))
-            p_progress = ttk.Progressbar(scores_frame, length=100, mode='determinate')
-            p_progress.grid(row=0, column=4, padx=(5, 5))
-            p_progress['value'] = scores['possibility']
-            ttk.Label(scores_frame, text=f"{round(scores['possibility'])}%", font=('Segoe UI', 8)).grid(row=0, column=5)
-            
-            # Impossibility mini bar
-            ttk.Label(scores_frame, text="I:", font=('Segoe UI', 8)).grid(row=0, column=6, padx=(10, 0))
-            i_progress = ttk.Progressbar(scores_frame, length=100, mode='determinate')
-            i_progress.grid(row=0, column=7, padx=(5, 5))
-            i_progress['value'] = scores['impossibility']
-            ttk.Label(scores_frame, text=f"{round(scores['impossibility'])}%", font=('Segoe UI', 8)).grid(row=0, column=8)
-            
-            # Classification
-            ttk.Label(scores_frame, text=f"→ {result['classification']}", font=('Segoe UI', 9, 'italic')).grid(row=0, column=9, padx=(15, 0))
-
-
-class ModalityAnalyzer:
-    def __init__(self):
-        # Alethic modality patterns
-        self.logical_patterns = {
-            'necessity': [
-                r'\d+\s*[+\-*/]\s*\d+\s*=\s*\d+',
-                r'all triangles have three sides',
-                r'all squares have four sides',
-                r'all bachelors are unmarried',
-                r'all circles are round',
-                r'either.*or not',
-                r'by definition',
-                r'necessarily true',
-                r'logically necessary',
-                r'tautology',
-                r'axiom',
-                r'theorem',
-                r'contradictions are impossible',
-                r'cannot be both.*and.*simultaneously',
-                r'either.*proposition.*or.*not',
-                r'principles.*necessarily true',
-                r'logical system'
-            ],
-            'impossibility': [
-                r'married bachelor',
-                r'square circle',
-                r'round square',
-                r'something is both.*and not',
-                r'true and false',
-                r'exists and does not exist',
-                r'self-contradictory'
-            ]
-        }
-        
-        self.modal_indicators = {
-            'epistemic': ['certain', 'sure', 'confident', 'believe', 'think', 'know', 'obvious'],
-            'deontic': ['must', 'should', 'ought', 'required', 'forbidden', 'allowed', 'permitted'],
-            'possibility': ['can', 'could', 'may', 'might', 'possible', 'perhaps', 'maybe', 'likely', 'probable']
-        }
-    
-    def split_into_sentences(self, text):
-        sentences = re.split(r'[.!?]+\s+', text.strip())
-        return [s.strip() for s in sentences if s.strip()]
-    
-    def analyze(self, text):
-        sentences = self.split_into_sentences(text)
-        
-        if len(sentences) == 1:
-            # Single sentence analysis
-            scores = self.calculate_modality_scores(text)
-            classification = self.classify_modality(scores)
-            explanation = f"Single sentence analysis. Classification: {classification}"
-            
-            return {
-                'text': text,
-                'sentences': [text],
-                'sentenceResults': [{
-                    'sentence': text,
-                    'scores': scores,
-                    'classification': classification,
-                    'explanation': explanation
-                }],
-                'scores': scores,
-                'classification': classification,
-                'explanation': explanation,
-                'isParagraph': False
-            }
-        else:
-            # Multi-sentence analysis
-            sentence_results = []
-            for sentence in sentences:
-                scores = self.calculate_modality_scores(sentence)
-                classification = self.classify_modality(scores)
-                sentence_results.append({
-                    'sentence': sentence,
-                    'scores': scores,
-                    'classification': classification,
-                    'explanation': f"Sentence classification: {classification}"
-                })
-            
-            # Calculate paragraph scores
-            paragraph_scores = self.calculate_paragraph_scores(sentence_results)
-            paragraph_classification = self.classify_modality(paragraph_scores)
-            paragraph_explanation = self.generate_paragraph_explanation(sentence_results, paragraph_scores, paragraph_classification)
-            
-            return {
-                'text': text,
-                'sentences': sentences,
-                'sentenceResults': sentence_results,
-                'scores': paragraph_scores,
-                'classification': paragraph_classification,
-                'explanation': paragraph_explanation,
-                'isParagraph': True
-            }
-    
-    def calculate_modality_scores(self, sentence):
-        scores = {'necessity': 0, 'possibility': 0, 'impossibility': 0}
-        sentence_lower = sentence.lower()
-        
-        # Check for logical necessity
-        logical_necessity = self.detect_logical_necessity(sentence_lower)
-        logical_impossibility = self.detect_logical_impossibility(sentence_lower)
-        
-        if logical_necessity > 0:
-            scores['necessity'] = logical_necessity
-            scores['possibility'] = min(20, logical_necessity * 0.2)
-            scores['impossibility'] = 0
-        elif logical_impossibility > 0:
-            scores['impossibility'] = logical_impossibility
-            scores['necessity'] = 0
-            scores['possibility'] = 0
-        else:
-            # Analyze contingent statement
-            self.analyze_contingent_statement(scores, sentence_lower)
-        
-        # Ensure scores are in valid range
-        for key in scores:
-            scores[key] = max(0, min(100, scores[key]))
-            
-        return scores
-    
-    def detect_logical_necessity(self, sentence):
-        # Check for mathematical equations
-        if re.search(r'\d+\s*[+\-*/]\s*\d+\s*=\s*\d+', sentence):
-            return 95
-            
-        # Check for logical necessity patterns
-        for pattern in self.logical_patterns['necessity']:
-            if re.search(pattern, sentence, re.IGNORECASE):
-                return 90
-                
-        return 0
-    
-    def detect_logical_impossibility(self, sentence):
-        # Don't flag statements ABOUT impossibility as impossible themselves
-        if any(phrase in sentence for phrase in ['contradictions are impossible', 'are logically impossible', 'principles', 'logical system']):
-            return 0
-            
-        # Check for actual logical contradictions
-        for pattern in self.logical_patterns['impossibility']:
-            if re.search(pattern, sentence, re.IGNORECASE):
-                return 95
-                
-        return 0
-    
-    def analyze_contingent_statement(self, scores, sentence):
-        # Check for modal indicators
-        if any(word in sentence for word in self.modal_indicators['epistemic']):
-            scores['possibility'] = 60
-        
-        if any(word in sentence for word in self.modal_indicators['deontic']):
-            scores['possibility'] = 50
-            
-        if any(word in sentence for word in self.modal_indicators['possibility']):
-            scores['possibility'] = 70
-            
-        # Empirical claims are contingent
-        if any(word in sentence for word in ['weather', 'tomorrow', 'will happen', 'probably']):
-            scores['possibility'] = 60
-            scores['necessity'] = 0
-    
-    def calculate_paragraph_scores(self, sentence_results):
-        if not sentence_results:
-            return {'necessity': 0, 'possibility': 0, 'impossibility': 0}
-            
-        if len(sentence_results) == 1:
-            return sentence_results[0]['scores']
-        
-        # Weighted scoring
-        total_weight = 0
-        weighted_scores = {'necessity': 0, 'possibility': 0, 'impossibility': 0}
-        distribution = {'necessity': 0, 'possibility': 0, 'impossibility': 0, 'neutral': 0}
-        
-        for result in sentence_results:
-            sentence = result['sentence']
-            scores = result['scores']
-            
-            # Calculate weight
-            length_weight = min(len(sentence) / 50, 2)
-            sentence_weight = length_weight
-            total_weight += sentence_weight
-            
-            # Add weighted scores
-            for score_type in scores:
-                weighted_scores[score_type] += scores[score_type] * sentence_weight
-            
-            # Track distribution
-            dominant_type = self.get_dominant_modality(scores)
-            distribution[dominant_type] += 1
-        
-        # Calculate final averages
-        for score_type in weighted_scores:
-            weighted_scores[score_type] = weighted_scores[score_type] / total_weight
-        
-        # Apply distribution adjustments
-        self.apply_distribution_adjustments(weighted_scores, distribution, len(sentence_results))
-        
-        return weighted_scores
-    
-    def get_dominant_modality(self, scores):
-        max_score = max(scores['necessity'], scores['possibility'], scores['impossibility'])
-        if max_score < 25:
-            return 'neutral'
-        
-        if scores['necessity'] == max_score:
-            return 'necessity'
-        elif scores['impossibility'] == max_score:
-            return 'impossibility'
-        elif scores['possibility'] == max_score:
-            return 'possibility'
-        return 'neutral'
-    
-    def apply_distribution_adjustments(self, scores, distribution, total_sentences):
-        total_modal = distribution['necessity'] + distribution['possibility'] + distribution['impossibility']
-        modal_ratio = total_modal / total_sentences
-        
-        # If most sentences are neutral, reduce scores
-        if modal_ratio < 0.3:
-            for score_type in scores:
-                scores[score_type] *= 0.7
-        
-        # If strong consensus, boost that score
-        for modality_type in ['necessity', 'possibility', 'impossibility']:
-            if distribution[modality_type] / total_sentences > 0.6:
-                scores[modality_type] = min(100, scores[modality_type] * 1.3)
-        
-        # Special case: if necessity dominates
-        if distribution['necessity'] > distribution['impossibility'] and distribution['necessity'] > distribution['possibility']:
-            scores['necessity'] = min(100, scores['necessity'] * 1.1)
-            scores['impossibility'] = max(0, scores['impossibility'] * 0.8)
-    
-    def classify_modality(self, scores):
-        threshold = 25
-        max_score = max(scores['necessity'], scores['possibility'], scores['impossibility'])
-        
-        if scores['necessity'] == max_score and scores['necessity'] > threshold:
-            if scores['necessity'] > 85:
-                return 'Logically Necessary'
-            elif scores['necessity'] > 70:
-                return 'Strongly Necessary'
-            elif scores['necessity'] > 50:
-                return 'Necessary'
-            return 'Weakly Necessary'
-        
-        if scores['impossibility'] == max_score and scores['impossibility'] > threshold:
-            if scores['impossibility'] > 85:
-                return 'Logically Impossible'
-            elif scores['impossibility'] > 70:
-                return 'Strongly Impossible'
-            elif scores['impossibility'] > 50:
-                return 'Impossible'
-            return 'Weakly Impossible'
-        
-        if scores['possibility'] == max_score and scores['possibility'] > threshold:
-            if scores['possibility'] > 85:
-                return 'Highly Possible'
-            elif scores['possibility'] > 70:
-                return 'Very Possible'
-            elif scores['possibility'] > 50:
-                return 'Possible'
-            return 'Weakly Possible'
-        
-        return 'Neutral/Contingent'
-    
-    def generate_paragraph_explanation(self, sentence_results, paragraph_scores, classification):
-        total_sentences = len(sentence_results)
-        distribution = {'necessity': 0, 'possibility': 0, 'impossibility': 0, 'neutral': 0}
-        
-        for result in sentence_results:
-            dominant_type = self.get_dominant_modality(result['scores'])
-            distribution[dominant_type] += 1
-        
-        explanation = f"Analyzed {total_sentences} sentence{'s' if total_sentences > 1 else ''}. "
-        
-        # Distribution breakdown
-        breakdown = []
-        for modality_type in distribution:
-            if distribution[modality_type] > 0:
-                percentage = round((distribution[modality_type] / total_sentences) * 100)
-                breakdown.append(f"{distribution[modality_type]} {modality_type} ({percentage}%)")
-        
-        if breakdown:
-            explanation += f"Distribution: {', '.join(breakdown)}. "
-        
-        # Overall assessment
-        dominant_type = max(paragraph_scores.keys(), key=lambda k: paragraph_scores[k])
-        explanation += f'Overall classification: "{classification}" based on weighted analysis with {dominant_type} as the dominant modality ({round(paragraph_scores[dominant_type])}%).'
-        
-        return explanation
 
 
 if __name__ == "__main__":
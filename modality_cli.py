@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Headless command line interface for the modality analyzer.
+Reads documents from files, stdin or JSONL records and writes one JSON result per line.
+
+    python -m modality_cli essay.txt notes.txt
+    python -m modality_cli --format lines < sentences.txt
+    python -m modality_cli --format jsonl --workers 8 --fields id,scores,classification corpus.jsonl
+    python -m modality_cli --metrics metrics.prom --profile run.prof essay.txt
+"""
+
+import io
+import sys
+import json
+import argparse
+from collections import deque
+from contextlib import nullcontext
+
+from modality_engine import ModalityAnalyzer
+from instrumentation import to_prometheus
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='modality_cli', description='Analyze text for alethic modality and print JSON lines')
+    parser.add_argument('inputs', nargs='*', default=['-'], help="input files ('-' or none for stdin)")
+    parser.add_argument('--format', choices=['text', 'lines', 'jsonl'], default='text',
+                        help='text: each input is one document; lines: each line is a document; '
+                             'jsonl: each line is a JSON record or string')
+    parser.add_argument('--text-field', default='text', help='record field holding the text in jsonl mode')
+    parser.add_argument('--id-field', default='id', help='record field copied to the output in jsonl mode')
+    parser.add_argument('--fields', default=None,
+                        help='comma-separated result fields to keep, e.g. scores,classification')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes (default: 1)')
+    parser.add_argument('--chunksize', type=int, default=None, help='documents per worker task')
+    parser.add_argument('--max-sentence-length', type=int, default=None, help='split longer sentences into chunks')
+    parser.add_argument('--cache-size', type=int, default=None, help='in-memory sentence score cache entries')
+    parser.add_argument('--store', default=None, help='persistent score store (SQLite file)')
+    parser.add_argument('--metrics', default=None,
+                        help="write stage timers and rule counters in Prometheus text format to this file ('-' for stderr)")
+    parser.add_argument('--profile', default=None,
+                        help='write cProfile stats of the run to this file (worker processes are not profiled)')
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+    return parser.parse_args(argv)
+
+
+def open_input(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def read_documents(args):
+    """Yield (metadata, text) for every document in the inputs"""
+    for path in args.inputs:
+        with open_input(path) as handle:
+            if args.format == 'text':
+                yield {'source': path}, handle.read()
+                continue
+
+            for number, line in enumerate(handle, 1):
+                line = line.rstrip('\r\n')
+                if not line.strip():
+                    continue
+                meta = {'source': path, 'line': number}
+                if args.format == 'lines':
+                    yield meta, line
+                    continue
+
+                # A bad record is reported and skipped rather than ending the batch
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    skip_record(path, number, f'invalid JSON: {e}')
+                    continue
+                if isinstance(record, str):
+                    yield meta, record
+                    continue
+                if not isinstance(record, dict):
+                    skip_record(path, number, f'expected an object or a string, not {type(record).__name__}')
+                    continue
+                text = record.get(args.text_field, '')
+                if not isinstance(text, str):
+                    skip_record(path, number, f'"{args.text_field}" is {type(text).__name__}, not a string')
+                    continue
+                if args.id_field in record:
+                    meta = {'id': record[args.id_field]}
+                yield meta, text
+
+
+def skip_record(path, number, reason):
+    sys.stderr.write(f'{path}:{number}: skipped record: {reason}\n')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fields = [field.strip() for field in args.fields.split(',')] if args.fields else None
+
+    analyzer = ModalityAnalyzer(max_sentence_length=args.max_sentence_length,
+                                cache_size=args.cache_size, store_path=args.store)
+    if args.metrics:
+        analyzer.enable_instrumentation()
+
+    # Metadata waits here while its text is being analyzed; results come back in input order
+    pending = deque()
+
+    def texts():
+        for meta, text in read_documents(args):
+            pending.append(meta)
+            yield text
+
+    if args.output == '-':
+        output = open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=1 << 16, closefd=False)
+    else:
+        output = open(args.output, 'w', encoding='utf-8', buffering=1 << 16)
+
+    try:
+        with analyzer.profile(args.profile) if args.profile else nullcontext():
+            for result in analyzer.analyze_many(texts(), workers=args.workers, chunksize=args.chunksize):
+                record = pending.popleft()
+                if fields:
+                    record.update((field, result[field]) for field in fields if field in result)
+                else:
+                    record.update(result)
+                output.write(json.dumps(record, ensure_ascii=False))
+                output.write('\n')
+    except BrokenPipeError:
+        # Downstream consumer (e.g. head) closed the pipe
+        return True
+    finally:
+        # Closing the pool first collects the workers' last counters
+        analyzer.close()
+        try:
+            output.close()
+        except BrokenPipeError:
+            pass
+        if args.metrics:
+            write_metrics(args.metrics, analyzer.metrics())
+    return True
+
+
+def write_metrics(path, metrics):
+    if path == '-':
+        sys.stderr.write(to_prometheus(metrics))
+        return
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(to_prometheus(metrics))
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
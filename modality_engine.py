@@ -0,0 +1,1166 @@
+"""
+Alethic modality analysis engine.
+Scores sentences, paragraphs and essays for necessity, possibility and
+impossibility without any GUI dependencies.
+"""
+
+import re
+import os
+import json
+import codecs
+import hashlib
+from fractions import Fraction
+from itertools import chain, islice
+from time import perf_counter
+from rule_engine import RuleEngine, KeywordMatcher
+from score_cache import ScoreCache
+from compact_result import CompactResult
+from instrumentation import Instrumentation, profiled
+from sentence_segmenter import SENTENCE_BOUNDARY, BOUNDARY_CONTEXT, split_sentences, iter_spans as iter_sentence_spans
+
+# Anchored at the start of a digit run so long runs of digits cannot backtrack quadratically
+ARITHMETIC_PATTERN = r'(?<!\d)\d+\s*[+\-*/]\s*\d+\s*=\s*\d+'
+
+# Statements ABOUT impossibility that must not be flagged as impossible themselves
+IMPOSSIBILITY_EXEMPTIONS = ['contradictions are impossible', 'are logically impossible', 'principles', 'logical system']
+
+# Empirical claims are contingent
+EMPIRICAL_INDICATORS = ['weather', 'tomorrow', 'will happen', 'probably']
+
+# Bump when the scoring code changes in a way the rule lists do not capture
+SCORING_VERSION = 1
+
+# Paragraph weights are min(len(sentence) / 50, 2), counted in whole units of 1/50
+MAX_WEIGHT_UNITS = 100
+
+# Bump when the ParagraphAccumulator.to_state() layout changes
+STATE_VERSION = 2
+
+# Seconds between instrumented workers' metric reports (and once more when a worker exits)
+METRICS_INTERVAL = 0.5
+
+
+def rule_groups(necessity, exemptions, impossibility):
+    """RuleEngine groups for the given pattern lists, in priority order"""
+    return [
+        ('arithmetic', [ARITHMETIC_PATTERN]),
+        ('necessity', list(necessity)),
+        ('exemption', [re.escape(phrase) for phrase in exemptions]),
+        ('impossibility', list(impossibility))
+    ]
+
+
+def keyword_categories(modal_indicators, empirical):
+    """KeywordMatcher categories for the given indicator lists"""
+    return tuple((category, tuple(words)) for category, words in modal_indicators.items()) + (('empirical', tuple(empirical)),)
+
+
+def exact_number(value):
+    """value as an int when it is whole, otherwise as an exact Fraction"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    value = Fraction(value)
+    return value.numerator if value.denominator == 1 else value
+
+
+class ModalityAnalyzer:
+    def __init__(self, max_sentence_length=None, cache_size=None, cache_bytes=None, store_path=None, rule_packs=None):
+        # Sentences longer than this many characters are scored in chunks (None disables chunking)
+        self.max_sentence_length = max_sentence_length
+        
+        # Opt-in LRU cache of sentence scores, bounded by entry count and/or bytes
+        self.score_cache = ScoreCache(cache_size, cache_bytes) if cache_size or cache_bytes else None
+        self._cache_stamp = None
+        
+        # Opt-in persistent score store shared across runs and processes
+        self.score_store = None
+        if store_path:
+            from score_store import ScoreStore
+            self.score_store = ScoreStore(store_path)
+        self._fingerprint = None
+        
+        # Opt-in stage timers and counters; see enable_instrumentation
+        self.instrumentation = None
+        self._metrics_queue = None
+        
+        # Alethic modality patterns
+        self.logical_patterns = {
+            'necessity': [
+                ARITHMETIC_PATTERN,
+                r'all triangles have three sides',
+                r'all squares have four sides',
+                r'all bachelors are unmarried',
+                r'all circles are round',
+                r'either.*or not',
+                r'by definition',
+                r'necessarily true',
+                r'logically necessary',
+                r'tautology',
+                r'axiom',
+                r'theorem',
+                r'contradictions are impossible',
+                r'cannot be both.*and.*simultaneously',
+                r'either.*proposition.*or.*not',
+                r'principles.*necessarily true',
+                r'logical system'
+            ],
+            'impossibility': [
+                r'married bachelor',
+                r'square circle',
+                r'round square',
+                r'something is both.*and not',
+                r'true and false',
+                r'exists and does not exist',
+                r'self-contradictory'
+            ]
+        }
+        
+        self.modal_indicators = {
+            'epistemic': ['certain', 'sure', 'confident', 'believe', 'think', 'know', 'obvious'],
+            'deontic': ['must', 'should', 'ought', 'required', 'forbidden', 'allowed', 'permitted'],
+            'possibility': ['can', 'could', 'may', 'might', 'possible', 'perhaps', 'maybe', 'likely', 'probable']
+        }
+        self.impossibility_exemptions = list(IMPOSSIBILITY_EXEMPTIONS)
+        self.empirical_indicators = list(EMPIRICAL_INDICATORS)
+        
+        self._rule_engine = None
+        self._rule_key = None
+        self._keyword_matcher = None
+        self._keyword_key = None
+        self._pool = None
+        self._pool_key = None
+        # Pools replaced after a rule change, still finishing the work queued on them
+        self._retired_pools = []
+        
+        # The RuleSet of the rule packs in use, if the rules came from packs
+        self.rule_set = None
+        if rule_packs:
+            self.load_rule_packs(rule_packs)
+    
+    def _rule_groups_key(self):
+        return (tuple(self.logical_patterns['necessity']), tuple(self.impossibility_exemptions),
+                tuple(self.logical_patterns['impossibility']))
+    
+    def get_rule_engine(self):
+        # Recompile only when logical_patterns or the exemptions have been changed since the last build
+        key = self._rule_groups_key()
+        if key != self._rule_key:
+            self._rule_engine = RuleEngine(rule_groups(*key))
+            self._rule_key = key
+        return self._rule_engine
+    
+    def get_keyword_matcher(self):
+        # Rebuild only when modal_indicators or the empirical indicators have been changed since the last build
+        key = keyword_categories(self.modal_indicators, self.empirical_indicators)
+        if key != self._keyword_key:
+            self._keyword_matcher = KeywordMatcher(key)
+            self._keyword_key = key
+        return self._keyword_matcher
+    
+    def install_rules(self, engine, matcher):
+        """Use an already built RuleEngine and KeywordMatcher for the current rule lists,
+        e.g. ones loaded from an artifact, instead of building them again"""
+        key = self._rule_groups_key()
+        if [(group, list(patterns)) for group, patterns in engine.groups] != rule_groups(*key):
+            raise ValueError('rule engine was built for different rules')
+        keywords = keyword_categories(self.modal_indicators, self.empirical_indicators)
+        if [(category, list(words)) for category, words in matcher.categories] != [(c, list(w)) for c, w in keywords]:
+            raise ValueError('keyword matcher was built for different keywords')
+        self._rule_engine, self._rule_key = engine, key
+        self._keyword_matcher, self._keyword_key = matcher, keywords
+    
+    def rule_artifacts(self):
+        """The compiled rules as JSON-serializable data, for install_rules in another process"""
+        return {'engine': self.get_rule_engine().to_artifact(), 'keywords': self.get_keyword_matcher().to_artifact()}
+    
+    def use_rule_set(self, rule_set):
+        """Switch to the rules of a rule_packs.RuleSet. Like any rule change this is not safe
+        while another thread is analyzing with this analyzer; a running worker pool is
+        replaced on its next use, and work already queued on it finishes with the old rules."""
+        self.logical_patterns = {group: list(patterns) for group, patterns in rule_set.logical_patterns.items()}
+        self.modal_indicators = {category: list(words) for category, words in rule_set.modal_indicators.items()}
+        self.impossibility_exemptions = list(rule_set.exemptions)
+        self.empirical_indicators = list(rule_set.empirical)
+        # Rule counters are kept by position, which means nothing for the new rules
+        self.collect_worker_metrics()
+        if self.instrumentation is not None:
+            self.instrumentation.rule_counts = {}
+        self.install_rules(RuleEngine.from_artifact(rule_set.artifacts['engine']),
+                           KeywordMatcher.from_artifact(rule_set.artifacts['keywords']))
+        self.rule_set = rule_set
+    
+    def load_rule_packs(self, paths, cache_dir=None):
+        """Load, validate and compile rule pack files (or reuse their cached artifact) and use them"""
+        from rule_packs import load_rule_set
+        rule_set = load_rule_set(paths, cache_dir)
+        self.use_rule_set(rule_set)
+        return rule_set
+    
+    def reload_rule_packs(self):
+        """Load the current rule packs again; returns whether their content changed"""
+        if self.rule_set is None:
+            return False
+        from rule_packs import load_rule_set
+        rule_set = load_rule_set(self.rule_set.paths, self.rule_set.cache_dir)
+        if rule_set.hash == self.rule_set.hash:
+            return False
+        self.use_rule_set(rule_set)
+        return True
+    
+    def rule_stats(self):
+        """Per-rule evaluated/matched/skipped counters since the rules were last compiled"""
+        return self.get_rule_engine().stats()
+    
+    def enable_instrumentation(self):
+        """Start collecting stage timers, sentence lengths and keyword hits; returns the Instrumentation.
+        
+        A worker pool started after this reports its workers' counters too.
+        """
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation()
+        return self.instrumentation
+    
+    def disable_instrumentation(self):
+        self.instrumentation = None
+    
+    def metrics(self):
+        """Stage timers, sentence length histogram, keyword and per-rule counters and cache stats
+        of this analyzer and its pool workers, as a dict; see instrumentation.to_prometheus"""
+        self.collect_worker_metrics()
+        snapshot = Instrumentation()
+        if self.instrumentation is not None:
+            snapshot.merge(self.instrumentation.to_dict())
+        snapshot.add_rules(self.rule_stats())
+        metrics = snapshot.to_dict()
+        metrics['cache'] = self.cache_stats()
+        return metrics
+    
+    def drain_metrics(self):
+        """metrics() of this analyzer alone, resetting its counters"""
+        metrics = self.instrumentation.drain() if self.instrumentation is not None else Instrumentation().to_dict()
+        engine = self.get_rule_engine()
+        metrics['rules'] = engine.stats()
+        engine.reset_stats()
+        return metrics
+    
+    def collect_worker_metrics(self):
+        # Workers queue their counters after every task; fold in whatever has arrived
+        if self._metrics_queue is None or self.instrumentation is None:
+            return
+        import queue
+        while True:
+            try:
+                self.instrumentation.merge(self._metrics_queue.get_nowait())
+            except queue.Empty:
+                return
+    
+    def profile(self, path):
+        """Context manager running its body under cProfile and dumping the stats to path"""
+        return profiled(path)
+    
+    def match_rules(self, sentence_lower):
+        """Scan a lowercased sentence once and return the first matching rule of each rule group"""
+        return self.get_rule_engine().scan(sentence_lower)
+    
+    def split_into_sentences(self, text):
+        instrumentation = self.instrumentation
+        started = perf_counter() if instrumentation is not None else None
+        sentences = split_sentences(text)
+        
+        if self.max_sentence_length:
+            sentences = [chunk for s in sentences for chunk in self.chunk_sentence(s)]
+        if instrumentation is not None:
+            instrumentation.add_time('split', started)
+        return sentences
+    
+    def split_spans(self, text):
+        """(start, end) offsets of the sentences split_into_sentences returns, so text[start:end] is each sentence"""
+        return list(self.iter_spans(text))
+    
+    def iter_spans(self, text):
+        """Lazy split_spans"""
+        if not self.max_sentence_length:
+            spans = iter_sentence_spans(text)
+        else:
+            spans = (chunk for start, end in iter_sentence_spans(text) for chunk in self.chunk_span(text, start, end))
+        if self.instrumentation is not None:
+            return self.instrumentation.timed('split', spans)
+        return spans
+    
+    def chunk_span(self, text, start, end):
+        """The (start, end) pieces split_spans makes of the sentence text[start:end]"""
+        # Break a sentence at whitespace near the length limit as chunk_sentence does
+        limit = self.max_sentence_length
+        if not limit:
+            yield start, end
+            return
+        while end - start > limit:
+            cut = text.rfind(' ', start, start + limit + 1)
+            if cut <= start:
+                cut = start + limit
+            piece_end = cut
+            while text[piece_end - 1].isspace():
+                piece_end -= 1
+            yield start, piece_end
+            start = cut
+            while text[start].isspace():
+                start += 1
+        yield start, end
+    
+    def chunk_sentence(self, sentence):
+        # Break run-on input (logs, tables, pasted data) at whitespace near the length limit
+        limit = self.max_sentence_length
+        while len(sentence) > limit:
+            cut = sentence.rfind(' ', 0, limit + 1)
+            if cut <= 0:
+                cut = limit
+            yield sentence[:cut].strip()
+            sentence = sentence[cut:].strip()
+        if sentence:
+            yield sentence
+    
+    def split_stream(self, chunks):
+        """Incremental split_into_sentences over an iterable of text chunks"""
+        if self.instrumentation is not None:
+            # The split stage also covers reading the chunks
+            return self.instrumentation.timed('split', self._split_stream(chunks))
+        return self._split_stream(chunks)
+    
+    def _split_stream(self, chunks):
+        # buffer[:start] has been emitted; up to BOUNDARY_CONTEXT characters of it are kept
+        # so the boundary pattern's abbreviation lookbehinds see what they would in the whole text
+        buffer = ''
+        start = 0
+        resume = 0
+        limit = self.max_sentence_length
+        
+        for chunk in chunks:
+            buffer += chunk
+            for match in SENTENCE_BOUNDARY.finditer(buffer, resume):
+                # A boundary touching the end of the buffer may still grow or be stripped
+                if match.end() == len(buffer):
+                    break
+                yield from self._finish_sentence(buffer[start:match.start()])
+                start = match.end()
+            
+            # Only the trailing run of punctuation and whitespace can start a boundary
+            resume = len(buffer)
+            while resume > start and (buffer[resume - 1] in '.!?' or buffer[resume - 1].isspace()):
+                resume -= 1
+            
+            # Without punctuation a sentence never ends, so emit its settled chunks early
+            if limit and resume - start > limit:
+                while buffer[start].isspace():
+                    start += 1
+                while resume - start > limit:
+                    cut = buffer.rfind(' ', start, start + limit + 1)
+                    if cut <= start:
+                        cut = start + limit
+                    yield buffer[start:cut].strip()
+                    start = cut
+                    while buffer[start].isspace():
+                        start += 1
+            
+            keep = max(0, start - BOUNDARY_CONTEXT)
+            buffer = buffer[keep:]
+            start -= keep
+            resume -= keep
+        
+        yield from self._finish_sentence(buffer[start:])
+    
+    def _finish_sentence(self, sentence):
+        sentence = sentence.strip()
+        if not sentence:
+            return
+        if self.max_sentence_length:
+            yield from self.chunk_sentence(sentence)
+        else:
+            yield sentence
+    
+    def get_config(self):
+        # Everything a fresh analyzer needs to reproduce this one's results
+        return {
+            'options': {
+                'max_sentence_length': self.max_sentence_length,
+                'cache_size': self.score_cache.max_entries if self.score_cache else None,
+                'cache_bytes': self.score_cache.max_bytes if self.score_cache else None,
+                'store_path': self.score_store.path if self.score_store else None
+            },
+            'logical_patterns': {group: list(patterns) for group, patterns in self.logical_patterns.items()},
+            'modal_indicators': {category: list(words) for category, words in self.modal_indicators.items()},
+            'impossibility_exemptions': list(self.impossibility_exemptions),
+            'empirical_indicators': list(self.empirical_indicators)
+        }
+    
+    def get_pool(self, workers):
+        # The pool outlives a single batch; it is only rebuilt when the size or rules change
+        config = self.get_config()
+        instrumented = self.instrumentation is not None
+        key = (workers, repr(config), instrumented)
+        if key != self._pool_key:
+            import multiprocessing
+            if self._pool is not None:
+                # Work already queued finishes on the old workers; close() waits for them
+                self._pool.close()
+                self._retired_pools.append(self._pool)
+            # Instrumented workers send their counters back on this queue
+            if not instrumented:
+                self._metrics_queue = None
+            elif self._metrics_queue is None:
+                self._metrics_queue = multiprocessing.Queue()
+            # Workers get the rules compiled here rather than each compiling them again
+            self._pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                              initargs=(config, self._metrics_queue, self.rule_artifacts()))
+            self._pool_key = key
+        return self._pool
+    
+    def close(self):
+        """Shut down the analyze_many worker pool and flush the score store"""
+        if self._pool is not None:
+            self._retired_pools.append(self._pool)
+            self._pool.close()
+            self._pool = None
+            self._pool_key = None
+        if self._retired_pools:
+            # Let workers exit normally so they flush their pending store writes
+            for pool in self._retired_pools:
+                pool.join()
+            self._retired_pools = []
+            self.collect_worker_metrics()
+            self._metrics_queue = None
+        if self.score_store is not None:
+            self.score_store.close()
+    
+    def analyze_many(self, texts, workers=None, chunksize=None, ordered=True, serial_threshold=32):
+        """Analyze an iterable of documents on a process pool.
+        
+        Results are yielded in input order. With ordered=False they are yielded as
+        (index, result) pairs as soon as each chunk finishes. Batches of at most
+        serial_threshold documents are analyzed in this process, where starting
+        the pool would cost more than it saves.
+        """
+        workers = workers or os.cpu_count() or 1
+        texts = iter(texts)
+        head = list(islice(texts, serial_threshold + 1))
+        
+        if workers == 1 or len(head) <= serial_threshold:
+            for index, text in enumerate(chain(head, texts)):
+                result = self.analyze(text)
+                yield result if ordered else (index, result)
+            return
+        
+        # Documents are short, so hand them out in chunks large enough to amortize IPC
+        chunksize = chunksize or 64
+        pool = self.get_pool(workers)
+        if ordered:
+            yield from pool.imap(_analyze_in_worker, chain(head, texts), chunksize)
+        else:
+            yield from pool.imap_unordered(_analyze_indexed_in_worker, enumerate(chain(head, texts)), chunksize)
+    
+    def submit(self, texts, workers=None, chunksize=None, callback=None, error_callback=None):
+        """Queue a list of documents on the worker pool and return an AsyncResult of their results.
+        
+        Unlike analyze_many this never analyzes in the calling process, so a server
+        thread waiting on the result does not hold the GIL. callback/error_callback
+        are called from the pool's result thread, as with Pool.map_async.
+        """
+        workers = workers or os.cpu_count() or 1
+        return self.get_pool(workers).map_async(_analyze_in_worker, texts, chunksize,
+                                                callback=callback, error_callback=error_callback)
+    
+    def imap_sentences(self, sentences, workers=None, batch_size=8, timeout=None):
+        """Score an iterable of sentences on the worker pool.
+        
+        Yields analyze_sentence results in input order, each as soon as its batch
+        of batch_size sentences finishes, so a caller can report the first
+        sentences of a long document while the rest are running. Raises
+        multiprocessing.TimeoutError when a batch takes longer than timeout seconds.
+        
+        The work is queued on the pool before this returns, not when the first
+        result is requested, so a lock held around the call also covers get_pool.
+        """
+        workers = workers or os.cpu_count() or 1
+        sentences = iter(sentences)
+        batches = iter(lambda: list(islice(sentences, batch_size)), [])
+        pending = self.get_pool(workers).imap(_analyze_sentences_in_worker, batches)
+        return _imap_results(pending, timeout)
+    
+    def analyze(self, text):
+        # 'spans' holds the [start, end] offset of each sentence in text
+        spans = self.split_spans(text)
+        sentences = [text[start:end] for start, end in spans]
+        
+        if len(sentences) == 1:
+            # Single sentence analysis
+            scores = self.calculate_modality_scores(text)
+            classification = self.classify_modality(scores)
+            explanation = f"Single sentence analysis. Classification: {classification}"
+            
+            return {
+                'text': text,
+                'sentences': [text],
+                'spans': [[0, len(text)]],
+                'sentenceResults': [{
+                    'sentence': text,
+                    'scores': scores,
+                    'classification': classification,
+                    'explanation': explanation
+                }],
+                'scores': scores,
+                'classification': classification,
+                'explanation': explanation,
+                'isParagraph': False
+            }
+        else:
+            # Multi-sentence analysis
+            sentence_results = [self.analyze_sentence(sentence) for sentence in sentences]
+            
+            # Calculate paragraph scores; the explanation reuses the distribution counted on the way
+            accumulator = ParagraphAccumulator(self)
+            for result in sentence_results:
+                accumulator.add(result['sentence'], result['scores'])
+            paragraph_scores = accumulator.paragraph_scores()
+            paragraph_classification = self.classify_modality(paragraph_scores)
+            paragraph_explanation = self.explain_distribution(accumulator.distribution, accumulator.count,
+                                                              paragraph_scores, paragraph_classification)
+            
+            return {
+                'text': text,
+                'sentences': sentences,
+                'spans': [[start, end] for start, end in spans],
+                'sentenceResults': sentence_results,
+                'scores': paragraph_scores,
+                'classification': paragraph_classification,
+                'explanation': paragraph_explanation,
+                'isParagraph': True
+            }
+    
+    def analyze_compact(self, text):
+        """Analyze text into a CompactResult: sentence offsets and typed score columns
+        instead of nested dicts. Its to_dict() has the shape analyze() returns."""
+        spans = self.iter_spans(text)
+        head = list(islice(spans, 2))
+        if len(head) == 1:
+            # Like analyze(), a single sentence is scored as the whole text
+            head = [(0, len(text))]
+        spans = chain(head, spans)
+        
+        result = CompactResult(text, self)
+        try:
+            import numpy
+        except ImportError:
+            # Scalar path: classify and accumulate each sentence as it is scored
+            accumulator = ParagraphAccumulator(self)
+            for start, end, scores in self.score_spans(text, spans):
+                result.append(start, end, scores, self.classify_modality(scores))
+                accumulator.add_length(end - start, scores)
+            scores = accumulator.paragraph_scores()
+            result.finish(scores, self.classify_modality(scores), accumulator.distribution)
+            return result
+        
+        for start, end, scores in self.score_spans(text, spans):
+            result.append(start, end, scores)
+        
+        # The score columns and offsets are viewed in place, not copied into Python objects
+        columns = [numpy.frombuffer(column, dtype=numpy.float64) for column in result.score_columns]
+        lengths = numpy.frombuffer(result.ends, dtype=result.ends.typecode) - numpy.frombuffer(result.starts, dtype=result.starts.typecode)
+        aggregate = self.aggregate_scores(numpy.column_stack(columns), lengths)
+        result.set_classification_ids(aggregate['classificationIds'])
+        # A lone sentence's scores are the paragraph's, with the types analyze() gives them
+        scores = result[0].scores if len(result) == 1 else aggregate['scores']
+        result.finish(scores, aggregate['classification'], aggregate['distribution'])
+        return result
+    
+    def analyze_sentence(self, sentence):
+        scores = self.calculate_modality_scores(sentence)
+        classification = self.classify_modality(scores)
+        return {
+            'sentence': sentence,
+            'scores': scores,
+            'classification': classification,
+            'explanation': f"Sentence classification: {classification}"
+        }
+    
+    def analyze_stream(self, source, chunk_size=1 << 16):
+        """Analyze a file object or an iterable of text chunks in constant memory.
+        
+        Iterating the returned AnalysisStream yields each sentence result as soon
+        as the sentence is complete; its result() then gives the same scores,
+        classification and explanation that analyze() would for the whole text.
+        """
+        return AnalysisStream(self, source, chunk_size)
+    
+    def calculate_modality_scores(self, sentence):
+        return self.score_lowercase(sentence.lower())
+    
+    def score_spans(self, text, spans):
+        """Yield (start, end, scores) for each (start, end) sentence span of text.
+        
+        The text is lowercased once and each sentence is scored from a slice of
+        that, instead of slicing the sentence and then lowercasing the copy.
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few characters lowercase to two ('İ'), which would shift every later offset
+            lowered = None
+        for start, end in spans:
+            sentence_lower = lowered[start:end] if lowered is not None else text[start:end].lower()
+            yield start, end, self.score_lowercase(sentence_lower)
+    
+    def score_lowercase(self, sentence_lower):
+        """calculate_modality_scores of an already lowercased sentence"""
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.add_sentence(len(sentence_lower))
+        
+        if self.score_cache is not None or self.score_store is not None:
+            self.validate_cache()
+        
+        if self.score_cache is not None:
+            cached = self.score_cache.get(sentence_lower)
+            if cached is not None:
+                return dict(cached)
+        
+        if self.score_store is not None:
+            stored = self.score_store.get(self._fingerprint, sentence_lower)
+            if stored is not None:
+                if self.score_cache is not None:
+                    self.score_cache.put(sentence_lower, dict(stored))
+                return stored
+        
+        scores = {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+        
+        started = perf_counter() if instrumentation is not None else None
+        
+        # Check for logical necessity
+        hits = self.match_rules(sentence_lower)
+        logical_necessity = self.necessity_score(hits)
+        logical_impossibility = self.impossibility_score(hits)
+        if instrumentation is not None:
+            instrumentation.add_time('rules', started)
+        
+        if logical_necessity > 0:
+            scores['necessity'] = logical_necessity
+            scores['possibility'] = min(20, logical_necessity * 0.2)
+            scores['impossibility'] = 0
+        elif logical_impossibility > 0:
+            scores['impossibility'] = logical_impossibility
+            scores['necessity'] = 0
+            scores['possibility'] = 0
+        else:
+            # Analyze contingent statement
+            started = perf_counter() if instrumentation is not None else None
+            indicators = self.analyze_contingent_statement(scores, sentence_lower)
+            if instrumentation is not None:
+                instrumentation.add_time('contingent', started)
+                instrumentation.add_keywords(indicators)
+        
+        # Ensure scores are in valid range
+        for key in scores:
+            scores[key] = max(0, min(100, scores[key]))
+        
+        if self.score_cache is not None:
+            self.score_cache.put(sentence_lower, dict(scores))
+        if self.score_store is not None:
+            self.score_store.put(self._fingerprint, sentence_lower, scores)
+            
+        return scores
+    
+    def validate_cache(self):
+        # Cached scores are only valid for the rules they were computed with
+        stamp = (self.get_rule_engine(), self.get_keyword_matcher())
+        if stamp != self._cache_stamp:
+            if self.score_cache is not None:
+                self.score_cache.clear()
+            self._fingerprint = self.rules_fingerprint()
+            self._cache_stamp = stamp
+    
+    def rules_fingerprint(self):
+        """Hash of everything that determines a sentence's scores, used to key the score store"""
+        rules = {
+            'version': SCORING_VERSION,
+            'arithmetic': ARITHMETIC_PATTERN,
+            'logical_patterns': self.logical_patterns,
+            'exemptions': self.impossibility_exemptions,
+            'modal_indicators': self.modal_indicators,
+            'empirical': self.empirical_indicators
+        }
+        return hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    
+    def cache_stats(self):
+        """Hit/miss/eviction/byte counters of the score cache, or None when caching is off"""
+        return self.score_cache.stats() if self.score_cache is not None else None
+    
+    def detect_logical_necessity(self, sentence):
+        return self.necessity_score(self.match_rules(sentence.lower()))
+    
+    def detect_logical_impossibility(self, sentence):
+        return self.impossibility_score(self.match_rules(sentence.lower()))
+    
+    def necessity_score(self, hits):
+        # Mathematical equations
+        if 'arithmetic' in hits:
+            return 95
+            
+        # Logical necessity patterns
+        if 'necessity' in hits:
+            return 90
+                
+        return 0
+    
+    def impossibility_score(self, hits):
+        # Don't flag statements ABOUT impossibility as impossible themselves
+        if 'exemption' in hits:
+            return 0
+            
+        # Actual logical contradictions
+        if 'impossibility' in hits:
+            return 95
+                
+        return 0
+    
+    def analyze_contingent_statement(self, scores, sentence):
+        # Find every modal indicator (whole words only) in a single pass
+        indicators = self.get_keyword_matcher().find(sentence)
+        
+        if 'epistemic' in indicators:
+            scores['possibility'] = 60
+        
+        if 'deontic' in indicators:
+            scores['possibility'] = 50
+            
+        if 'possibility' in indicators:
+            scores['possibility'] = 70
+            
+        # Empirical claims are contingent
+        if 'empirical' in indicators:
+            scores['possibility'] = 60
+            scores['necessity'] = 0
+        
+        return indicators
+    
+    def calculate_paragraph_scores(self, sentence_results):
+        if not sentence_results:
+            return {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+            
+        if len(sentence_results) == 1:
+            return sentence_results[0]['scores']
+        
+        # Weighted scoring
+        accumulator = ParagraphAccumulator(self)
+        for result in sentence_results:
+            accumulator.add(result['sentence'], result['scores'])
+        
+        return accumulator.paragraph_scores()
+    
+    def aggregate_scores(self, score_matrix, lengths):
+        """Vectorized calculate_paragraph_scores, classification and distribution (needs NumPy).
+        
+        score_matrix is (N x 3) in necessity, possibility, impossibility order and
+        lengths holds the N sentence lengths. Returns the paragraph 'scores',
+        'classification', 'explanation' and 'distribution', with the same values
+        as the scalar path, plus per-sentence 'dominant' and 'classificationIds'
+        arrays; see vector_aggregate.aggregate.
+        """
+        from vector_aggregate import aggregate
+        instrumentation = self.instrumentation
+        started = perf_counter() if instrumentation is not None else None
+        result = aggregate(self, score_matrix, lengths)
+        if instrumentation is not None:
+            instrumentation.add_time('aggregation', started)
+        return result
+    
+    def get_dominant_modality(self, scores):
+        max_score = max(scores['necessity'], scores['possibility'], scores['impossibility'])
+        if max_score < 25:
+            return 'neutral'
+        
+        if scores['necessity'] == max_score:
+            return 'necessity'
+        elif scores['impossibility'] == max_score:
+            return 'impossibility'
+        elif scores['possibility'] == max_score:
+            return 'possibility'
+        return 'neutral'
+    
+    def apply_distribution_adjustments(self, scores, distribution, total_sentences):
+        total_modal = distribution['necessity'] + distribution['possibility'] + distribution['impossibility']
+        modal_ratio = total_modal / total_sentences
+        
+        # If most sentences are neutral, reduce scores
+        if modal_ratio < 0.3:
+            for score_type in scores:
+                scores[score_type] *= 0.7
+        
+        # If strong consensus, boost that score
+        for modality_type in ['necessity', 'possibility', 'impossibility']:
+            if distribution[modality_type] / total_sentences > 0.6:
+                scores[modality_type] = min(100, scores[modality_type] * 1.3)
+        
+        # Special case: if necessity dominates
+        if distribution['necessity'] > distribution['impossibility'] and distribution['necessity'] > distribution['possibility']:
+            scores['necessity'] = min(100, scores['necessity'] * 1.1)
+            scores['impossibility'] = max(0, scores['impossibility'] * 0.8)
+    
+    def classify_modality(self, scores):
+        threshold = 25
+        max_score = max(scores['necessity'], scores['possibility'], scores['impossibility'])
+        
+        if scores['necessity'] == max_score and scores['necessity'] > threshold:
+            if scores['necessity'] > 85:
+                return 'Logically Necessary'
+            elif scores['necessity'] > 70:
+                return 'Strongly Necessary'
+            elif scores['necessity'] > 50:
+                return 'Necessary'
+            return 'Weakly Necessary'
+        
+        if scores['impossibility'] == max_score and scores['impossibility'] > threshold:
+            if scores['impossibility'] > 85:
+                return 'Logically Impossible'
+            elif scores['impossibility'] > 70:
+                return 'Strongly Impossible'
+            elif scores['impossibility'] > 50:
+                return 'Impossible'
+            return 'Weakly Impossible'
+        
+        if scores['possibility'] == max_score and scores['possibility'] > threshold:
+            if scores['possibility'] > 85:
+                return 'Highly Possible'
+            elif scores['possibility'] > 70:
+                return 'Very Possible'
+            elif scores['possibility'] > 50:
+                return 'Possible'
+            return 'Weakly Possible'
+        
+        return 'Neutral/Contingent'
+    
+    def generate_paragraph_explanation(self, sentence_results, paragraph_scores, classification):
+        distribution = {'necessity': 0, 'possibility': 0, 'impossibility': 0, 'neutral': 0}
+        
+        for result in sentence_results:
+            dominant_type = self.get_dominant_modality(result['scores'])
+            distribution[dominant_type] += 1
+        
+        return self.explain_distribution(distribution, len(sentence_results), paragraph_scores, classification)
+    
+    def explain_distribution(self, distribution, total_sentences, paragraph_scores, classification):
+        instrumentation = self.instrumentation
+        started = perf_counter() if instrumentation is not None else None
+        explanation = f"Analyzed {total_sentences} sentence{'s' if total_sentences > 1 else ''}. "
+        
+        # Distribution breakdown
+        breakdown = []
+        for modality_type in distribution:
+            if distribution[modality_type] > 0:
+                percentage = round((distribution[modality_type] / total_sentences) * 100)
+                breakdown.append(f"{distribution[modality_type]} {modality_type} ({percentage}%)")
+        
+        if breakdown:
+            explanation += f"Distribution: {', '.join(breakdown)}. "
+        
+        # Overall assessment
+        dominant_type = max(paragraph_scores.keys(), key=lambda k: paragraph_scores[k])
+        explanation += f'Overall classification: "{classification}" based on weighted analysis with {dominant_type} as the dominant modality ({round(paragraph_scores[dominant_type])}%).'
+        
+        if instrumentation is not None:
+            instrumentation.add_time('explanation', started)
+        return explanation
+
+
+class ParagraphAccumulator:
+    """Running weighted sums and modality distribution for paragraph scoring.
+    
+    The float sums are added in sentence order, as calculate_paragraph_scores
+    adds them, so an accumulator filled by add() gives analyze()'s scores to the
+    last bit. Exact sums (sentence weights in whole 1/50 units, products as int
+    or Fraction) are kept alongside for merging: once the accumulators of
+    separately analyzed parts are merged, the scores come from the exact sums,
+    which are the same for any grouping of the parts but can differ from the
+    sequential float sums in the last ulp. Distribution adjustments and
+    classification are only applied when the scores are read.
+    """
+    
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.count = 0
+        self.first_scores = None
+        self.total_weight = 0
+        self.weighted_scores = {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+        self.exact_weight = 0
+        self.exact_scores = {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+        # Whether total_weight and weighted_scores were summed in sentence order
+        self.sequential = True
+        self.distribution = {'necessity': 0, 'possibility': 0, 'impossibility': 0, 'neutral': 0}
+    
+    def add(self, sentence, scores):
+        self.add_length(len(sentence), scores)
+    
+    def add_length(self, length, scores):
+        """Add a sentence of the given length with its scores"""
+        instrumentation = self.analyzer.instrumentation
+        started = perf_counter() if instrumentation is not None else None
+        if self.count == 0:
+            self.first_scores = scores
+        self.count += 1
+        
+        # Calculate weight
+        sentence_weight = min(length / 50, 2)
+        self.total_weight += sentence_weight
+        # The same weight in units of 1/50
+        sentence_units = min(length, MAX_WEIGHT_UNITS)
+        self.exact_weight += sentence_units
+        
+        # Add weighted scores
+        for score_type in scores:
+            self.weighted_scores[score_type] += scores[score_type] * sentence_weight
+            self.exact_scores[score_type] += exact_number(scores[score_type]) * sentence_units
+        
+        # Track distribution
+        dominant_type = self.analyzer.get_dominant_modality(scores)
+        self.distribution[dominant_type] += 1
+        if instrumentation is not None:
+            instrumentation.add_time('aggregation', started)
+    
+    def merge(self, other):
+        """Append the sentences accumulated by other, which follow this accumulator's in the document"""
+        if other.count == 0:
+            return self
+        instrumentation = self.analyzer.instrumentation
+        started = perf_counter() if instrumentation is not None else None
+        if self.count == 0:
+            # Nothing to add to: other's float sums still cover every sentence in order
+            self.first_scores = other.first_scores
+            self.total_weight = other.total_weight
+            self.weighted_scores = dict(other.weighted_scores)
+            self.sequential = other.sequential
+        else:
+            self.sequential = False
+        self.count += other.count
+        self.exact_weight += other.exact_weight
+        for score_type, total in other.exact_scores.items():
+            self.exact_scores[score_type] += total
+        for modality_type, count in other.distribution.items():
+            self.distribution[modality_type] += count
+        if instrumentation is not None:
+            instrumentation.add_time('aggregation', started)
+        return self
+    
+    def copy(self):
+        merged = ParagraphAccumulator(self.analyzer)
+        return merged.merge(self)
+    
+    def set_sequential_sums(self, total_weight, weighted_scores):
+        """Use float sums added in sentence order over the same sentences, as add() sums them"""
+        self.total_weight = total_weight
+        self.weighted_scores = dict(weighted_scores)
+        self.sequential = True
+        return self
+    
+    def paragraph_scores(self):
+        """Same result as calculate_paragraph_scores over every sentence added so far"""
+        if self.count == 0:
+            return {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+        
+        if self.count == 1:
+            return self.first_scores
+        
+        instrumentation = self.analyzer.instrumentation
+        started = perf_counter() if instrumentation is not None else None
+        
+        # Calculate final averages
+        if self.sequential:
+            scores = {score_type: total / self.total_weight for score_type, total in self.weighted_scores.items()}
+        else:
+            # One correctly rounded division per score
+            scores = {score_type: float(total / self.exact_weight) for score_type, total in self.exact_scores.items()}
+        
+        # Apply distribution adjustments
+        self.analyzer.apply_distribution_adjustments(scores, dict(self.distribution), self.count)
+        
+        if instrumentation is not None:
+            instrumentation.add_time('aggregation', started)
+        return scores
+    
+    def to_state(self):
+        """JSON-serializable partial state; see from_state"""
+        return {
+            'version': STATE_VERSION,
+            'rules': self.analyzer.rules_fingerprint(),
+            'maxSentenceLength': self.analyzer.max_sentence_length,
+            'count': self.count,
+            'firstScores': self.first_scores,
+            'totalWeight': self.exact_weight,
+            # Exact sums as [numerator, denominator]
+            'weightedScores': {score_type: [Fraction(total).numerator, Fraction(total).denominator]
+                               for score_type, total in self.exact_scores.items()},
+            # Float sums in sentence order (JSON floats round-trip exactly), or None after a merge
+            'sequentialSums': {'totalWeight': self.total_weight, 'weightedScores': dict(self.weighted_scores)}
+                              if self.sequential else None,
+            'distribution': dict(self.distribution)
+        }
+    
+    @classmethod
+    def from_state(cls, analyzer, state):
+        """Rebuild an accumulator from to_state() output, which must come from the same rules and options"""
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"unsupported partial state version {state.get('version')!r}")
+        if state['rules'] != analyzer.rules_fingerprint() or state['maxSentenceLength'] != analyzer.max_sentence_length:
+            raise ValueError('partial state was computed with different rules or options')
+        accumulator = cls(analyzer)
+        accumulator.count = state['count']
+        accumulator.first_scores = state['firstScores']
+        accumulator.exact_weight = state['totalWeight']
+        for score_type, (numerator, denominator) in state['weightedScores'].items():
+            accumulator.exact_scores[score_type] = exact_number(Fraction(numerator, denominator))
+        sums = state['sequentialSums']
+        if sums is None:
+            accumulator.sequential = False
+        else:
+            accumulator.set_sequential_sums(sums['totalWeight'], sums['weightedScores'])
+        accumulator.distribution.update(state['distribution'])
+        return accumulator
+    
+    def result(self):
+        """Top-level scores, classification and explanation, as analyze() reports them"""
+        scores = self.paragraph_scores()
+        classification = self.analyzer.classify_modality(scores)
+        
+        if self.count == 1:
+            explanation = f"Single sentence analysis. Classification: {classification}"
+        else:
+            explanation = self.analyzer.explain_distribution(self.distribution, self.count, scores, classification)
+        
+        return {
+            'scores': scores,
+            'classification': classification,
+            'explanation': explanation,
+            'isParagraph': self.count != 1,
+            'sentenceCount': self.count
+        }
+
+
+class AnalysisStream:
+    """Per-sentence results of a streamed document; see ModalityAnalyzer.analyze_stream"""
+    
+    def __init__(self, analyzer, source, chunk_size=1 << 16):
+        self.analyzer = analyzer
+        self.source = source
+        self.chunk_size = chunk_size
+        self.accumulator = ParagraphAccumulator(analyzer)
+        self._results = self._analyze()
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return next(self._results)
+    
+    def result(self):
+        """Finish reading the source if needed and return the paragraph-level result"""
+        for _ in self:
+            pass
+        return self.accumulator.result()
+    
+    def _chunks(self):
+        if isinstance(self.source, (str, bytes)):
+            chunks = [self.source]
+        elif hasattr(self.source, 'read'):
+            end = self.source.read(0)  # '' or b'' depending on the file mode
+            chunks = iter(lambda: self.source.read(self.chunk_size), end)
+        else:
+            chunks = self.source
+        
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in chunks:
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        yield decoder.decode(b'', final=True)
+    
+    def _analyze(self):
+        # The first result is held back: a one-sentence document is explained differently
+        first = None
+        for sentence in self.analyzer.split_stream(self._chunks()):
+            result = self.analyzer.analyze_sentence(sentence)
+            self.accumulator.add(sentence, result['scores'])
+            if self.accumulator.count == 1:
+                first = result
+                continue
+            if first is not None:
+                yield first
+                first = None
+            yield result
+        
+        if first is not None:
+            first['explanation'] = f"Single sentence analysis. Classification: {first['classification']}"
+            yield first
+
+
+def _imap_results(pending, timeout):
+    # Flatten the batches of an imap_sentences call as each arrives
+    while True:
+        try:
+            batch = pending.next(timeout)
+        except StopIteration:
+            return
+        yield from batch
+
+
+_worker_analyzer = None
+_worker_metrics = None
+_worker_reported = 0
+
+
+def _init_worker(config, metrics_queue=None, artifacts=None):
+    # Build the analyzer and compile its rules once per worker process
+    global _worker_analyzer, _worker_metrics
+    _worker_analyzer = ModalityAnalyzer(**config['options'])
+    _worker_analyzer.logical_patterns = config['logical_patterns']
+    _worker_analyzer.modal_indicators = config['modal_indicators']
+    _worker_analyzer.impossibility_exemptions = config['impossibility_exemptions']
+    _worker_analyzer.empirical_indicators = config['empirical_indicators']
+    if artifacts is not None:
+        _worker_analyzer.install_rules(RuleEngine.from_artifact(artifacts['engine']),
+                                       KeywordMatcher.from_artifact(artifacts['keywords']))
+    _worker_analyzer.get_rule_engine()
+    _worker_analyzer.get_keyword_matcher()
+    if _worker_analyzer.score_store is not None:
+        import multiprocessing.util
+        multiprocessing.util.Finalize(None, _worker_analyzer.score_store.close, exitpriority=10)
+    if metrics_queue is not None:
+        _worker_analyzer.enable_instrumentation()
+        _worker_metrics = metrics_queue
+        import multiprocessing.util
+        # Ahead of the queue's own exit finalizer (priority 10), which stops it taking more items
+        multiprocessing.util.Finalize(None, _report_metrics, args=(True,), exitpriority=20)
+
+
+def _report_metrics(final=False):
+    # Sending counters costs about half a short document, so they are batched by time
+    global _worker_reported
+    if _worker_metrics is None:
+        return
+    now = perf_counter()
+    if final or now - _worker_reported >= METRICS_INTERVAL:
+        _worker_metrics.put(_worker_analyzer.drain_metrics())
+        _worker_reported = now
+
+
+def _analyze_in_worker(text):
+    result = _worker_analyzer.analyze(text)
+    _report_metrics()
+    return result
+
+
+def _analyze_sentences_in_worker(sentences):
+    results = [_worker_analyzer.analyze_sentence(sentence) for sentence in sentences]
+    _report_metrics()
+    return results
+
+
+def _analyze_indexed_in_worker(item):
+    index, text = item
+    result = _worker_analyzer.analyze(text)
+    _report_metrics()
+    return index, result
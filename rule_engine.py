@@ -0,0 +1,446 @@
+"""
+Compiled rule engine for the modality analyzer.
+A literal prefilter decides which rules can match a sentence, so most sentences
+never reach a full regular expression evaluation.
+"""
+
+import re
+from collections import namedtuple
+from time import perf_counter
+
+Rule = namedtuple('Rule', ['group', 'index', 'pattern'])
+
+REGEX_METACHARACTERS = set('.^$*+?{}[]\\|()\n')
+
+# Bump when the to_artifact() layout or the literal analysis changes
+ARTIFACT_VERSION = 2
+
+
+class RuleEngine:
+    def __init__(self, groups, _tables=None):
+        """Compile (group, patterns) pairs, listed in priority order, into a prefiltered matcher"""
+        self.groups = [(group, list(patterns)) for group, patterns in groups]
+        self.rules = []
+        self._rules_by_pattern = {}
+
+        for group, patterns in self.groups:
+            for index, pattern in enumerate(patterns):
+                rule = Rule(group, index, pattern)
+                self.rules.append(rule)
+                # Identical patterns are compiled once and shared by every rule that uses them
+                self._rules_by_pattern.setdefault(pattern, []).append(rule)
+
+        self._patterns = list(self._rules_by_pattern)
+        self._pattern_ids = {pattern: i for i, pattern in enumerate(self._patterns)}
+
+        if _tables is None:
+            _tables = self._analyze()
+        self._flags = _tables['flags']
+        self._segments = _tables['segments']
+        self._anchors = _tables['anchors']
+        self._plain = _tables['plain']
+
+        # Only patterns that are neither a plain literal nor a gapped literal chain need sre.
+        # Built engines compile them now, which also validates them; engines loaded from
+        # an artifact (validated when it was built) compile each on its first evaluation.
+        self._compiled = [None] * len(self._patterns)
+        if 'scanner' not in _tables:
+            for i in self._regex_ids():
+                self._compiled[i] = re.compile(self._patterns[i], self._flags)
+
+        self._patterns_by_anchor = {}
+        for i, anchor in enumerate(self._anchors):
+            self._patterns_by_anchor.setdefault(anchor, []).append(i)
+        self._unanchored = self._patterns_by_anchor.pop(None, [])
+
+        anchors = list(self._patterns_by_anchor)
+        self._scanner_pattern = _tables.get('scanner') or (_trie_pattern(anchors) if anchors else '(?!)')
+        self._anchor_scanner = re.compile(self._scanner_pattern, self._flags)
+        self._anchors_by_first_char = {}
+        for anchor in anchors:
+            self._anchors_by_first_char.setdefault(anchor[0], []).append(anchor)
+        # Case-insensitive matchers of each anchor, built on the first non-ASCII text
+        self._anchor_matchers = None
+
+        self._scans = 0
+        self._evaluated = [0] * len(self._patterns)
+        self._matched = [0] * len(self._patterns)
+
+    def _analyze(self):
+        # Text is expected in lowercase, which lets sre use its fast literal scans.
+        # Patterns that spell out uppercase (e.g. \D or [A-Z]) fall back to IGNORECASE.
+        flags = re.IGNORECASE if any(p != p.lower() for p in self._patterns) else 0
+
+        # Literal runs joined by .* backtrack polynomially in sre on long lines, so they
+        # are confirmed with a linear find() chain instead of the compiled pattern
+        segments = [gap_segments(pattern) for pattern in self._patterns]
+
+        # Prefilter index: every pattern is keyed by the longest literal it cannot match
+        # without. Patterns that are nothing but that literal need no further evaluation.
+        anchors = []
+        plain = []
+        for i, pattern in enumerate(self._patterns):
+            runs, is_plain = literal_runs(pattern)
+            if segments[i]:
+                runs = segments[i]
+            anchors.append(max(runs, key=len).lower() if runs else None)
+            plain.append(is_plain)
+        return {'flags': flags, 'segments': segments, 'anchors': anchors, 'plain': plain}
+
+    def _regex_ids(self):
+        return [i for i in range(len(self._patterns)) if not self._plain[i] and not self._segments[i]]
+
+    def to_artifact(self):
+        """The analyzed prefilter tables as JSON-serializable data; see from_artifact"""
+        return {
+            'version': ARTIFACT_VERSION,
+            'groups': [[group, patterns] for group, patterns in self.groups],
+            'flags': self._flags,
+            'segments': self._segments,
+            'anchors': self._anchors,
+            'plain': self._plain,
+            'scanner': self._scanner_pattern
+        }
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """An engine for to_artifact() output, without repeating the literal analysis.
+        Rule regexes are compiled when first evaluated."""
+        if artifact.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"unsupported rule artifact version {artifact.get('version')!r}")
+        return cls(artifact['groups'], _tables=artifact)
+
+    def candidates(self, text):
+        """Return the set of pattern ids whose anchor literal occurs in lowercased text"""
+        folded = text.lower() if self._flags else text
+        present = set()
+        match = self._anchor_scanner.search(folded)
+        # IGNORECASE also folds a few non-ASCII characters onto ASCII letters ('ſ' onto 's',
+        # the Kelvin sign onto 'k'), which neither lower() nor startswith() know about
+        folding = self._flags and not folded.isascii()
+        if folding and self._anchor_matchers is None:
+            self._anchor_matchers = {anchor: re.compile(re.escape(anchor), self._flags).match
+                                     for anchor in self._patterns_by_anchor}
+
+        while match:
+            start = match.start()
+            # Only the first alternative is reported per position, so check the others here
+            if folding:
+                for anchor, matcher in self._anchor_matchers.items():
+                    if anchor not in present and matcher(folded, start):
+                        present.add(anchor)
+            else:
+                for anchor in self._anchors_by_first_char[folded[start]]:
+                    if anchor not in present and folded.startswith(anchor, start):
+                        present.add(anchor)
+            if len(present) == len(self._patterns_by_anchor):
+                break
+            match = self._anchor_scanner.search(folded, start + 1)
+
+        ids = set(self._unanchored)
+        for anchor in present:
+            ids.update(self._patterns_by_anchor[anchor])
+        return ids
+
+    def scan(self, text):
+        """Scan lowercased text and return the first rule (in list order) that fired for each group"""
+        self._scans += 1
+        hits = {}
+        candidates = self.candidates(text)
+        if not candidates:
+            return hits
+
+        folded = text.lower() if self._flags else text
+        results = {}
+        for rule in self.rules:
+            i = self._pattern_ids[rule.pattern]
+            if rule.group in hits or i not in candidates:
+                continue
+            if i not in results:
+                results[i] = self._evaluate(i, text, folded)
+            if results[i]:
+                hits[rule.group] = rule
+
+        return hits
+
+    def _evaluate(self, i, text, folded):
+        self._evaluated[i] += 1
+        if self._plain[i]:
+            matched = True
+        elif self._segments[i] and not (self._flags and not folded.isascii()):
+            matched = find_gapped(folded, self._segments[i])
+        else:
+            compiled = self._compiled[i]
+            if compiled is None:
+                compiled = self._compiled[i] = re.compile(self._patterns[i], self._flags)
+            matched = compiled.search(text) is not None
+        if matched:
+            self._matched[i] += 1
+        return matched
+
+    def stats(self):
+        """Per-rule prefilter counters: how often each rule was evaluated, matched or skipped"""
+        stats = []
+        for rule in self.rules:
+            i = self._pattern_ids[rule.pattern]
+            stats.append({
+                'group': rule.group,
+                'index': rule.index,
+                'pattern': rule.pattern,
+                'anchor': self._anchors[i],
+                'evaluated': self._evaluated[i],
+                'matched': self._matched[i],
+                'skipped': self._scans - self._evaluated[i]
+            })
+        return stats
+
+    def measure_costs(self, texts, repeat=3):
+        """Time every rule over lowercased texts, outside the live counters.
+
+        Returns one dict per rule with how many texts passed its prefilter
+        ('candidates'), how many it matched, and the fastest of repeat runs of
+        its full evaluations ('seconds'), plus the prefilter scan time of all
+        rules together as ('scan', seconds).
+        """
+        texts = list(texts)
+        scan_seconds = None
+        for _ in range(repeat):
+            started = perf_counter()
+            candidates = [self.candidates(text) for text in texts]
+            elapsed = perf_counter() - started
+            scan_seconds = elapsed if scan_seconds is None else min(scan_seconds, elapsed)
+
+        costs = []
+        saved = (self._evaluated[:], self._matched[:])
+        for i, pattern in enumerate(self._patterns):
+            hits = [text for text, ids in zip(texts, candidates) if i in ids]
+            best = None
+            matched = 0
+            for _ in range(repeat):
+                started = perf_counter()
+                matched = sum(1 for text in hits if self._evaluate(i, text, text.lower() if self._flags else text))
+                elapsed = perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            costs.append({'candidates': len(hits), 'matched': matched, 'seconds': best})
+        self._evaluated, self._matched = saved
+
+        report = []
+        for rule in self.rules:
+            cost = costs[self._pattern_ids[rule.pattern]]
+            report.append({'group': rule.group, 'index': rule.index, 'pattern': rule.pattern,
+                           'anchor': self._anchors[self._pattern_ids[rule.pattern]], **cost})
+        return report, ('scan', scan_seconds)
+
+    def reset_stats(self):
+        """Zero the counters stats() reports"""
+        self._scans = 0
+        self._evaluated = [0] * len(self._patterns)
+        self._matched = [0] * len(self._patterns)
+
+
+def gap_segments(pattern):
+    """Split a pattern like 'a.*b.*c' into its lowercase literals, or None if it is not of that form"""
+    if '.*' not in pattern:
+        return None
+    segments = [segment for segment in pattern.split('.*') if segment]
+    if not segments or any(REGEX_METACHARACTERS.intersection(segment) for segment in segments):
+        return None
+    return [segment.lower() for segment in segments]
+
+
+def literal_runs(pattern):
+    """Return the literal strings every match of pattern must contain, and whether
+    the pattern is nothing but a single literal.
+
+    The parse is deliberately conservative: anything it does not understand ends
+    the current run, so the result can only ever under-approximate.
+    """
+    runs = []
+    run = ''
+    plain = True
+    i = 0
+
+    def close(run):
+        if run:
+            runs.append(run)
+        return ''
+
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if escaped.isalnum() or escaped == '_':
+                # Character classes (\d, \s, ...), anchors (\b), back-references and
+                # character codes (\x61, \012, \N{...}), whose argument is skipped too
+                run = close(run)
+                plain = False
+                i = _skip_escape_argument(pattern, escaped, i)
+            else:
+                run += escaped
+            continue
+        if char in '*?{':
+            # The previous character becomes optional
+            run = close(run[:-1])
+            plain = False
+            if char == '{':
+                i = max(pattern.find('}', i), i)
+        elif char == '+':
+            run = close(run)
+            plain = False
+        elif char == '|':
+            return [], False
+        elif char == '[':
+            i = _skip_class(pattern, i)
+            run = close(run)
+            plain = False
+        elif char == '(':
+            i = _skip_group(pattern, i)
+            run = close(run)
+            plain = False
+        elif char in REGEX_METACHARACTERS:
+            run = close(run)
+            plain = False
+        else:
+            run += char
+        i += 1
+
+    close(run)
+    return runs, plain and len(runs) == 1
+
+
+def _skip_escape_argument(pattern, escaped, i):
+    """Return the index after the argument of the escape \\<escaped>, which starts at i"""
+    if escaped == 'x':
+        return i + 2
+    if escaped == 'u':
+        return i + 4
+    if escaped == 'U':
+        return i + 8
+    if escaped == 'N' and pattern[i:i + 1] == '{':
+        return max(pattern.find('}', i) + 1, i)
+    if escaped.isdigit():
+        # Octal codes take up to three digits and group references two; skipping every
+        # following digit can only shorten a run
+        while i < len(pattern) and pattern[i].isdigit():
+            i += 1
+    return i
+
+
+def _skip_class(pattern, i):
+    """Return the index of the ']' closing the character class opened at i"""
+    i += 1
+    if pattern[i:i + 1] == '^':
+        i += 1
+    if pattern[i:i + 1] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 2 if pattern[i] == '\\' else 1
+    return i
+
+
+def _skip_group(pattern, i):
+    """Return the index of the ')' closing the group opened at i, followed by any quantifier"""
+    depth = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 1
+        elif char == '[':
+            i = _skip_class(pattern, i)
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                break
+        i += 1
+    # A quantified group is skipped together with its quantifier
+    while i + 1 < len(pattern) and pattern[i + 1] in '*+?':
+        i += 1
+    return i
+
+
+def find_gapped(text, segments, start=0):
+    """Check whether segments occur in order on one line, as the regex 'a.*b.*c' would.
+
+    Taking the leftmost occurrence of each literal is always optimal, so every
+    line is searched once and the cost is linear in the length of the text.
+    """
+    first = segments[0]
+    pos = text.find(first, start)
+    while pos != -1:
+        line_end = text.find('\n', pos)
+        if line_end == -1:
+            line_end = len(text)
+        end = pos + len(first)
+        for segment in segments[1:]:
+            end = text.find(segment, end, line_end)
+            if end == -1:
+                break
+            end += len(segment)
+        else:
+            return True
+        pos = text.find(first, line_end)
+    return False
+
+
+class KeywordMatcher:
+    def __init__(self, categories, _pattern=None):
+        """Build a word-boundary matcher over (category, keywords) pairs"""
+        self.categories = [(category, list(keywords)) for category, keywords in categories]
+        self._categories_by_keyword = {}
+
+        for category, keywords in self.categories:
+            for keyword in keywords:
+                owners = self._categories_by_keyword.setdefault(keyword.lower(), [])
+                if category not in owners:
+                    owners.append(category)
+
+        # Keywords sharing a prefix are merged into a trie so sre tries each prefix once
+        if _pattern is None:
+            _pattern = rf'\b{_trie_pattern(self._categories_by_keyword)}\b' if self._categories_by_keyword else '(?!)'
+        self._pattern = _pattern
+        self._regex = re.compile(_pattern)
+
+    def to_artifact(self):
+        """The keyword lists and their trie pattern as JSON-serializable data"""
+        return {'version': ARTIFACT_VERSION, 'categories': [[c, k] for c, k in self.categories], 'pattern': self._pattern}
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        if artifact.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"unsupported rule artifact version {artifact.get('version')!r}")
+        return cls(artifact['categories'], _pattern=artifact['pattern'])
+
+    def find(self, text):
+        """Return {category: [keywords]} for every whole-word keyword in lowercased text"""
+        found = {}
+        for keyword in self._regex.findall(text):
+            for category in self._categories_by_keyword[keyword]:
+                keywords = found.get(category)
+                if keywords is None:
+                    found[category] = [keyword]
+                elif keyword not in keywords:
+                    keywords.append(keyword)
+        return found
+
+
+def _trie_pattern(words):
+    """Build a regex alternation for words with common prefixes factored out"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A word ending here makes the rest optional; the longer branch is still tried first
+        return f'(?:{body})?' if '' in node else body
+
+    return emit(trie)
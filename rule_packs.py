@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Rule packs for the modality analyzer.
+A rule pack is a JSON file of necessity/impossibility patterns, impossibility
+exemptions and modal keywords. Packs are combined in order into a RuleSet,
+validated, and compiled into rule engine artifacts that are cached next to the
+packs under the hash of their content, so loading an unchanged set of packs
+skips validation and the literal analysis; rule regexes are then compiled on
+their first use.
+
+    python rule_packs.py export -o rules/core.json
+    python rule_packs.py check rules/core.json rules/legal.json
+    python rule_packs.py cost rules/*.json --corpus essays.txt --top 5
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from time import perf_counter
+
+from rule_engine import RuleEngine, KeywordMatcher, ARTIFACT_VERSION
+from modality_engine import ModalityAnalyzer, rule_groups, keyword_categories
+
+# Bump when the pack format changes
+PACK_FORMAT = 1
+
+# Pattern lists of a pack and the RuleEngine group each one feeds
+PATTERN_FIELDS = (('necessity', 'necessity'), ('impossibility', 'impossibility'))
+PHRASE_FIELDS = (('exemptions', 'exemption'), ('empirical', 'empirical'))
+
+# Keyword categories analyze_contingent_statement scores
+INDICATOR_CATEGORIES = ('epistemic', 'deontic', 'possibility')
+
+PACK_FIELDS = {'format', 'name', 'description', 'indicators'} | {field for field, _ in PATTERN_FIELDS + PHRASE_FIELDS}
+
+CACHE_DIRNAME = '__rulecache__'
+
+# Rules that are part of the scoring code rather than of any pack
+BUILTIN = '(builtin)'
+
+
+class RulePackError(ValueError):
+    """A rule pack that cannot be read or does not validate"""
+
+
+def builtin_pack(name='builtin'):
+    """The analyzer's built-in rules as a pack"""
+    analyzer = ModalityAnalyzer()
+    return {
+        'format': PACK_FORMAT,
+        'name': name,
+        'necessity': analyzer.logical_patterns['necessity'],
+        'impossibility': analyzer.logical_patterns['impossibility'],
+        'exemptions': analyzer.impossibility_exemptions,
+        'indicators': analyzer.modal_indicators,
+        'empirical': analyzer.empirical_indicators
+    }
+
+
+def read_pack(path):
+    """Parse a pack file and check its structure; patterns are not compiled here"""
+    try:
+        with open(path, encoding='utf-8') as handle:
+            pack = json.load(handle)
+    except OSError as e:
+        raise RulePackError(f"{path}: cannot read rule pack: {e}") from e
+    except ValueError as e:
+        raise RulePackError(f"{path}: invalid JSON: {e}") from e
+
+    if not isinstance(pack, dict):
+        raise RulePackError(f"{path}: a rule pack must be a JSON object")
+    unknown = sorted(set(pack) - PACK_FIELDS)
+    if unknown:
+        raise RulePackError(f"{path}: unknown field(s) {', '.join(unknown)}")
+    if pack.get('format', PACK_FORMAT) != PACK_FORMAT:
+        raise RulePackError(f"{path}: unsupported pack format {pack['format']!r}")
+    name = pack.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise RulePackError(f"{path}: 'name' must be a non-empty string")
+
+    normalized = {'name': name}
+    for field, _ in PATTERN_FIELDS + PHRASE_FIELDS:
+        normalized[field] = _strings(path, field, pack.get(field, []))
+    indicators = pack.get('indicators', {})
+    if not isinstance(indicators, dict):
+        raise RulePackError(f"{path}: 'indicators' must be an object")
+    for category in indicators:
+        if category not in INDICATOR_CATEGORIES:
+            raise RulePackError(f"{path}: indicators: unknown category {category!r} "
+                                f"(expected one of {', '.join(INDICATOR_CATEGORIES)})")
+    normalized['indicators'] = {category: _strings(path, f'indicators.{category}', indicators.get(category, []))
+                                for category in INDICATOR_CATEGORIES}
+
+    # Sentences are matched in lowercase, so anything else could never match
+    for field in ('exemptions', 'empirical'):
+        _lowercase(path, field, normalized[field])
+    for category, words in normalized['indicators'].items():
+        _lowercase(path, f'indicators.{category}', words)
+    return normalized
+
+
+def _strings(path, field, values):
+    if not isinstance(values, list):
+        raise RulePackError(f"{path}: {field!r} must be a list of strings")
+    for index, value in enumerate(values):
+        if not isinstance(value, str) or not value.strip():
+            raise RulePackError(f"{path}: {field}[{index}]: must be a non-empty string")
+    return list(values)
+
+
+def _lowercase(path, field, values):
+    for index, value in enumerate(values):
+        if value != value.lower():
+            raise RulePackError(f"{path}: {field}[{index}]: {value!r} must be lowercase")
+
+
+def validate_patterns(path, pack):
+    """Compile every pattern of a read_pack() result, reporting the first invalid one"""
+    for field, _ in PATTERN_FIELDS:
+        for index, pattern in enumerate(pack[field]):
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise RulePackError(f"{path}: {field}[{index}]: invalid pattern {pattern!r}: {e}") from e
+
+
+class RuleSet:
+    """Rule packs combined in order, with the compiled rule artifacts and each rule's pack"""
+
+    def __init__(self, paths, packs, artifacts, cache_dir=None, cached=False):
+        self.paths = list(paths)
+        self.packs = packs
+        self.artifacts = artifacts
+        self.cache_dir = cache_dir
+        # Whether the artifacts were read from the cache rather than compiled
+        self.cached = cached
+        self.hash = content_hash(packs)
+
+        self.logical_patterns = {'necessity': [], 'impossibility': []}
+        self.modal_indicators = {category: [] for category in INDICATOR_CATEGORIES}
+        self.exemptions = []
+        self.empirical = []
+        # Pack name of every rule engine rule, by group and index, and of every keyword
+        self.sources = {'arithmetic': [BUILTIN], 'necessity': [], 'exemption': [], 'impossibility': []}
+        self.keyword_sources = {}
+
+        for pack in packs:
+            name = pack['name']
+            for field, group in PATTERN_FIELDS:
+                self.logical_patterns[field].extend(pack[field])
+                self.sources[group].extend([name] * len(pack[field]))
+            self.exemptions.extend(pack['exemptions'])
+            self.sources['exemption'].extend([name] * len(pack['exemptions']))
+            self.empirical.extend(pack['empirical'])
+            for category, words in list(pack['indicators'].items()) + [('empirical', pack['empirical'])]:
+                if category != 'empirical':
+                    self.modal_indicators[category].extend(words)
+                for word in words:
+                    self.keyword_sources.setdefault((category, word), name)
+
+    @property
+    def names(self):
+        return [pack['name'] for pack in self.packs]
+
+    def engine_groups(self):
+        return rule_groups(self.logical_patterns['necessity'], self.exemptions, self.logical_patterns['impossibility'])
+
+    def keyword_categories(self):
+        return keyword_categories(self.modal_indicators, self.empirical)
+
+    def source(self, group, index):
+        """Name of the pack a rule engine rule came from"""
+        return self.sources[group][index]
+
+    def describe(self):
+        """JSON-serializable summary of the packs and their rule counts"""
+        return {
+            'hash': self.hash,
+            'cached': self.cached,
+            'packs': [{
+                'name': pack['name'],
+                'path': path,
+                'necessity': len(pack['necessity']),
+                'impossibility': len(pack['impossibility']),
+                'exemptions': len(pack['exemptions']),
+                'indicators': sum(len(words) for words in pack['indicators'].values()),
+                'empirical': len(pack['empirical'])
+            } for path, pack in zip(self.paths, self.packs)]
+        }
+
+
+def content_hash(packs):
+    """Hash of the normalized packs and the artifact layout they compile to"""
+    data = {'format': PACK_FORMAT, 'artifact': ARTIFACT_VERSION, 'packs': packs}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+def default_cache_dir(paths):
+    return os.path.join(os.path.dirname(os.path.abspath(paths[0])), CACHE_DIRNAME)
+
+
+def load_rule_set(paths, cache_dir=None):
+    """Read rule packs and return their RuleSet, compiling them only on a cache miss.
+
+    The compiled artifacts are cached in cache_dir (default: a __rulecache__
+    directory next to the first pack) under the packs' content hash; a cache
+    that cannot be written is not an error.
+    """
+    paths = [os.fspath(path) for path in paths]
+    if not paths:
+        raise RulePackError('no rule packs given')
+    packs = [read_pack(path) for path in paths]
+    seen = {}
+    for path, pack in zip(paths, packs):
+        if pack['name'] in seen:
+            raise RulePackError(f"{path}: pack name {pack['name']!r} is already used by {seen[pack['name']]}")
+        seen[pack['name']] = path
+
+    cache_dir = cache_dir or default_cache_dir(paths)
+    cache_path = os.path.join(cache_dir, content_hash(packs) + '.json')
+    artifacts = _read_cache(cache_path)
+    if artifacts is not None:
+        return RuleSet(paths, packs, artifacts, cache_dir, cached=True)
+
+    for path, pack in zip(paths, packs):
+        validate_patterns(path, pack)
+    rule_set = RuleSet(paths, packs, None, cache_dir)
+    rule_set.artifacts = {
+        'engine': RuleEngine(rule_set.engine_groups()).to_artifact(),
+        'keywords': KeywordMatcher(rule_set.keyword_categories()).to_artifact()
+    }
+    _write_cache(cache_path, rule_set.artifacts)
+    return rule_set
+
+
+def _read_cache(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            artifacts = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    # An artifact of another layout is compiled again and replaced
+    if not isinstance(artifacts, dict) or any(
+            not isinstance(artifacts.get(part), dict) or artifacts[part].get('version') != ARTIFACT_VERSION
+            for part in ('engine', 'keywords')):
+        return None
+    return artifacts
+
+
+def _write_cache(path, artifacts):
+    # Written under a temporary name and renamed, so readers never see a partial file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(artifacts, handle)
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+def rule_source(analyzer, group, index, pattern=None):
+    """Pack name of a rule of the analyzer's rule engine, or None when the engine has no
+    such rule (e.g. for counters of rules that were in use before a reload)"""
+    patterns = dict(analyzer.get_rule_engine().groups).get(group)
+    if patterns is None or not 0 <= index < len(patterns) or pattern not in (None, patterns[index]):
+        return None
+    if analyzer.rule_set is None:
+        return BUILTIN if group == 'arithmetic' else 'builtin'
+    return analyzer.rule_set.source(group, index)
+
+
+def stats_by_pack(analyzer, rules=None):
+    """Per-rule counters (default: the analyzer's RuleEngine.stats()) totalled by pack;
+    counters of rules the analyzer no longer has are left out"""
+    packs = {}
+    for rule in analyzer.rule_stats() if rules is None else rules:
+        pack = rule_source(analyzer, rule['group'], rule['index'], rule['pattern'])
+        if pack is None:
+            continue
+        totals = packs.setdefault(pack, {'rules': 0, 'evaluated': 0, 'matched': 0, 'skipped': 0, 'ruleStats': []})
+        totals['rules'] += 1
+        for field in ('evaluated', 'matched', 'skipped'):
+            totals[field] += rule[field]
+        totals['ruleStats'].append(rule)
+    return packs
+
+
+def cost_report(analyzer, documents, repeat=3, top=5):
+    """Time the analyzer's rules over the sentences of documents and total the cost per pack.
+
+    Each pack gets the summed full-evaluation time of its rules, how often they
+    passed the prefilter and matched, and its top most expensive rules. The
+    prefilter scan and the keyword matcher run once for all packs, so their
+    times are reported separately.
+    """
+    sentences = [sentence.lower() for document in documents for sentence in analyzer.split_into_sentences(document)]
+    rules, (_, scan_seconds) = analyzer.get_rule_engine().measure_costs(sentences, repeat)
+
+    matcher = analyzer.get_keyword_matcher()
+    keyword_seconds = None
+    for _ in range(max(1, repeat)):
+        started = perf_counter()
+        found = [matcher.find(sentence) for sentence in sentences]
+        elapsed = perf_counter() - started
+        keyword_seconds = elapsed if keyword_seconds is None else min(keyword_seconds, elapsed)
+
+    packs = {}
+    for rule in rules:
+        rule['pack'] = rule_source(analyzer, rule['group'], rule['index'])
+        totals = packs.setdefault(rule['pack'], {'rules': 0, 'seconds': 0.0, 'candidates': 0, 'matched': 0,
+                                                  'keywordHits': 0, 'topRules': []})
+        totals['rules'] += 1
+        totals['seconds'] += rule['seconds']
+        totals['candidates'] += rule['candidates']
+        totals['matched'] += rule['matched']
+        totals['topRules'].append(rule)
+
+    for result in found:
+        for category, words in result.items():
+            for word in words:
+                pack = analyzer.rule_set.keyword_sources.get((category, word)) if analyzer.rule_set else 'builtin'
+                if pack is not None:
+                    packs.setdefault(pack, {'rules': 0, 'seconds': 0.0, 'candidates': 0, 'matched': 0,
+                                            'keywordHits': 0, 'topRules': []})['keywordHits'] += 1
+
+    for totals in packs.values():
+        totals['topRules'] = sorted(totals['topRules'], key=lambda rule: rule['seconds'], reverse=True)[:top]
+    return {
+        'sentences': len(sentences),
+        'repeat': repeat,
+        'hash': analyzer.rule_set.hash if analyzer.rule_set else analyzer.rules_fingerprint(),
+        'scanSeconds': scan_seconds,
+        'keywordSeconds': keyword_seconds,
+        'packs': dict(sorted(packs.items(), key=lambda item: item[1]['seconds'], reverse=True))
+    }
+
+
+def format_cost_report(report):
+    lines = [f"{report['sentences']:,} sentences, fastest of {report['repeat']} run(s); "
+             f"prefilter scan {report['scanSeconds'] * 1000:.2f} ms, keywords {report['keywordSeconds'] * 1000:.2f} ms"]
+    for name, totals in report['packs'].items():
+        lines.append(f"{name}: {totals['rules']} rules, {totals['seconds'] * 1000:.2f} ms, "
+                     f"{totals['candidates']:,} evaluated, {totals['matched']:,} matched, "
+                     f"{totals['keywordHits']:,} keyword hits")
+        for rule in totals['topRules']:
+            if rule['candidates']:
+                lines.append(f"  {rule['seconds'] * 1000:8.3f} ms  {rule['group']}[{rule['index']}] "
+                             f"{rule['candidates']:,} evaluated  {rule['pattern']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export, check and profile modality analyzer rule packs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='write the built-in rules as a rule pack')
+    export.add_argument('--name', default='builtin', help="pack name (default: 'builtin')")
+    export.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+
+    check = commands.add_parser('check', help='validate rule packs and compile them into the cache')
+    check.add_argument('packs', nargs='+', help='rule pack files, in priority order')
+    check.add_argument('--cache-dir', default=None, help=f'artifact cache (default: {CACHE_DIRNAME} next to the first pack)')
+
+    cost = commands.add_parser('cost', help='report the cost of each pack and its most expensive rules')
+    cost.add_argument('packs', nargs='*', help='rule pack files, in priority order (default: the built-in rules)')
+    cost.add_argument('--cache-dir', default=None, help=f'artifact cache (default: {CACHE_DIRNAME} next to the first pack)')
+    cost.add_argument('--corpus', action='append', default=None,
+                      help='text file to profile on (repeatable; default: a synthetic benchmark corpus)')
+    cost.add_argument('--repeat', type=int, default=3, help='timed runs per rule (default: 3)')
+    cost.add_argument('--top', type=int, default=5, help='expensive rules listed per pack (default: 5)')
+    cost.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            text = json.dumps(builtin_pack(args.name), indent=2) + '\n'
+            if args.output == '-':
+                sys.stdout.write(text)
+            else:
+                with open(args.output, 'w', encoding='utf-8') as handle:
+                    handle.write(text)
+            return True
+
+        if args.command == 'check':
+            started = perf_counter()
+            rule_set = load_rule_set(args.packs, args.cache_dir)
+            elapsed = perf_counter() - started
+            summary = rule_set.describe()
+            for pack in summary['packs']:
+                print(f"{pack['name']} ({pack['path']}): {pack['necessity']} necessity, "
+                      f"{pack['impossibility']} impossibility, {pack['exemptions']} exemptions, "
+                      f"{pack['indicators']} indicators, {pack['empirical']} empirical")
+            print(f"{rule_set.hash} {'loaded from cache' if rule_set.cached else 'compiled and cached'} "
+                  f"in {elapsed * 1000:.1f} ms")
+            return True
+
+        analyzer = ModalityAnalyzer()
+        if args.packs:
+            analyzer.load_rule_packs(args.packs, args.cache_dir)
+        if args.corpus:
+            documents = []
+            for path in args.corpus:
+                with open(path, encoding='utf-8') as handle:
+                    documents.append(handle.read())
+        else:
+            from benchmark import generate_corpus
+            documents = generate_corpus('paragraphs', 500) + generate_corpus('rule_heavy', 1000)
+        report = cost_report(analyzer, documents, max(1, args.repeat), args.top)
+        print(json.dumps(report, indent=2) if args.json else format_cost_report(report))
+        return True
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
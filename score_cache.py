@@ -0,0 +1,68 @@
+"""
+Bounded LRU cache of sentence scores for the modality analyzer.
+"""
+
+import sys
+from collections import OrderedDict
+
+
+class ScoreCache:
+    def __init__(self, max_entries=None, max_bytes=None):
+        """An LRU mapping bounded by entry count and/or approximate size in bytes"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key (marking it recently used), or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """Store value under key, evicting least recently used entries to stay in budget"""
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._entries[key] = (value, size)
+        self.bytes += size
+
+        while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                                 or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry; the hit/miss/eviction counters are kept"""
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit, miss, eviction and size counters"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hitRate': self.hits / lookups if lookups else 0,
+            'maxEntries': self.max_entries,
+            'maxBytes': self.max_bytes
+        }
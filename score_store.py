@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk store of sentence scores for the modality analyzer.
+Scores are kept in SQLite (WAL mode) keyed by a hash of the rule set and a hash
+of the sentence, so several processes can share one store across runs.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+SCORE_TYPES = ('necessity', 'possibility', 'impossibility')
+
+
+def default_path():
+    """Return the default store location under the user's cache directory"""
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'modality-analyzer', 'scores.sqlite3')
+
+
+def sentence_key(sentence):
+    """Content hash of a normalized sentence"""
+    return hashlib.blake2b(sentence.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class ScoreStore:
+    def __init__(self, path=None, batch_size=512, flush_interval=2.0):
+        """Open (creating if needed) the store at path; writes are buffered up to batch_size"""
+        self.path = path or default_path()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._local = threading.local()
+
+    def connection(self):
+        # SQLite connections must not cross a fork or a thread, so every thread of every
+        # process opens its own
+        local = self._local
+        if getattr(local, 'connection', None) is None or local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # Score columns are untyped so integer scores come back as integers
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS scores ('
+                'rules TEXT NOT NULL, sentence BLOB NOT NULL, '
+                'necessity, possibility, impossibility, stored_at REAL NOT NULL, '
+                'PRIMARY KEY (rules, sentence)) WITHOUT ROWID'
+            )
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, rules, sentence):
+        """Return stored scores for sentence under the given rule set hash, or None"""
+        key = sentence_key(sentence)
+        pending = self._pending.get((rules, key))
+        if pending is not None:
+            return dict(zip(SCORE_TYPES, pending))
+
+        row = self.connection().execute(
+            'SELECT necessity, possibility, impossibility FROM scores WHERE rules = ? AND sentence = ?',
+            (rules, key)
+        ).fetchone()
+        return dict(zip(SCORE_TYPES, row)) if row else None
+
+    def put(self, rules, sentence, scores):
+        """Queue scores for writing; the batch is written once it is full or old enough"""
+        self._pending[(rules, sentence_key(sentence))] = tuple(scores[score_type] for score_type in SCORE_TYPES)
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all queued scores in a single transaction"""
+        self._last_flush = time.monotonic()
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time()
+        rows = [(rules, key) + scores + (now,) for (rules, key), scores in pending.items()]
+        connection = self.connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def close(self):
+        """Flush queued writes and close the calling thread's connection; other threads'
+        connections close when those threads exit"""
+        self.flush()
+        local = self._local
+        if getattr(local, 'connection', None) is not None and local.pid == os.getpid():
+            local.connection.close()
+        local.connection = None
+
+    def stats(self):
+        """Entry counts per rule set and the size of the database file"""
+        rows = self.connection().execute('SELECT rules, COUNT(*) FROM scores GROUP BY rules').fetchall()
+        return {
+            'path': self.path,
+            'entries': sum(count for _, count in rows),
+            'ruleSets': dict(rows),
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            'pending': len(self._pending)
+        }
+
+    def compact(self, keep_rules=None, max_entries=None, max_age=None):
+        """Delete entries of rule sets other than keep_rules (a fingerprint or a list of them),
+        entries older than max_age seconds and the oldest entries beyond max_entries, then
+        reclaim the freed space"""
+        if isinstance(keep_rules, str):
+            keep_rules = [keep_rules]
+        self.flush()
+        connection = self.connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            if keep_rules is not None:
+                keep_rules = list(keep_rules)
+                connection.execute(f"DELETE FROM scores WHERE rules NOT IN ({', '.join('?' * len(keep_rules))})",
+                                   keep_rules)
+            if max_age is not None:
+                connection.execute('DELETE FROM scores WHERE stored_at < ?', (time.time() - max_age,))
+            if max_entries is not None:
+                connection.execute(
+                    'DELETE FROM scores WHERE (rules, sentence) IN ('
+                    'SELECT rules, sentence FROM scores ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                    (max_entries,)
+                )
+        connection.execute('VACUUM')
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or compact the modality analyzer score store')
+    parser.add_argument('command', choices=['stats', 'gc'])
+    parser.add_argument('--path', default=None, help=f'store file (default: {default_path()})')
+    parser.add_argument('--max-entries', type=int, default=None, help='keep at most this many of the newest entries')
+    parser.add_argument('--max-age-days', type=float, default=None, help='drop entries older than this')
+    parser.add_argument('--all-rules', action='store_true', help='keep entries computed with other rule sets')
+    parser.add_argument('--keep', action='append', default=[], metavar='FINGERPRINT',
+                        help='also keep entries of this rule set fingerprint (repeatable)')
+    parser.add_argument('--rule-packs', action='append', nargs='+', default=[], metavar='PACK',
+                        help='also keep entries of the rule set these pack files make (repeatable, one rule set each)')
+    args = parser.parse_args()
+
+    store = ScoreStore(args.path)
+    if args.command == 'gc':
+        keep_rules = None
+        if not args.all_rules:
+            from modality_engine import ModalityAnalyzer
+            from rule_packs import RulePackError
+            # The built-in rules are always kept
+            keep_rules = [ModalityAnalyzer().rules_fingerprint()] + args.keep
+            try:
+                keep_rules += [ModalityAnalyzer(rule_packs=packs).rules_fingerprint() for packs in args.rule_packs]
+            except RulePackError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                store.close()
+                return False
+            other_rules = {rules: count for rules, count in store.stats()['ruleSets'].items() if rules not in keep_rules}
+            if other_rules and not (args.keep or args.rule_packs):
+                # Entries of rule packs look just like stale ones; they are only dropped when asked
+                print("Not compacting: the store has entries of rule sets other than the built-in rules:", file=sys.stderr)
+                for rules, count in other_rules.items():
+                    print(f"  {rules}: {count} entries", file=sys.stderr)
+                print("Name the rule sets to keep with --keep FINGERPRINT or --rule-packs PACK..., "
+                      f"--keep {keep_rules[0]} to keep only the built-in rules, or --all-rules", file=sys.stderr)
+                store.close()
+                return False
+        max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+        store.compact(keep_rules=keep_rules, max_entries=args.max_entries, max_age=max_age)
+
+    stats = store.stats()
+    print(f"{stats['entries']} entries in {len(stats['ruleSets'])} rule set(s), {stats['bytes']} bytes: {stats['path']}")
+    store.close()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
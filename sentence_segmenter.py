@@ -0,0 +1,99 @@
+"""
+Sentence segmentation for the modality analyzer.
+A sentence ends at a run of '.', '!' or '?' followed by whitespace, except for
+the period of a known abbreviation ("e.g.", "Dr.") or of a numbering
+abbreviation followed by a number ("No. 5", "pp. 12"). A decimal point ("3.14")
+never ends a sentence since no whitespace follows it. The scanner reports
+(start, end) offsets into the original str, or into bytes, a memoryview or an
+mmap of ASCII-compatible text, so no sentence has to be copied to be found.
+"""
+
+import re
+
+# Periods after these never end a sentence. 'etc' is left out: it ends too many sentences.
+ABBREVIATIONS = ('mr', 'mrs', 'ms', 'dr', 'prof', 'rev', 'sr', 'jr', 'st', 'vs', 'cf', 'viz', 'al',
+                 'e.g', 'i.e', 'approx')
+
+# Periods after these do not end a sentence when a number follows
+NUMBER_ABBREVIATIONS = ('no', 'nos', 'p', 'pp', 'vol', 'ch', 'fig', 'eq', 'sec', 'art')
+
+
+def _after_period(words, lookahead):
+    # Lookbehinds must be fixed width, so words are grouped by length. ASCII-only
+    # matching keeps the str and bytes patterns in agreement.
+    by_length = {}
+    for word in words:
+        by_length.setdefault(len(word), []).append(re.escape(word))
+    return [r'(?<=(?ai:\b(?:%s))\.)%s' % ('|'.join(group), lookahead) for group in by_length.values()]
+
+
+# Matches right after a period that belongs to its sentence rather than ending it;
+# the letter check first turns away ordinary sentence ends cheaply
+ABBREVIATION_PERIOD = r'(?<=[A-Za-z]\.)(?:%s)' % '|'.join(_after_period(ABBREVIATIONS, r'(?=\s)') +
+                                          _after_period(NUMBER_ABBREVIATIONS, r'(?=\s+[0-9])'))
+
+# Characters before a period that the boundary pattern looks at: the abbreviation and
+# the character before it, for the word boundary
+BOUNDARY_CONTEXT = max(len(word) for word in ABBREVIATIONS + NUMBER_ABBREVIATIONS) + 2
+
+# The separator between two sentences
+BOUNDARY_PATTERN = r'(?:[!?]|\.(?!%s))[.!?]*\s+' % ABBREVIATION_PERIOD
+
+# One sentence, after skipping any separators before it; group 1 is the sentence.
+# Possessive runs keep the scan linear: text, punctuation not followed by
+# whitespace, and abbreviation periods are taken whole and never given back.
+SENTENCE_PATTERN = r'(?:[.!?]+\s+)*((?:[^.!?]++|[.!?]++(?!\s)|\.%s)++)' % ABBREVIATION_PERIOD
+
+SENTENCE_BOUNDARY = re.compile(BOUNDARY_PATTERN)
+SENTENCE = re.compile(SENTENCE_PATTERN)
+
+# The bytes forms see only ASCII whitespace, so they find a subset of the str
+# boundaries and never cut UTF-8 text inside a sentence
+SENTENCE_BOUNDARY_BYTES = re.compile(BOUNDARY_PATTERN.encode('ascii'))
+SENTENCE_BYTES = re.compile(SENTENCE_PATTERN.encode('ascii'))
+
+FIRST_NON_SPACE_BYTES = re.compile(rb'\S')
+WHITESPACE_BYTES = b' \t\n\r\x0b\x0c'
+
+
+def text_bounds(text, start=0, end=None):
+    """The (start, end) of text[start:end] with surrounding whitespace stripped"""
+    end = len(text) if end is None else end
+    if isinstance(text, str):
+        piece = text[start:end]
+        stripped_end = start + len(piece.rstrip())
+        if stripped_end == start:
+            return start, start
+        return start + len(piece) - len(piece.lstrip()), stripped_end
+    match = FIRST_NON_SPACE_BYTES.search(text, start, end)
+    if match is None:
+        return start, start
+    while text[end - 1] in WHITESPACE_BYTES:
+        end -= 1
+    return match.start(), end
+
+
+def iter_spans(text, start=0, end=None):
+    """(start, end) offsets of the sentences of text[start:end], which may be a
+    str or a bytes-like object such as bytes, memoryview or mmap"""
+    binary = not isinstance(text, str)
+    start, end = text_bounds(text, start, end)
+    for match in (SENTENCE_BYTES if binary else SENTENCE).finditer(text, start, end):
+        sentence_start, sentence_end = match.span(1)
+        # "word . Next" leaves the space before the period on the sentence
+        while (text[sentence_end - 1] in WHITESPACE_BYTES) if binary else text[sentence_end - 1].isspace():
+            sentence_end -= 1
+        yield sentence_start, sentence_end
+
+
+def split_spans(text, start=0, end=None):
+    """List of iter_spans"""
+    return list(iter_spans(text, start, end))
+
+
+def split_sentences(text):
+    """The sentences of a str, as copies"""
+    start, end = text_bounds(text)
+    # findall builds the sentence strings in C, without a match object per sentence;
+    # rstrip returns a sentence unchanged unless a space came before its boundary
+    return [sentence.rstrip() for sentence in SENTENCE.findall(text, start, end)]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Sharded map-reduce analysis of a single huge document.
+The file is cut at sentence boundaries into byte ranges. Each shard is analyzed
+on its own (another process or another machine) into a ParagraphAccumulator
+partial state, and the states merge exactly. One shard gives the paragraph
+result analyze() would give for the whole document. Any split into two or more
+shards gives one and the same result, whose weighted means are rounded once from
+exact sums and so can differ from analyze()'s sequential float sums in the last ulp.
+
+    python sharded_analysis.py analyze book.txt --workers 8
+    python sharded_analysis.py plan book.txt --shards 64 > plan.json
+    python sharded_analysis.py run book.txt --start 0 --end 1048576 -o part-000.json
+    python sharded_analysis.py merge part-*.json
+"""
+
+import os
+import sys
+import json
+import mmap
+import argparse
+
+from modality_engine import ModalityAnalyzer, ParagraphAccumulator
+from sentence_segmenter import SENTENCE_BOUNDARY_BYTES, WHITESPACE_BYTES
+
+# Its matches are also matches of the text pattern, so a cut at one never moves a sentence boundary
+SHARD_BOUNDARY = SENTENCE_BOUNDARY_BYTES
+BOUNDARY_BYTES = b'.!?' + WHITESPACE_BYTES
+
+
+def plan_shards(path, shards):
+    """Split the file at path into about shards byte ranges, each ending where a sentence does.
+
+    The boundary punctuation and whitespace between two ranges belongs to
+    neither, exactly as split_into_sentences drops it.
+    """
+    size = os.path.getsize(path)
+    if size == 0 or shards <= 1:
+        return [(0, size)]
+
+    ranges = []
+    start = 0
+    with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for i in range(1, shards):
+            target = max(size * i // shards, start)
+            # Searching from inside a run of boundaries (e.g. '?! . ') could find a boundary
+            # that starts mid-run, so search from where the run starts
+            while target > start and data[target - 1] in BOUNDARY_BYTES:
+                target -= 1
+            match = SHARD_BOUNDARY.search(data, target)
+            # A boundary touching the end of the file is stripped, not split on
+            if match is None or match.end() == size:
+                break
+            # "word . Next": the space before the period belongs to neither shard
+            end = match.start()
+            while end > start and data[end - 1] in WHITESPACE_BYTES:
+                end -= 1
+            ranges.append((start, end))
+            start = match.end()
+    ranges.append((start, size))
+    return ranges
+
+
+def analyze_text(analyzer, text):
+    """ParagraphAccumulator over the sentences of text"""
+    accumulator = ParagraphAccumulator(analyzer)
+    for start, end, scores in analyzer.score_spans(text, analyzer.iter_spans(text)):
+        accumulator.add_length(end - start, scores)
+    return accumulator
+
+
+def analyze_shard(analyzer, path, start, end):
+    """Analyze bytes [start, end) of the file at path and return its partial state"""
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+    # Cuts are at ASCII punctuation and whitespace, so never inside a UTF-8 sequence
+    state = analyze_text(analyzer, data.decode('utf-8', errors='replace')).to_state()
+    state['source'] = path
+    state['range'] = [start, end]
+    return state
+
+
+def merge_states(analyzer, states):
+    """Merge partial states, in document order by their byte range, into one accumulator"""
+    merged = ParagraphAccumulator(analyzer)
+    for state in sorted(states, key=lambda state: state.get('range', [0])[0]):
+        merged.merge(ParagraphAccumulator.from_state(analyzer, state))
+    return merged
+
+
+def analyze_file(analyzer, path, workers=None, shards=None):
+    """Analyze one large file on the analyzer's worker pool and return the paragraph result"""
+    workers = workers or os.cpu_count() or 1
+    ranges = plan_shards(path, shards or workers * 4)
+    if workers == 1 or len(ranges) == 1:
+        states = [analyze_shard(analyzer, path, start, end) for start, end in ranges]
+    else:
+        pool = analyzer.get_pool(workers)
+        states = pool.map(_analyze_shard_in_worker, [(path, start, end) for start, end in ranges], 1)
+    return merge_states(analyzer, states).result()
+
+
+def _analyze_shard_in_worker(task):
+    import modality_engine
+    return analyze_shard(modality_engine._worker_analyzer, *task)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze one huge document in shards and merge the results')
+    parser.add_argument('command', choices=['analyze', 'plan', 'run', 'merge'],
+                        help='analyze: all shards on local workers; plan: print shard byte ranges; '
+                             'run: analyze one range into a partial state; merge: combine partial states')
+    parser.add_argument('inputs', nargs='+', help='the document, or for merge the partial state files')
+    parser.add_argument('--shards', type=int, default=None, help='number of shards (default: 4 per worker)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--start', type=int, default=0, help='run: first byte of the shard')
+    parser.add_argument('--end', type=int, default=None, help='run: end byte of the shard (default: end of file)')
+    parser.add_argument('--max-sentence-length', type=int, default=None, help='split longer sentences into chunks')
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+    args = parser.parse_args()
+
+    analyzer = ModalityAnalyzer(max_sentence_length=args.max_sentence_length)
+    try:
+        if args.command == 'plan':
+            path = args.inputs[0]
+            shards = args.shards or (args.workers or os.cpu_count() or 1) * 4
+            output = {'source': path, 'ranges': plan_shards(path, shards)}
+        elif args.command == 'run':
+            path = args.inputs[0]
+            end = args.end if args.end is not None else os.path.getsize(path)
+            output = analyze_shard(analyzer, path, args.start, end)
+        elif args.command == 'merge':
+            states = []
+            for path in args.inputs:
+                with open(path, encoding='utf-8') as handle:
+                    states.append(json.load(handle))
+            output = merge_states(analyzer, states).result()
+        else:
+            output = analyze_file(analyzer, args.inputs[0], args.workers, args.shards)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    finally:
+        analyzer.close()
+
+    text = json.dumps(output, ensure_ascii=False)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text + '\n')
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success:
+        sys.exit(1)
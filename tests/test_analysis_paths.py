@@ -0,0 +1,215 @@
+import io
+import json
+import random
+from itertools import islice
+
+import pytest
+
+from benchmark import generate_corpus
+from incremental_analysis import IncrementalDocument
+from modality_engine import ModalityAnalyzer, ParagraphAccumulator
+from sharded_analysis import analyze_file, analyze_text
+
+SUMMARY_KEYS = ('scores', 'classification', 'explanation', 'isParagraph')
+SUMMARY_SCORE_TYPES = ('necessity', 'possibility', 'impossibility')
+
+
+def summary(result):
+    return {key: result[key] for key in SUMMARY_KEYS}
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return ModalityAnalyzer()
+
+
+@pytest.fixture(scope='module')
+def documents():
+    return generate_corpus('paragraphs', 120, seed=16) + generate_corpus('essays', 4, seed=16)
+
+
+def test_every_path_matches_analyze(analyzer, documents):
+    for text in documents:
+        expected = analyzer.analyze(text)
+        assert analyzer.analyze_compact(text).to_dict() == expected
+        stream = analyzer.analyze_stream(io.StringIO(text), chunk_size=97)
+        assert list(stream) == expected['sentenceResults']
+        assert summary(stream.result()) == summary(expected)
+        assert IncrementalDocument(analyzer, text).result() == expected
+
+
+def test_compact_and_vectorized_results_serialize_like_analyze(analyzer, documents):
+    # Equal is not enough: 90 and 90.0 compare equal but serialize differently
+    singles = ['It must be true.', 'Necessarily, squares have four sides.', 'Perhaps it rains.', 'Hello']
+    for text in documents + singles:
+        expected = analyzer.analyze(text)
+        assert json.dumps(analyzer.analyze_compact(text).to_dict()) == json.dumps(expected)
+        results = expected['sentenceResults']
+        aggregate = analyzer.aggregate_scores([[result['scores'][score_type] for score_type in SUMMARY_SCORE_TYPES]
+                                               for result in results],
+                                              [len(result['sentence']) for result in results])
+        assert aggregate['scores'] == expected['scores']
+        assert aggregate['classification'] == expected['classification']
+        if len(results) > 1:
+            assert aggregate['explanation'] == expected['explanation']
+    single = analyzer.aggregate_scores([[90, 18, 0]], [16])['scores']
+    assert json.dumps(single) == json.dumps({'necessity': 90, 'possibility': 18, 'impossibility': 0})
+
+
+def test_analyze_many_matches_analyze(documents):
+    batch = ModalityAnalyzer()
+    texts = documents[:60]
+    expected = [batch.analyze(text) for text in texts]
+    try:
+        assert list(batch.analyze_many(texts, workers=1)) == expected
+        assert list(batch.analyze_many(iter(texts), workers=2, chunksize=7, serial_threshold=0)) == expected
+        unordered = dict(batch.analyze_many(texts, workers=2, chunksize=7, ordered=False, serial_threshold=0))
+        assert [unordered[index] for index in range(len(texts))] == expected
+        # Workers are restarted with the changed rules
+        batch.logical_patterns['necessity'].append('squares')
+        sentence = 'Squares are pleasant.'
+        assert [result['scores'] for result in batch.analyze_many([sentence] * 3, workers=2, serial_threshold=0)] \
+            == [batch.analyze(sentence)['scores']] * 3
+        assert batch.analyze(sentence)['scores']['necessity'] == 90
+    finally:
+        batch.close()
+
+
+def test_incremental_edits_match_analyze(analyzer, documents):
+    document = IncrementalDocument(analyzer, documents[0])
+    for text in documents[1:40]:
+        # Keep the head, so only the tail is rescored and re-summed
+        document.update(documents[0][:len(documents[0]) // 2] + ' ' + text)
+        assert document.result() == analyzer.analyze(document.text)
+        document.update(text)
+        assert document.result() == analyzer.analyze(text)
+
+
+@pytest.mark.parametrize('max_sentence_length', [None, 9, 40])
+def test_incremental_edit_matches_analyze(max_sentence_length):
+    limited = ModalityAnalyzer(max_sentence_length=max_sentence_length)
+    rng = random.Random(max_sentence_length)
+    for _ in range(40):
+        document, text = IncrementalDocument(limited), ''
+        for _ in range(20):
+            start = rng.randint(0, len(text))
+            end = rng.randint(start, min(len(text), start + 30))
+            replacement = ''.join(rng.choice(STREAM_WORDS) + rng.choice((' ', '', '\n', '  '))
+                                  for _ in range(rng.randint(0, 8)))
+            document.edit(start, end, replacement)
+            text = text[:start] + replacement + text[end:]
+            expected = limited.analyze(text)
+            assert document.result() == expected, text
+            assert document.summary()['scores'] == pytest.approx(expected['scores'], rel=1e-12)
+
+
+def test_incremental_edit_rescans_only_the_edited_window(analyzer, documents):
+    text = ' '.join(documents[-4:])
+    document = IncrementalDocument(analyzer, text)
+    scanned = []
+    original = analyzer.chunk_span
+    analyzer.chunk_span = lambda text, start, end: scanned.append(start) or original(text, start, end)
+    try:
+        rng = random.Random(17)
+        for _ in range(50):
+            scanned.clear()
+            offset = rng.randrange(len(document.text))
+            document.edit(offset, offset, ' must not ')
+            assert len(scanned) <= 4 and document.rescored <= 2
+    finally:
+        del analyzer.chunk_span
+    assert document.result() == analyzer.analyze(document.text)
+
+
+def test_one_shard_matches_analyze(analyzer, documents, tmp_path):
+    path = tmp_path / 'document.txt'
+    for text in documents[:40]:
+        path.write_text(text, encoding='utf-8')
+        expected = analyzer.analyze(text)
+        assert summary(analyze_file(analyzer, str(path), workers=1, shards=1)) == summary(expected)
+        # The state round-trips through JSON without losing the sequential sums
+        state = analyze_text(analyzer, text).to_state()
+        assert ParagraphAccumulator.from_state(analyzer, state).paragraph_scores() == expected['scores']
+
+
+def test_shard_counts_agree(analyzer, documents, tmp_path):
+    path = tmp_path / 'document.txt'
+    for text in documents:
+        path.write_text(text, encoding='utf-8')
+        expected = analyzer.analyze(text)
+        results = [analyze_file(analyzer, str(path), workers=1, shards=shards) for shards in (2, 3, 7, 50)]
+        for result in results:
+            # Merged exact sums: the same for any sharding, and analyze()'s up to the last ulp
+            assert result == results[0]
+            assert result['scores'] == pytest.approx(expected['scores'], rel=1e-12)
+            assert result['sentenceCount'] == len(expected['sentences'])
+
+
+def test_analyze_sums_in_sentence_order(analyzer, documents):
+    # The paragraph means as calculate_paragraph_scores has always added them, before adjustments
+    for text in documents:
+        results = analyzer.analyze(text)['sentenceResults']
+        if len(results) < 2:
+            continue
+        accumulator = ParagraphAccumulator(analyzer)
+        total_weight, weighted = 0, {'necessity': 0, 'possibility': 0, 'impossibility': 0}
+        for result in results:
+            accumulator.add(result['sentence'], result['scores'])
+            weight = min(len(result['sentence']) / 50, 2)
+            total_weight += weight
+            for score_type, score in result['scores'].items():
+                weighted[score_type] += score * weight
+        assert accumulator.total_weight == total_weight
+        assert accumulator.weighted_scores == weighted
+        expected = {score_type: total / total_weight for score_type, total in weighted.items()}
+        analyzer.apply_distribution_adjustments(expected, dict(accumulator.distribution), len(results))
+        assert accumulator.paragraph_scores() == expected
+
+
+def test_stream_reads_only_what_it_needs():
+    analyzer = ModalityAnalyzer(max_sentence_length=40)
+    read = []
+
+    def endless():
+        while True:
+            read.append(1)
+            yield 'It must be true. Perhaps it rains'
+            yield ' tomorrow. ' + 'word ' * 30
+
+    results = list(islice(analyzer.analyze_stream(endless()), 50))
+    assert [result['sentence'] for result in results[:3]] == [
+        'It must be true', 'Perhaps it rains tomorrow', ('word ' * 8).strip()]
+    assert len(read) < 20
+
+
+def test_stream_decodes_bytes_split_inside_characters(analyzer):
+    text = 'Ça doit être vrai. Peut-être qu\u2019il pleut — maybe. Straße ist möglich.'
+    expected = analyzer.analyze(text)
+    stream = analyzer.analyze_stream(io.BytesIO(text.encode('utf-8')), chunk_size=1)
+    assert list(stream) == expected['sentenceResults']
+    assert summary(stream.result()) == summary(expected)
+
+
+STREAM_WORDS = ('aword', 'e.g.', 'Mr', 'i.e.', 'Dr.', 'No.', '5', 'x.', 'worde.g.', 'pp.', '3.14', 'vs.', '...',
+                '?', '!', 'Ab.', 'mr.', 'necessarily', 'impossible', 'maybe')
+
+
+@pytest.mark.parametrize('max_sentence_length', [3, 7, 12, 40])
+def test_stream_splits_like_analyze_with_length_limit(max_sentence_length):
+    limited = ModalityAnalyzer(max_sentence_length=max_sentence_length)
+    rng = random.Random(max_sentence_length)
+    for _ in range(500):
+        text = ''.join(rng.choice(STREAM_WORDS) + rng.choice((' ', ' ', '', '\n'))
+                       for _ in range(rng.randint(1, 30)))
+        size = rng.randint(1, 6)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert list(limited.split_stream(chunks)) == limited.split_into_sentences(text), text
+
+
+def test_stream_matches_analyze_with_length_limit(documents):
+    limited = ModalityAnalyzer(max_sentence_length=40)
+    for text in documents[:40] + ['aword ...worde.g. Mr i.e. Dr. ' * 20]:
+        expected = limited.analyze(text)
+        stream = limited.analyze_stream(io.StringIO(text), chunk_size=13)
+        assert list(stream) == expected['sentenceResults']
+        assert summary(stream.result()) == summary(expected)
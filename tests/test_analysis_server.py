@@ -0,0 +1,288 @@
+import json
+import time
+import socket
+import threading
+import http.client
+
+import pytest
+
+from analysis_server import (AnalysisService, APIError, MAX_CSV_TABLE_VARIABLES, MAX_INLINE_LOGIC_VARIABLES,
+                             MAX_BATCH_DOCUMENTS, MAX_LIVE_SESSIONS, MAX_LIVE_TEXT_CHARS, logic_summary, make_server)
+from logic_engine import Expression
+from modality_engine import ModalityAnalyzer
+
+
+def test_live_sessions_with_store_from_two_threads(tmp_path):
+    service = AnalysisService(1, store_path=str(tmp_path / 'scores.sqlite3'))
+    requests = [
+        {'session': 'a', 'text': 'It must be true. Maybe it rains tomorrow.'},
+        {'session': 'b', 'text': 'Squares cannot be round. Perhaps.'}
+    ]
+    responses, errors = [], []
+
+    def send(payload):
+        try:
+            responses.append(service.live(json.dumps(payload)))
+        except Exception as e:
+            errors.append(e)
+
+    # One after the other, each from its own thread, as handler threads would
+    for payload in requests:
+        thread = threading.Thread(target=send, args=(payload,))
+        thread.start()
+        thread.join()
+    service.live_analyzer.score_store.flush()
+    service.close()
+
+    assert errors == []
+    assert [response['session'] for response in responses] == ['a', 'b']
+
+
+def test_refused_live_requests_leave_the_sessions_alone():
+    service = AnalysisService(1)
+    try:
+        service.live(json.dumps({'session': 'kept', 'text': 'It must be true.'}))
+        for index in range(MAX_LIVE_SESSIONS * 2):
+            with pytest.raises(APIError) as error:
+                service.live(json.dumps({'session': f'new{index}', 'edit': {'start': 1, 'end': 2, 'text': 'x'}}))
+            assert error.value.status == 400
+        assert list(service._sessions) == ['kept']
+
+        edit = {'start': 0, 'end': 0, 'text': 'x' * (MAX_LIVE_TEXT_CHARS - len('It must be true.'))}
+        assert service.live(json.dumps({'session': 'kept', 'edit': edit}))['session'] == 'kept'
+        for payload in ({'session': 'kept', 'edit': {'start': 0, 'end': 0, 'text': 'y'}},
+                        {'session': 'other', 'text': 'x' * (MAX_LIVE_TEXT_CHARS + 1)}):
+            with pytest.raises(APIError) as error:
+                service.live(json.dumps(payload))
+            assert error.value.status == 413
+        assert list(service._sessions) == ['kept']
+        assert len(service._sessions['kept'].text) == MAX_LIVE_TEXT_CHARS
+    finally:
+        service.close()
+
+
+def test_stream_takes_the_pool_under_the_lock():
+    service = AnalysisService(1)
+    get_pool = service.analyzer.get_pool
+    held = []
+
+    def checked_get_pool(workers):
+        held.append(service._lock.locked())
+        return get_pool(workers)
+
+    service.analyzer.get_pool = checked_get_pool
+    try:
+        events = list(service.stream(json.dumps({'text': 'It must be true. Maybe it rains.'}).encode()))
+    finally:
+        service.close()
+
+    assert held == [True]
+    assert [event for event, _ in events] == ['sentence', 'sentence', 'result']
+
+
+def serve(service, mode):
+    server = make_server(('127.0.0.1', 0), service, mode=mode)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    return server, thread
+
+
+def post(server, path, payload):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize('mode', ['threaded', 'async'])
+def test_analyze_endpoints_on_one_connection(mode):
+    service = AnalysisService(1)
+    analyzer = ModalityAnalyzer()
+    texts = ['It must be true. Maybe it rains.', 'Squares cannot be round.', '']
+    server, thread = serve(service, mode)
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+
+    def request(path, body, content_type='application/json'):
+        connection.request('POST', path, body, {'Content-Type': content_type})
+        response = connection.getresponse()
+        return response.status, response.getheader('Server-Timing'), json.loads(response.read())
+
+    try:
+        # Every request reuses the keep-alive connection
+        status, timing, result = request('/analyze', json.dumps({'text': texts[0]}))
+        assert status == 200 and 'total;dur=' in timing and result == analyzer.analyze(texts[0])
+        assert request('/analyze', texts[1].encode(), 'text/plain; charset=utf-8')[2] == analyzer.analyze(texts[1])
+        status, _, batch = request('/analyze/batch', json.dumps({'texts': texts}))
+        assert status == 200 and batch == {'results': [analyzer.analyze(text) for text in texts]}
+        for path, body, expected in [('/analyze', '{"text": ', 400), ('/analyze', '{"text": 3}', 400),
+                                     ('/analyze/batch', json.dumps({'texts': [1]}), 400),
+                                     ('/analyze/batch', json.dumps({'texts': [''] * (MAX_BATCH_DOCUMENTS + 1)}), 413),
+                                     ('/nowhere', '{}', 404)]:
+            status, _, reply = request(path, body)
+            assert status == expected and reply['error'], (path, body)
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+        service.close()
+
+
+def test_threaded_server_close_lets_requests_finish():
+    service = AnalysisService(1)
+    started, finished = threading.Event(), threading.Event()
+
+    def slow_handle(path, body, content_type=''):
+        started.set()
+        time.sleep(0.5)
+        finished.set()
+        return {'ok': True}, {}
+
+    service.handle = slow_handle
+    server, thread = serve(service, 'threaded')
+    # An idle keep-alive connection must not hold server_close for the handler timeout
+    idle = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+    idle.connect()
+    replies = []
+    client = threading.Thread(target=lambda: replies.append(post(server, '/analyze', {'text': 'x'})))
+    client.start()
+    assert started.wait(5)
+
+    closing = time.perf_counter()
+    server.shutdown()
+    server.server_close()
+    elapsed = time.perf_counter() - closing
+    # server_close waited for the handler thread
+    assert finished.is_set()
+    client.join(5)
+    thread.join(5)
+    idle.close()
+    service.close()
+
+    assert replies == [(200, {'ok': True})]
+    assert elapsed < 5
+
+
+def test_async_server_submits_off_the_event_loop():
+    service = AnalysisService(1)
+    submit = service.submit
+    threads = []
+
+    def recorded_submit(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return submit(*args, **kwargs)
+
+    service.submit = recorded_submit
+    server, thread = serve(service, 'async')
+    try:
+        status, result = post(server, '/analyze', {'text': 'It must be true.'})
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+        service.close()
+
+    assert status == 200 and result['classification']
+    assert threads and thread not in threads
+
+
+def test_async_blocking_calls_have_a_deadline():
+    service = AnalysisService(1)
+    release = threading.Event()
+
+    def slow_live(body):
+        release.wait(5)
+        return {'ok': True}
+
+    service.live = slow_live
+    server = make_server(('127.0.0.1', 0), service, mode='async', deadline=0.2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        status, reply = post(server, '/analyze/live', {'session': 'a', 'text': 'x'})
+        # The timed-out call still holds its slot until it returns
+        in_flight = server.stats()['inFlight']
+        release.set()
+        for _ in range(100):
+            if server.stats()['inFlight'] == 0:
+                break
+            time.sleep(0.05)
+        stats = server.stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+        service.close()
+    assert status == 504 and 'timed out' in reply['error']
+    assert in_flight == 1
+    assert stats['inFlight'] == 0 and stats['timedOut'] == 1
+
+
+def test_async_server_refuses_oversized_headers():
+    service = AnalysisService(1)
+    server, thread = serve(service, 'async')
+    try:
+        with socket.create_connection(('127.0.0.1', server.server_address[1]), timeout=10) as connection:
+            headers = ''.join(f'X-Header-{i}: {i}\r\n' for i in range(200))
+            connection.sendall(f'GET / HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode('latin-1'))
+            reply = b''
+            while chunk := connection.recv(4096):
+                reply += chunk
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+        service.close()
+    assert reply.startswith(b'HTTP/1.1 431 ')
+
+
+def chain_formula(count):
+    return ' ∧ '.join(f'(x{i} ∨ ¬x{i + 1})' for i in range(count - 1))
+
+
+def test_large_logic_checks_run_on_the_pool():
+    service = AnalysisService(1)
+    get_pool = service.analyzer.get_pool
+    pools = []
+
+    def recorded_get_pool(workers):
+        pools.append(workers)
+        return get_pool(workers)
+
+    service.analyzer.get_pool = recorded_get_pool
+    small, large = chain_formula(MAX_INLINE_LOGIC_VARIABLES), chain_formula(MAX_INLINE_LOGIC_VARIABLES + 2)
+    try:
+        assert service.logic(json.dumps({'expression': small})) == logic_summary(Expression(small))
+        assert pools == []
+        # Two formulas whose variables together are over the inline limit also go to the pool
+        response = service.logic(json.dumps({'expression': large, 'equivalent': small, 'table': True}))
+    finally:
+        service.close()
+
+    assert pools == [1]
+    assert response == logic_summary(Expression(large), Expression(small), True)
+    assert response['equivalent'] is False
+
+
+def test_csv_table_variables_are_capped():
+    service = AnalysisService(1)
+    formula = chain_formula(MAX_CSV_TABLE_VARIABLES + 1)
+    with pytest.raises(APIError) as error:
+        service.logic_table(json.dumps({'expression': formula, 'format': 'csv'}))
+    assert error.value.status == 413
+    content_type, _ = service.logic_table(json.dumps({'expression': formula, 'format': 'bits'}))
+    assert content_type == 'application/octet-stream'
+
+
+def test_deeply_nested_logic_is_a_client_error():
+    service = AnalysisService(1)
+    server, thread = serve(service, 'threaded')
+    try:
+        status, reply = post(server, '/logic', {'expression': '~' * 3000 + 'p'})
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+        service.close()
+    assert status == 400
+    assert 'nest' in reply['error']
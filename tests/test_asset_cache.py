@@ -0,0 +1,53 @@
+import os
+import gzip
+from http import HTTPStatus
+
+from asset_cache import AssetCache, accepts_gzip, asset_response
+
+
+def response(cache, path, **headers):
+    status, response_headers, body = asset_response(cache.get(path), headers)
+    return status, dict(response_headers), body
+
+
+def test_gzip_etags_and_not_modified(tmp_path):
+    page = '<html>' + 'modal ' * 200 + '</html>'
+    (tmp_path / 'index.html').write_text(page, encoding='utf-8')
+    (tmp_path / 'tiny.js').write_text('x=1', encoding='utf-8')
+    (tmp_path / 'notes.txt').write_text('not served', encoding='utf-8')
+    cache = AssetCache(str(tmp_path))
+    assert cache.get('/notes.txt') is None and cache.get('/../index.html') is None
+
+    status, headers, body = response(cache, '/')
+    assert status == HTTPStatus.OK and body == page.encode() and 'Content-Encoding' not in headers
+    assert headers['Vary'] == 'Accept-Encoding' and headers['Content-Length'] == str(len(body))
+    status, gzip_headers, gzip_body = response(cache, '/index.html', **{'Accept-Encoding': 'br, gzip'})
+    assert gzip_headers['Content-Encoding'] == 'gzip' and gzip.decompress(gzip_body) == page.encode()
+    assert gzip_headers['ETag'] != headers['ETag']
+    # Small files are sent as they are
+    assert 'Content-Encoding' not in response(cache, '/tiny.js', **{'Accept-Encoding': 'gzip'})[1]
+
+    for etag in (headers['ETag'], gzip_headers['ETag'], 'W/' + headers['ETag'], '"other", ' + headers['ETag'], '*'):
+        status, _, body = response(cache, '/', **{'If-None-Match': etag})
+        assert status == HTTPStatus.NOT_MODIFIED and body == b''
+    assert response(cache, '/', **{'If-None-Match': '"other"'})[0] == HTTPStatus.OK
+    assert response(cache, '/', **{'If-Modified-Since': headers['Last-Modified']})[0] == HTTPStatus.NOT_MODIFIED
+    assert response(cache, '/', **{'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})[0] == HTTPStatus.OK
+
+
+def test_changed_files_are_reloaded(tmp_path):
+    path = tmp_path / 'app.js'
+    path.write_text('first', encoding='utf-8')
+    cache = AssetCache(str(tmp_path), check_interval=0)
+    etag = cache.get('/app.js').etag
+    path.write_text('second!', encoding='utf-8')
+    os.utime(path, ns=(1, 10 ** 18))
+    assert cache.get('/app.js').body == b'second!' and cache.get('/app.js').etag != etag
+    assert cache.stats()['reloads'] == 1
+    path.unlink()
+    assert cache.get('/app.js') is None
+
+
+def test_accept_encoding():
+    assert accepts_gzip('gzip') and accepts_gzip('deflate, GZIP;q=0.5') and accepts_gzip('*')
+    assert not accepts_gzip('') and not accepts_gzip('br') and not accepts_gzip('gzip;q=0')
@@ -0,0 +1,49 @@
+import copy
+
+import pytest
+
+from benchmark import CORPUS_SIZES, STAGES, compare, generate_corpus, percentile, run_suite
+
+
+def test_corpus_depends_only_on_seed_and_kind():
+    for kind in CORPUS_SIZES:
+        assert generate_corpus(kind, 5, seed=3) == generate_corpus(kind, 5, seed=3)
+        assert generate_corpus(kind, 5, seed=3) != generate_corpus(kind, 5, seed=4)
+    # Growing one corpus keeps its first documents
+    assert generate_corpus('paragraphs', 10)[:5] == generate_corpus('paragraphs', 5)
+    with pytest.raises(ValueError):
+        generate_corpus('novels', 1)
+
+
+def test_percentile_is_nearest_rank():
+    ordered = list(range(1, 101))
+    assert [percentile(ordered, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7], 99) == 7 and percentile([], 50) == 0.0
+
+
+@pytest.fixture(scope='module')
+def report():
+    return run_suite(scale=0.01, repeat=1, only=['analyze/sentences', 'split/paragraphs'], measure_memory=False)
+
+
+def test_suite_report_shape(report):
+    assert set(report['results']) == {'analyze/sentences', 'split/paragraphs'}
+    assert {name.split('/')[0] for name in report['results']} <= set(STAGES)
+    result = report['results']['analyze/sentences']
+    assert result['sentences'] == 20 and result['sentencesPerSecond'] > 0 and result['calibrationMs'] > 0
+    assert result['latencyMs']['p50'] <= result['latencyMs']['p95'] <= result['latencyMs']['p99']
+
+
+def test_compare_flags_regressions_beyond_the_threshold(report):
+    assert compare(report, report, 0.1) == []
+    slower = copy.deepcopy(report)
+    result = slower['results']['analyze/sentences']
+    result['sentencesPerSecond'] /= 2
+    result['latencyMs']['p50'] *= 2
+    assert [(name, metric) for name, metric, *_ in compare(slower, report, 0.1)] == [
+        ('analyze/sentences', 'sentencesPerSecond'), ('analyze/sentences', 'latencyMs.p50')]
+    # ...unless the calibration workload slowed down as much, on a busier or slower machine
+    result['calibrationMs'] *= 2
+    assert compare(slower, report, 0.1, normalize=True) == []
+    with pytest.raises(ValueError):
+        compare(dict(report, seed=1), report, 0.1)
@@ -0,0 +1,54 @@
+import tkinter as tk
+
+import pytest
+
+from breakdown_view import ROW_HEIGHT, SentenceBreakdownView
+from compact_result import SCORE_TYPES
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip('no display')
+    root.geometry('800x300')
+    yield root
+    root.destroy()
+
+
+def results(count):
+    return [{'sentence': f'Sentence number {i}.',
+             'scores': {'necessity': i % 101, 'possibility': 0, 'impossibility': 0},
+             'classification': 'Logically Necessary' if i % 2 else 'Neutral/Contingent'}
+            for i in range(count)]
+
+
+def test_only_visible_rows_have_canvas_items(root):
+    view = SentenceBreakdownView(root, height=240)
+    view.pack(fill='both', expand=True)
+    root.update()
+    view.extend(results(20000))
+    root.update()
+
+    # A label, the sentence, the classification and a separator, and four items per score bar
+    items = len(view.canvas.find_all())
+    assert view.slots and items == len(view.slots) * (4 + 4 * len(SCORE_TYPES))
+    assert len(view.slots) <= view.canvas.winfo_height() // ROW_HEIGHT + 2
+    view.yview('moveto', 0.5)
+    root.update()
+    assert len(view.canvas.find_all()) == items
+    assert view.offset // ROW_HEIGHT == 10000
+
+    view.sort_var.set('Necessity')
+    view.on_order_changed()
+    root.update()
+    assert [view.results[i]['scores']['necessity'] for i in view.order[:3]] == [100, 100, 100]
+    view.filter_var.set('Neutral/Contingent')
+    view.on_order_changed()
+    root.update()
+    assert len(view.order) == 10000 and view.count_var.get() == '10000 of 20000 sentences'
+
+    view.truncate(10)
+    root.update()
+    assert len(view) == 10 and sorted(view.order) == [0, 2, 4, 6, 8]
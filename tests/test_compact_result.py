@@ -0,0 +1,46 @@
+import tracemalloc
+
+import pytest
+
+from benchmark import generate_corpus
+from modality_engine import ModalityAnalyzer
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return ModalityAnalyzer()
+
+
+def test_records_are_views_of_the_columns(analyzer):
+    text = 'It must be true. Perhaps it rains tomorrow. A square circle. Hello'
+    expected = analyzer.analyze(text)
+    result = analyzer.analyze_compact(text)
+    assert len(result) == 4 and result.is_paragraph
+    assert [record.to_dict() for record in result] == expected['sentenceResults']
+    assert result[-1].sentence == 'Hello' and result[3].start == text.index('Hello')
+    assert [text[record.start:record.end] for record in result] == expected['sentences']
+    with pytest.raises(IndexError):
+        result[4]
+    with pytest.raises(IndexError):
+        result[-5]
+
+    empty = analyzer.analyze_compact('')
+    assert empty.to_dict() == analyzer.analyze('')
+    single = analyzer.analyze_compact('  It must be true  ')
+    assert not single.is_paragraph and single.to_dict() == analyzer.analyze('  It must be true  ')
+
+
+def test_compact_results_are_small(analyzer):
+    text = ' '.join(generate_corpus('essays', 10, seed=5))
+    sizes = []
+    for analyze in (analyzer.analyze, analyzer.analyze_compact):
+        analyze(text)
+        tracemalloc.start()
+        try:
+            result = analyze(text)
+            sizes.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+        del result
+    # Offsets and typed columns instead of a dict, a string and a scores dict per sentence
+    assert sizes[1] * 4 < sizes[0]
@@ -0,0 +1,48 @@
+import pytest
+
+from benchmark import generate_corpus
+from corpus_analysis import analyze_corpus
+from modality_engine import ModalityAnalyzer
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return ModalityAnalyzer(max_sentence_length=120)
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('corpus')
+    texts = generate_corpus('essays', 3, seed=23) + [
+        'Ça doit être vrai. Peut-être qu’il pleut demain. Un cercle carré est impossible. ' * 40,
+        '', 'It must be true. ' + 'runon ' * 100]
+    paths = []
+    for index, text in enumerate(texts):
+        path = directory / f'document{index}.txt'
+        path.write_text(text, encoding='utf-8')
+        paths.append(str(path))
+    return paths, texts
+
+
+@pytest.mark.parametrize('workers, range_bytes', [(1, 1 << 20), (1, 700), (2, 500)])
+def test_files_match_analyze(analyzer, corpus, workers, range_bytes):
+    paths, texts = corpus
+    try:
+        results = list(analyze_corpus(analyzer, paths, workers=workers, range_bytes=range_bytes))
+    finally:
+        analyzer.close()
+    for path, text, result in zip(paths, texts, results):
+        expected = analyzer.analyze(text)
+        assert result.path == path and len(result) == len(expected['sentences'])
+        if not expected['isParagraph']:
+            continue
+        assert [record.sentence for record in result] == expected['sentences']
+        assert [record.to_dict() for record in result] == expected['sentenceResults']
+        summary = result.to_dict()
+        assert summary['classification'] == expected['classification']
+        if len(text.encode('utf-8')) <= range_bytes:
+            # One range: the sums are added in sentence order, as analyze() does
+            assert summary['scores'] == expected['scores']
+        else:
+            assert summary['scores'] == pytest.approx(expected['scores'], rel=1e-12)
+    assert results[-2].to_dict()['sentenceCount'] == 0
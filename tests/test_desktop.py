@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from incremental_analysis import IncrementalDocument
+from modality_analyzer_desktop import AnalysisJob
+from modality_engine import ModalityAnalyzer
+
+TEXT = 'It must be true. Perhaps it rains tomorrow. A square circle. Squares have four sides.'
+
+
+def drain(job):
+    """Wait for a started job and return every message it posted"""
+    job.join(10)
+    assert not job.is_alive()
+    posted = []
+    while not job.messages.empty():
+        posted.append(job.messages.get_nowait())
+    return posted
+
+
+def run(job):
+    job.start()
+    return drain(job)
+
+
+@pytest.fixture
+def analyzer():
+    return ModalityAnalyzer()
+
+
+def test_job_reports_each_sentence_then_the_result(analyzer):
+    document = IncrementalDocument(analyzer)
+    posted = run(AnalysisJob(document, TEXT))
+    expected = analyzer.analyze(TEXT)
+    assert posted[:-1] == [('sentence', index, 4, result) for index, result in enumerate(expected['sentenceResults'])]
+    assert posted[-1] == ('done', (0, 0, 4), expected, 4)
+
+    # An edit only reports the sentences it changed
+    edited = TEXT.replace('rains', 'snows')
+    posted = run(AnalysisJob(document, edited))
+    assert [message[:2] for message in posted[:-1]] == [('sentence', 1)]
+    assert posted[-1][:2] == ('done', (1, 2, 2)) and posted[-1][2] == analyzer.analyze(edited)
+
+
+def test_cancelled_job_leaves_the_document_unchanged(analyzer):
+    document = IncrementalDocument(analyzer, TEXT)
+    reported, proceed = threading.Event(), threading.Event()
+    analyze_sentence = analyzer.analyze_sentence
+
+    def slow_analyze_sentence(sentence):
+        reported.set()
+        proceed.wait(5)
+        return analyze_sentence(sentence)
+
+    analyzer.analyze_sentence = slow_analyze_sentence
+    job = AnalysisJob(document, TEXT + ' Maybe it snows. Maybe it hails.')
+    job.start()
+    assert reported.wait(5)
+    job.cancel()
+    proceed.set()
+    posted = drain(job)
+    assert posted[-1] == ('cancelled',)
+    assert document.text == TEXT and document.result() == analyzer.analyze(TEXT)
+
+    # The next job waits for the cancelled one and then applies its own text
+    del analyzer.analyze_sentence
+    follow = AnalysisJob(document, TEXT + ' Maybe.', previous=job)
+    assert run(follow)[-1][2] == analyzer.analyze(TEXT + ' Maybe.')
+
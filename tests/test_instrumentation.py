@@ -0,0 +1,51 @@
+from benchmark import generate_corpus
+from instrumentation import Instrumentation, to_prometheus
+from modality_engine import ModalityAnalyzer
+
+
+def test_counters_follow_the_analysis():
+    plain, instrumented = ModalityAnalyzer(), ModalityAnalyzer()
+    instrumented.enable_instrumentation()
+    texts = generate_corpus('paragraphs', 20, seed=22)
+    for text in texts:
+        assert instrumented.analyze(text) == plain.analyze(text)
+    sentences = [sentence for text in texts for sentence in plain.split_into_sentences(text)]
+
+    metrics = instrumented.metrics()
+    lengths = metrics['sentenceLengths']
+    assert lengths['count'] == len(sentences) and lengths['sum'] == sum(map(len, sentences))
+    assert metrics['stages']['split']['calls'] >= len(texts) and metrics['stages']['rules']['calls'] == len(sentences)
+    # Keywords are only looked for in sentences no rule decided
+    assert 0 < max(metrics['keywords'].values()) <= len(sentences)
+    assert all(rule['matched'] <= rule['evaluated'] for rule in metrics['rules'])
+
+    drained = instrumented.drain_metrics()
+    assert drained['sentenceLengths']['count'] == len(sentences)
+    assert instrumented.metrics()['sentenceLengths']['count'] == 0
+
+
+def test_worker_counters_are_merged():
+    analyzer = ModalityAnalyzer()
+    analyzer.enable_instrumentation()
+    texts = generate_corpus('sentences', 80, seed=22)
+    try:
+        list(analyzer.analyze_many(texts, workers=2, serial_threshold=0))
+    finally:
+        analyzer.close()
+    assert analyzer.metrics()['sentenceLengths']['count'] == sum(len(analyzer.split_into_sentences(text)) for text in texts)
+
+
+def test_prometheus_text():
+    instrumentation = Instrumentation()
+    for length in (10, 30, 5000):
+        instrumentation.add_sentence(length)
+    instrumentation.add_rules([{'group': 'necessity', 'index': 0, 'pattern': 'say "hi"\\', 'evaluated': 2,
+                                'matched': 1, 'skipped': 3}])
+    text = to_prometheus(instrumentation.to_dict())
+    lines = text.splitlines()
+    assert 'modality_sentence_length_characters_bucket{le="25"} 1' in lines
+    assert 'modality_sentence_length_characters_bucket{le="50"} 2' in lines
+    assert 'modality_sentence_length_characters_bucket{le="+Inf"} 3' in lines
+    assert 'modality_sentence_length_characters_count 3' in lines
+    assert 'modality_rule_matches_total{group="necessity",index="0",pattern="say \\"hi\\"\\\\"} 1' in lines
+    assert '# TYPE modality_stage_seconds_total counter' in lines and text.endswith('\n')
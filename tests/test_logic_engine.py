@@ -0,0 +1,93 @@
+import csv
+import io
+import itertools
+
+import pytest
+
+from logic_engine import (Expression, LogicError, MAX_DEPTH, entails, equivalent, equivalence_counterexample,
+                          format_tree, parse, summarize, table_chunks)
+
+FORMULAS = ('p ∧ q', 'p ∨ q ∨ r', '(a → b) ↔ (¬b → ¬a)', 'a ⊕ b ⊕ c ⊕ d', 'p ∧ ¬p', 'true',
+            'p -> q -> r', 'not p or q and r', 'a <-> b xor c', 'x1 & !(x2 | x3) => false')
+
+
+def rows(expression):
+    for row in range(expression.rows):
+        yield row, expression.evaluate(expression.assignment(row))
+
+
+def test_count_models_matches_evaluate():
+    for text in FORMULAS:
+        expression = Expression(text)
+        assignments = itertools.product((False, True), repeat=len(expression.variables))
+        expected = sum(expression.evaluate(dict(zip(expression.variables, row))) for row in assignments)
+        assert expression.count_models() == expected
+    # More rows than one block
+    assert Expression(' ∨ '.join(f'x{i}' for i in range(22))).count_models() == (1 << 22) - 1
+
+
+@pytest.mark.parametrize('text, tree', [
+    # ∧ binds tighter than ∨, ∨ than →, → than ↔ and ⊕; ¬ tightest of all
+    ('p ∨ q ∧ r', ('or', ('var', 'p'), ('and', ('var', 'q'), ('var', 'r')))),
+    ('¬p ∧ q', ('and', ('not', ('var', 'p')), ('var', 'q'))),
+    ('p → q ↔ r', ('iff', ('implies', ('var', 'p'), ('var', 'q')), ('var', 'r'))),
+    # → groups to the right, the others to the left
+    ('p → q → r', ('implies', ('var', 'p'), ('implies', ('var', 'q'), ('var', 'r')))),
+    ('p ∧ q ∧ r', ('and', ('and', ('var', 'p'), ('var', 'q')), ('var', 'r'))),
+    ('NOT p AND true', ('and', ('not', ('var', 'p')), ('const', True))),
+    ('((p))', ('var', 'p'))
+])
+def test_parse_precedence_and_associativity(text, tree):
+    assert parse(text) == tree
+
+
+@pytest.mark.parametrize('text', ['', 'p ∧', '∧ p', '(p ∨ q', 'p ∨ q)', 'p q', 'p $ q', '()'])
+def test_parse_errors(text):
+    with pytest.raises(LogicError):
+        parse(text)
+
+
+def test_nesting_depth_is_capped():
+    assert Expression('~' * MAX_DEPTH + 'p').count_models() == 1
+    with pytest.raises(LogicError):
+        Expression('~' * 3000 + 'p')
+    with pytest.raises(LogicError):
+        Expression(' ∧ '.join(['p'] * (MAX_DEPTH + 2)))
+    # Parentheses alone do not nest operators
+    assert Expression('(' * 5000 + 'p' + ')' * 5000).variables == ['p']
+
+
+def test_format_tree_round_trips():
+    for text in FORMULAS:
+        tree = parse(text)
+        assert parse(format_tree(tree)) == tree
+    deep = ('var', 'p')
+    for _ in range(5000):
+        deep = ('not', deep)
+    assert format_tree(deep) == '¬' * 5000 + 'p'
+
+
+def test_summary_and_equivalence():
+    summary = summarize('(p → q) ∧ p → q', max_table_variables=2)
+    assert summary['classification'] == 'tautology' and summary['table'] == '1111'
+    assert summarize('p ∧ ¬p')['classification'] == 'contradiction'
+    contingent = summarize('p ∧ ¬q')
+    assert contingent['classification'] == 'contingent'
+    assert contingent['model'] == {'p': True, 'q': False}
+    assert equivalent('¬(p ∧ q)', '¬p ∨ ¬q')
+    assert equivalence_counterexample('p → q', 'q → p') == {'p': True, 'q': False}
+    assert entails('p ∧ q', 'p ∨ r') and not entails('p ∨ q', 'p')
+
+
+@pytest.mark.parametrize('block_bits', [0, 2, 3, 20])
+def test_table_chunks_match_evaluate(block_bits):
+    for text in FORMULAS:
+        expression = Expression(text)
+        lines = list(csv.reader(io.StringIO(b''.join(table_chunks(expression, 'csv', block_bits)).decode())))
+        assert lines[0] == expression.variables + ['result']
+        expected = [[str(int(row >> i & 1)) for i in range(len(expression.variables))] + [str(int(value))]
+                    for row, value in rows(expression)]
+        assert lines[1:] == expected
+
+        packed = int.from_bytes(b''.join(table_chunks(expression, 'bits', block_bits)), 'little')
+        assert packed == sum(value << row for row, value in rows(expression))
@@ -0,0 +1,29 @@
+import json
+
+from modality_cli import main
+from modality_engine import ModalityAnalyzer
+
+
+def test_jsonl_skips_bad_records(tmp_path, capsys):
+    source = tmp_path / 'corpus.jsonl'
+    source.write_text('\n'.join([
+        json.dumps({'id': 1, 'text': 'It must be true.'}),
+        '{"id": 2, "text": ',
+        json.dumps([1, 2]),
+        json.dumps({'id': 4, 'text': 42}),
+        json.dumps('Maybe it rains.'),
+        json.dumps({'id': 6})
+    ]) + '\n', encoding='utf-8')
+    output = tmp_path / 'results.jsonl'
+
+    assert main([str(source), '--format', 'jsonl', '--fields', 'scores', '-o', str(output)])
+
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    analyzer = ModalityAnalyzer()
+    assert records == [
+        {'id': 1, 'scores': analyzer.analyze('It must be true.')['scores']},
+        {'source': str(source), 'line': 5, 'scores': analyzer.analyze('Maybe it rains.')['scores']},
+        {'id': 6, 'scores': analyzer.analyze('')['scores']}
+    ]
+    errors = capsys.readouterr().err.splitlines()
+    assert [error.split(': ')[0] for error in errors] == [f'{source}:2', f'{source}:3', f'{source}:4']
@@ -0,0 +1,146 @@
+import gc
+import re
+import time
+import random
+
+import pytest
+
+from rule_engine import KeywordMatcher, RuleEngine
+
+
+def matches(pattern, text):
+    return bool(RuleEngine([('rule', [pattern])]).scan(text))
+
+
+@pytest.mark.parametrize('pattern, texts', [
+    (r'\x61bc', ['abc', 'xabcx', 'x61bc', 'bc']),
+    (r'\u0061bc', ['abc', 'u0061bc']),
+    (r'\U00000061bc', ['abc', 'U00000061bc']),
+    (r'\N{LATIN SMALL LETTER A}bc', ['abc', 'N{LATIN SMALL LETTER A}bc']),
+    (r'\012ab', ['\nab', '012ab', 'ab']),
+    (r'\0ab', ['\0ab', '0ab']),
+    (r'(a)\1bc', ['aabc', 'a1bc']),
+    (r'\d+ apples', ['3 apples', 'd apples']),
+    (r'\.\*literal', ['.*literal', 'literal'])
+])
+def test_escapes_match_like_re(pattern, texts):
+    for text in texts:
+        assert matches(pattern, text) == bool(re.search(pattern, text)), (pattern, text)
+
+
+def expected_hits(engine, text):
+    # The first rule of each group, in list order, that re.search matches
+    hits = {}
+    for rule in engine.rules:
+        if rule.group not in hits and re.search(rule.pattern, text, engine._flags):
+            hits[rule.group] = rule
+    return hits
+
+
+def test_fuzz_against_re_search():
+    from modality_engine import ModalityAnalyzer
+    engine = ModalityAnalyzer().get_rule_engine()
+    pieces = [rule.pattern.replace('.*', ' ') for rule in engine.rules if '\\' not in rule.pattern]
+    words = sorted({word for piece in pieces for word in piece.split()})
+    rng = random.Random(3)
+    for _ in range(3000):
+        parts = []
+        for _ in range(rng.randint(1, 12)):
+            choice = rng.random()
+            if choice < 0.4:
+                parts.append(rng.choice(words))
+            elif choice < 0.6:
+                parts.append(rng.choice(pieces))
+            elif choice < 0.8:
+                parts.append(f'{rng.randint(0, 99)} {rng.choice("+-*/")} {rng.randint(0, 99)} = {rng.randint(0, 99)}')
+            else:
+                parts.append(''.join(rng.choice('ab =\n.,') for _ in range(rng.randint(1, 6))))
+        text = rng.choice([' ', '\n', '']).join(parts).lower()
+        assert engine.scan(text) == expected_hits(engine, text), text
+
+
+def test_rule_scores_match_pattern_by_pattern_search():
+    # The scores detect_logical_necessity/impossibility gave with one re.search per pattern
+    from benchmark import generate_corpus
+    from modality_engine import ARITHMETIC_PATTERN, ModalityAnalyzer
+    analyzer = ModalityAnalyzer()
+    sentences = generate_corpus('rule_heavy', 400, seed=1) + generate_corpus('sentences', 400, seed=1) + [
+        '2 + 2 = 4', 'x12*3=36 apples', 'a married bachelor', 'principles of a square circle',
+        'something is both hot and not hot', 'all circles are round, by definition', '']
+    for sentence in (sentence.lower() for sentence in sentences):
+        hits = analyzer.match_rules(sentence)
+        necessity = (95 if re.search(ARITHMETIC_PATTERN, sentence) else
+                     90 if any(re.search(pattern, sentence) for pattern in analyzer.logical_patterns['necessity']) else 0)
+        impossibility = (0 if any(phrase in sentence for phrase in analyzer.impossibility_exemptions) else
+                         95 if any(re.search(pattern, sentence) for pattern in analyzer.logical_patterns['impossibility'])
+                         else 0)
+        assert analyzer.necessity_score(hits) == necessity, sentence
+        assert analyzer.impossibility_score(hits) == impossibility, sentence
+
+
+def test_keywords_match_whole_words_only():
+    from benchmark import generate_corpus
+    from modality_engine import ModalityAnalyzer
+    matcher = ModalityAnalyzer().get_keyword_matcher()
+    texts = generate_corpus('sentences', 500, seed=2) + [
+        'we cannot scan the scandal', 'the mayor may resign', 'maybe, perhaps.', 'it will happen tomorrow',
+        'it will happened', "can't can-do", 'thinking I think', '']
+    for text in (text.lower() for text in texts):
+        expected = {}
+        for category, keywords in matcher.categories:
+            words = {keyword for keyword in keywords if re.search(rf'\b{re.escape(keyword)}\b', text)}
+            if words:
+                expected[category] = words
+        assert {category: set(words) for category, words in matcher.find(text).items()} == expected, text
+    assert matcher.find('the mayor cannot') == {}
+    # Each keyword is reported once, in order of first appearance
+    assert KeywordMatcher([('modal', ['may', 'maybe', 'can'])]).find('maybe can may maybe') == {'modal': ['maybe', 'can', 'may']}
+
+
+def test_case_folding_characters_match_like_re():
+    # \D makes the engine case-insensitive, and IGNORECASE folds 'ſ' onto 's' and the Kelvin sign onto 'k'
+    engine = RuleEngine([('shape', [r'\Dsquare', 'stone']), ('logic', ['either.*or not', r'\bkey\b'])])
+    assert engine._flags
+    for text in ['ſtone', 'a ſquare', 'ſtone either it iſ or not', 'eitheſ or not', '\u212aey', 'the \u212aey',
+                 'stone', 'ſ', 'ı İ ſ \u212a', 'either \u212a or not']:
+        assert engine.scan(text) == expected_hits(engine, text), text
+
+
+def test_artifacts_of_older_versions_are_refused():
+    engine = RuleEngine([('rule', [r'\x61bc'])])
+    artifact = engine.to_artifact()
+    assert RuleEngine.from_artifact(artifact).scan('abc')
+    with pytest.raises(ValueError):
+        RuleEngine.from_artifact(dict(artifact, version=1))
+
+
+def best_time(function, repeat=7):
+    # Collections triggered by garbage the rest of the suite left would land in one run or the other
+    gc.collect()
+    gc.disable()
+    try:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    finally:
+        gc.enable()
+
+
+@pytest.mark.parametrize('unit', [
+    'either it is so ',                             # gapped rules waiting for 'or not'
+    'cannot be both red and blue ',                 # 'cannot be both.*and.*simultaneously'
+    'something is both ',                           # 'something is both.*and not'
+    '1234567890'                                    # the arithmetic rule on a digit run
+])
+def test_worst_case_grows_linearly(unit):
+    from modality_engine import ModalityAnalyzer
+    engine = ModalityAnalyzer().get_rule_engine()
+    small = unit * (200_000 // len(unit))
+    large = small * 2
+    ratio = best_time(lambda: engine.scan(large)) / best_time(lambda: engine.scan(small))
+    # Doubling the input should about double the time; quadratic growth would quadruple it
+    assert ratio < 3.2, ratio
@@ -0,0 +1,38 @@
+import json
+
+from modality_engine import ModalityAnalyzer
+from rule_packs import builtin_pack, load_rule_set, stats_by_pack
+
+
+def write_pack(path, pack):
+    path.write_text(json.dumps(pack), encoding='utf-8')
+    return str(path)
+
+
+def test_builtin_pack_matches_builtin_rules(tmp_path):
+    path = write_pack(tmp_path / 'core.json', builtin_pack())
+    plain, packed = ModalityAnalyzer(), ModalityAnalyzer(rule_packs=[path])
+    assert packed.rules_fingerprint() == plain.rules_fingerprint()
+    text = 'All bachelors are unmarried. It might rain tomorrow. Square circles are impossible. 2 + 2 = 4.'
+    assert packed.analyze(text) == plain.analyze(text)
+    # The second load comes from the artifact cache
+    assert load_rule_set([path]).cached
+
+
+def test_counters_after_reload_with_fewer_rules(tmp_path):
+    pack = builtin_pack()
+    path = write_pack(tmp_path / 'core.json', pack)
+    analyzer = ModalityAnalyzer(rule_packs=[path])
+    instrumentation = analyzer.enable_instrumentation()
+    instrumentation.merge(analyzer.drain_metrics() | {'rules': [
+        {'group': 'necessity', 'index': 16, 'pattern': pack['necessity'][16], 'evaluated': 5, 'matched': 5, 'skipped': 0}
+    ]})
+
+    pack['necessity'] = pack['necessity'][:2]
+    write_pack(tmp_path / 'core.json', pack)
+    assert analyzer.reload_rule_packs()
+    # Counters of a rule the new packs do not have are neither an error nor credited to another rule
+    stale = [{'group': 'necessity', 'index': 16, 'pattern': 'gone', 'evaluated': 1, 'matched': 1, 'skipped': 0},
+             {'group': 'necessity', 'index': 1, 'pattern': 'not the same rule', 'evaluated': 1, 'matched': 1, 'skipped': 0}]
+    assert stats_by_pack(analyzer, stale) == {}
+    assert stats_by_pack(analyzer, analyzer.metrics()['rules'])['builtin']['evaluated'] == 0
@@ -0,0 +1,41 @@
+from modality_engine import ModalityAnalyzer
+from score_cache import ScoreCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ScoreCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() | {'bytes': 0} == {'entries': 2, 'bytes': 0, 'hits': 3, 'misses': 1, 'evictions': 1,
+                                            'hitRate': 0.75, 'maxEntries': 2, 'maxBytes': None}
+
+
+def test_byte_budget_is_kept():
+    cache = ScoreCache(max_bytes=1000)
+    for i in range(100):
+        cache.put(f'sentence {i}', {'necessity': i})
+        assert cache.bytes <= 1000
+    assert 0 < len(cache) < 100 and cache.evictions == 100 - len(cache)
+    # A value larger than the whole budget is not cached at all
+    cache.put('huge', 'x' * 2000)
+    assert cache.get('huge') is None and cache.bytes <= 1000
+
+
+def test_cached_scores_match_and_follow_rule_changes():
+    plain, cached = ModalityAnalyzer(), ModalityAnalyzer(cache_size=100)
+    text = 'It must be true. Squares are nice. It must be true. Squares are nice.'
+    assert cached.analyze(text) == plain.analyze(text)
+    misses = cached.cache_stats()['misses']
+    assert cached.analyze(text) == plain.analyze(text)
+    assert cached.cache_stats()['misses'] == misses and cached.cache_stats()['hits'] >= 2
+    # Changing a returned result does not change what the cache holds
+    cached.analyze(text)['sentenceResults'][0]['scores']['necessity'] = 99
+    assert cached.analyze(text) == plain.analyze(text)
+
+    cached.logical_patterns['necessity'].append('squares')
+    plain.logical_patterns['necessity'].append('squares')
+    assert cached.analyze(text) == plain.analyze(text)
+    assert cached.analyze('Squares are nice.')['scores']['necessity'] == 90
@@ -0,0 +1,60 @@
+import sys
+import json
+
+import score_store
+from modality_engine import ModalityAnalyzer
+from rule_packs import builtin_pack
+from score_store import ScoreStore
+
+SCORES = {'necessity': 90, 'possibility': 10, 'impossibility': 0}
+
+
+def fill(path, fingerprints):
+    store = ScoreStore(str(path))
+    for rules in fingerprints:
+        store.put(rules, 'It must be true.', SCORES)
+    store.flush()
+    store.close()
+
+
+def rule_sets(path):
+    store = ScoreStore(str(path))
+    try:
+        return set(store.stats()['ruleSets'])
+    finally:
+        store.close()
+
+
+def run_gc(monkeypatch, path, *options):
+    monkeypatch.setattr(sys, 'argv', ['score_store.py', 'gc', '--path', str(path), *options])
+    return score_store.main()
+
+
+def test_compact_keeps_every_listed_rule_set(tmp_path):
+    path = tmp_path / 'scores.sqlite3'
+    fill(path, ['a', 'b', 'c'])
+    store = ScoreStore(str(path))
+    store.compact(keep_rules=['a', 'c'])
+    store.compact(keep_rules='a')
+    assert store.stats()['ruleSets'] == {'a': 1}
+    store.close()
+
+
+def test_gc_keeps_rule_pack_entries(monkeypatch, tmp_path):
+    pack = builtin_pack()
+    pack['necessity'] = pack['necessity'][:5]
+    pack_path = tmp_path / 'short.json'
+    pack_path.write_text(json.dumps(pack), encoding='utf-8')
+    builtin = ModalityAnalyzer().rules_fingerprint()
+    packed = ModalityAnalyzer(rule_packs=[str(pack_path)]).rules_fingerprint()
+    path = tmp_path / 'scores.sqlite3'
+    fill(path, [builtin, packed, 'stale'])
+
+    # Without naming the rule sets to keep, gc would drop the pack's entries, so it refuses
+    assert not run_gc(monkeypatch, path)
+    assert rule_sets(path) == {builtin, packed, 'stale'}
+
+    assert run_gc(monkeypatch, path, '--rule-packs', str(pack_path))
+    assert rule_sets(path) == {builtin, packed}
+    assert run_gc(monkeypatch, path, '--keep', builtin)
+    assert rule_sets(path) == {builtin}
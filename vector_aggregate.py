@@ -0,0 +1,96 @@
+"""
+NumPy aggregation of sentence scores for the modality analyzer.
+Computes sentence weights, dominant modalities, the distribution, paragraph
+scores and classification labels for a whole score matrix with array operations.
+The results are identical to the scalar ParagraphAccumulator/classify_modality
+path. NumPy is optional: the analyzer falls back to the scalar path without it.
+"""
+
+import numpy as np
+
+from compact_result import SCORE_TYPES, CLASSIFICATION_IDS, plain_number
+
+# SCORE_TYPES is the column order of the score matrix; these are the dominant-modality ids
+DOMINANT_TYPES = SCORE_TYPES + ('neutral',)
+NEUTRAL = 3
+
+THRESHOLD = 25
+
+
+def sentence_weights(lengths):
+    """Per-sentence weight, min(length / 50, 2)"""
+    return np.minimum(np.asarray(lengths, dtype=np.float64) / 50, 2)
+
+
+def score_columns(scores):
+    """The necessity, possibility and impossibility columns of a score matrix, each contiguous"""
+    return np.ascontiguousarray(np.asarray(scores, dtype=np.float64).reshape(-1, 3).T)
+
+
+def dominant_modalities(columns, max_score):
+    """Index into DOMINANT_TYPES of each sentence's dominant modality, as get_dominant_modality"""
+    necessity, possibility, impossibility = columns
+    dominant = np.where(impossibility == max_score, 2, 1).astype(np.uint8)
+    dominant[necessity == max_score] = 0
+    dominant[max_score < THRESHOLD] = NEUTRAL
+    return dominant
+
+
+def _strength(values):
+    # 0 for > 85, 1 for > 70, 2 for > 50, otherwise 3: the order within each label group
+    return 3 - (values > 50).view(np.uint8) - (values > 70).view(np.uint8) - (values > 85).view(np.uint8)
+
+
+def classification_ids(columns, max_score):
+    """Index into compact_result.CLASSIFICATIONS of each sentence's classify_modality label"""
+    labels = np.full(len(max_score), CLASSIFICATION_IDS['Neutral/Contingent'], dtype=np.uint8)
+    necessity, possibility, impossibility = columns
+    # Assigned lowest priority first, so necessity wins ties as in classify_modality
+    for values, first_label in ((possibility, 'Highly Possible'),
+                                (impossibility, 'Logically Impossible'),
+                                (necessity, 'Logically Necessary')):
+        chosen = (values == max_score) & (values > THRESHOLD)
+        np.copyto(labels, _strength(values) + CLASSIFICATION_IDS[first_label], where=chosen)
+    return labels
+
+
+def aggregate(analyzer, scores, lengths):
+    """Aggregate an (N x 3) score matrix (necessity, possibility, impossibility) and the
+    sentence lengths. Returns the paragraph 'scores', 'classification', 'explanation' and
+    'distribution' as analyze() computes them, plus per-sentence 'dominant' and
+    'classificationIds' arrays."""
+    columns = score_columns(scores)
+    count = columns.shape[1]
+    max_score = np.maximum(np.maximum(columns[0], columns[1]), columns[2])
+
+    dominant = dominant_modalities(columns, max_score)
+    counts = np.bincount(dominant, minlength=len(DOMINANT_TYPES))
+    distribution = {modality: int(n) for modality, n in zip(DOMINANT_TYPES, counts)}
+
+    if count == 0:
+        paragraph_scores = {score_type: 0 for score_type in SCORE_TYPES}
+    elif count == 1:
+        # As the sentence records report it: whole scores as int, as analyze() mostly has them
+        paragraph_scores = {score_type: plain_number(float(column[0])) for score_type, column in zip(SCORE_TYPES, columns)}
+    else:
+        # cumsum adds in sentence order, so the sums round exactly as the scalar loop's do
+        weights = sentence_weights(lengths)
+        total_weight = np.cumsum(weights)[-1]
+        paragraph_scores = {score_type: float(np.cumsum(column * weights)[-1] / total_weight)
+                            for score_type, column in zip(SCORE_TYPES, columns)}
+        analyzer.apply_distribution_adjustments(paragraph_scores, dict(distribution), count)
+
+    classification = analyzer.classify_modality(paragraph_scores)
+    if count == 1:
+        explanation = f"Single sentence analysis. Classification: {classification}"
+    else:
+        explanation = analyzer.explain_distribution(distribution, count, paragraph_scores, classification)
+
+    return {
+        'scores': paragraph_scores,
+        'classification': classification,
+        'explanation': explanation,
+        'distribution': distribution,
+        'dominant': dominant,
+        'classificationIds': classification_ids(columns, max_score)
+    }